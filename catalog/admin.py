@@ -0,0 +1,198 @@
+"""
+Админка книг и статусов чтения для больших таблиц.
+
+Список не считает COUNT(*): число строк берётся из заранее посчитанных
+счётчиков (catalog.stats, ячейки фильтров catalog.facets), когда их
+хватает для выбранного фильтра. Фильтры идут по индексам, связанные
+строки загружаются одним JOIN, вместо выпадающих списков на все строки -
+автодополнение. Массовые действия меняют и удаляют строки одним
+UPDATE/DELETE на пачку (catalog.bulk), а не сохранением каждой строки.
+"""
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import (
+    ALL_VAR, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, TO_FIELD_VAR,
+)
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
+from . import bulk
+from .models import Book, BookFacet, UserStatus
+from .search import search_ids
+from .stats import get_counters
+from .views import save_book
+
+
+# Сколько книг находит поиск в админке (и автодополнение книги в статусе)
+ADMIN_SEARCH_LIMIT = 1000
+
+# Параметры адреса списка, которые не меняют число строк в нём
+LIST_PARAMS = {ALL_VAR, ORDER_VAR, PAGE_VAR, IS_POPUP_VAR, TO_FIELD_VAR, IS_FACETS_VAR}
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator, которому число строк можно передать заранее, без COUNT(*).
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, count=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is None:
+            return super().count
+        return self.known_count
+
+
+def list_filters(request):
+    """
+    Фильтры и поиск списка в админке (без сортировки, страницы и служебных параметров).
+    """
+    return {
+        key: value for key, value in request.GET.items()
+        if key not in LIST_PARAMS and not (key == SEARCH_VAR and not value)
+    }
+
+
+class CatalogAdmin(admin.ModelAdmin):
+    """
+    Общее для больших таблиц: число строк из счётчиков, без второго COUNT
+    "всего" и без количеств у вариантов фильтров, удаление одним DELETE.
+    """
+    paginator = CountedPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    # Функция catalog.bulk, которая удаляет строки queryset
+    bulk_delete = None
+
+    def known_count(self, filters):
+        """
+        Число строк под фильтрами из счётчиков или None - тогда считаем COUNT.
+        """
+        return None
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page, count=self.known_count(list_filters(request)),
+        )
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Стандартное удаление загружает все строки и каскады и удаляет их по одной
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(permissions=['delete'], description='Удалить выбранные')
+    def delete_rows(self, request, queryset):
+        """
+        Удаление после подтверждения. Список строк на странице подтверждения
+        не выводится: при выборе "всех" он может быть огромным.
+        """
+        if request.POST.get('post'):
+            deleted = self.bulk_delete(queryset)
+            self.message_user(request, f'Удалено: {deleted}')
+            return None
+        return TemplateResponse(request, 'admin/catalog/bulk_delete_confirmation.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Подтверждение удаления',
+            'opts': self.model._meta,
+            'count': queryset.count(),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action': request.POST.get('action'),
+        })
+
+
+def set_genre_action(value, label):
+    @admin.action(permissions=['change'], description=f'Сменить жанр: {label}')
+    def action(modeladmin, request, queryset):
+        modeladmin.message_user(request, f'Жанр изменён у книг: {bulk.set_genre(queryset, value)}')
+
+    action.__name__ = f'set_genre_{value}'
+    return action
+
+
+def set_status_action(value, label):
+    @admin.action(permissions=['change'], description=f'Поставить статус: {label}')
+    def action(modeladmin, request, queryset):
+        modeladmin.message_user(request, f'Статус изменён: {bulk.set_status(queryset, value)}')
+
+    action.__name__ = f'set_status_{value}'
+    return action
+
+
+@admin.register(Book)
+class BookAdmin(CatalogAdmin):
+    list_display = ('title', 'author', 'genre', 'publication_year', 'updated_at')
+    # Фильтр по жанру и сортировка по названию идут по индексу (genre, title, id)
+    list_filter = ('genre',)
+    ordering = ('title', 'id')
+    search_fields = ('title', 'author')
+    bulk_delete = staticmethod(bulk.delete_books)
+    actions = ['delete_rows', *(set_genre_action(value, label) for value, label in Book.GENRE_CHOICES)]
+
+    def known_count(self, filters):
+        if not filters:
+            return get_counters()['books']
+        if filters.keys() == {'genre__exact'}:
+            cells = BookFacet.objects.filter(genre=filters['genre__exact'])
+            return cells.aggregate(total=Sum('count'))['total'] or 0
+        return None
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по индексу каталога (FTS5) вместо LIKE '%...%' по всей таблице.
+        Его же использует автодополнение книги на странице статуса.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_ids(search_term, limit=ADMIN_SEARCH_LIMIT)), False
+
+    def save_model(self, request, obj, form, change):
+        """
+        Сохраняет книгу как страница редактирования: при смене обложки
+        в очередь ставятся нарезка новой и удаление старых файлов.
+        """
+        old_cover = form.initial.get('cover_image')
+        old_cover = old_cover.name if old_cover else ''
+        old_cover_hash = obj.cover_hash
+        if (obj.cover_image.name or '') != old_cover:
+            obj.cover_hash = ''
+        save_book(obj, old_cover, old_cover_hash)
+
+
+@admin.register(UserStatus)
+class UserStatusAdmin(CatalogAdmin):
+    list_display = ('user', 'book', 'reading_status', 'updated_at')
+    # __str__ статуса обращается к пользователю и книге - загружаем их тем же запросом
+    list_select_related = ('user', 'book')
+    # Фильтр по статусу идёт по индексу (reading_status, id)
+    list_filter = ('reading_status',)
+    ordering = ('-id',)
+    # Поиск - статусы пользователя по точному имени (см. get_search_results)
+    search_fields = ('user__username',)
+    autocomplete_fields = ('user', 'book')
+    bulk_delete = staticmethod(bulk.delete_statuses)
+    actions = ['delete_rows', *(set_status_action(value, label) for value, label in UserStatus.READING_STATUS)]
+
+    def known_count(self, filters):
+        statuses = get_counters()['statuses']
+        if not filters:
+            return sum(statuses.values())
+        if filters.keys() == {'reading_status__exact'}:
+            return statuses.get(filters['reading_status__exact'], 0)
+        return None
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Точное имя пользователя ищется по уникальному индексу username,
+        без LIKE по всем статусам.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(user__username=search_term.strip()), False
@@ -0,0 +1,383 @@
+"""
+JSON API каталога (версия 1) для мобильного клиента.
+
+Книги и полки отдаются с сильным ETag по версиям строк (поле version -
+номер записи в журнале изменений, его меняет и массовое обновление) и
+Last-Modified по updated_at. Валидаторы последнего ответа лежат в кэше под версиями
+тегов (как страницы в cache_page_by_tags), поэтому повторный запрос с
+If-None-Match к неизменившемуся ресурсу получает 304 без чтения таблиц
+и без сериализации.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
+
+from .cache import CATALOG, book_tag, page_key, shelf_tag, tag_versions
+from .changes import ChangesExpired, read_changes
+from .db import read_only_view, serialized_write
+from .loaders import INTEGER_RANGE, get_books
+from .models import Book, UserStatus
+from .pagination import InvalidCursor, get_page
+from .renditions import cover_url
+from .views import user_book_statuses
+
+
+# Поля книги в API: имя -> (поля модели, значение)
+BOOK_FIELDS = {
+    'id': (('id',), lambda book: book.id),
+    'title': (('title',), lambda book: book.title),
+    'author': (('author',), lambda book: book.author),
+    'publication_year': (('publication_year',), lambda book: book.publication_year),
+    'genre': (('genre',), lambda book: book.genre),
+    'description': (('description',), lambda book: book.description),
+    'cover_url': (('cover_image', 'cover_hash'), lambda book: cover_url(book, 'detail') or None),
+    'updated_at': (('updated_at',), lambda book: book.updated_at.isoformat()),
+}
+
+# Поля по умолчанию в списке (описание длинное, его запрашивают явно)
+LIST_FIELDS = ('id', 'title', 'author', 'publication_year', 'genre', 'cover_url', 'updated_at')
+
+# Размер страницы списка и выдачи изменений
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Сколько статусов можно поменять одним запросом
+BULK_LIMIT = 200
+
+
+class ApiError(ValueError):
+    """
+    Ошибка в параметрах запроса (ответ 400).
+    """
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """
+    Превращает ApiError и InvalidCursor в ответ 400 с JSON.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except (ApiError, InvalidCursor) as error:
+            return _error(str(error))
+
+    return wrapper
+
+
+def api_login_required(view):
+    """
+    Как login_required, но вместо перенаправления на вход - 401 с JSON.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Требуется вход', status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _fields(request, default):
+    """
+    Запрошенные поля книги (?fields=id,title) и поля модели для only().
+    """
+    raw = request.GET.get('fields')
+    names = [name.strip() for name in raw.split(',') if name.strip()] if raw else list(default)
+    unknown = [name for name in names if name not in BOOK_FIELDS]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    # id, version и updated_at нужны для валидаторов всегда
+    model_fields = {'id', 'version', 'updated_at'}
+    for name in names:
+        model_fields.update(BOOK_FIELDS[name][0])
+    return names, sorted(model_fields)
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def serialize_book(book, names):
+    return {name: BOOK_FIELDS[name][1](book) for name in names}
+
+
+def _validators(request, versions):
+    """
+    Сильный ETag и Last-Modified по строкам [(тип, id, version, updated_at), ...].
+    ETag считается по version, updated_at идёт только в Last-Modified.
+    В ETag входит и адрес запроса: от него зависят поля и страница.
+    """
+    digest = hashlib.sha1(request.get_full_path().encode('utf-8'))
+    if request.user.is_authenticated:
+        digest.update(f'|user{request.user.pk}'.encode())
+    for kind, pk, version, _ in versions:
+        digest.update(f'|{kind}{pk}@{version}'.encode())
+    last_modified = max((updated_at for *_, updated_at in versions), default=None)
+    return f'"{digest.hexdigest()}"', int(last_modified.timestamp()) if last_modified else None
+
+
+def _finish(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    # Клиент хранит ответ, но перед использованием переспрашивает сервер
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_json(request, view_name, tags, load, versions, serialize, missing=None):
+    """
+    Ответ JSON с ETag и Last-Modified и проверкой условных заголовков.
+
+    load() читает строки из БД, versions(rows) - их версии для валидаторов,
+    serialize(rows) - данные ответа. Если ресурс не менялся с прошлого
+    ответа (теги те же), валидаторы берутся из кэша и 304 отдаётся без load().
+    Если задан missing, пустой результат load() - это 404 с таким текстом.
+    """
+    key = 'api:' + page_key(view_name, request, request.user, True, False, tags, tag_versions(tags))
+    cached = cache.get(key)
+    if cached:
+        response = get_conditional_response(request, etag=cached[0], last_modified=cached[1])
+        if response is not None:
+            return _finish(response, *cached)
+
+    rows = load()
+    if missing and not rows:
+        return _error(missing, status=404)
+    validators = _validators(request, versions(rows))
+    cache.set(key, validators, settings.VIEW_CACHE_TIMEOUT)
+    response = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+    if response is None:
+        response = JsonResponse(serialize(rows))
+    return _finish(response, *validators)
+
+
+@read_only_view
+@require_GET
+@api_view
+def book_list(request):
+    """Список книг с курсорной пагинацией: ?cursor=&order=title|id&limit=&fields="""
+    names, model_fields = _fields(request, LIST_FIELDS)
+    ordering = request.GET.get('order', 'title')
+    limit = _limit(request)
+
+    def load():
+        return get_page(
+            Book.objects.all(), cursor=request.GET.get('cursor'),
+            ordering=ordering, size=limit, fields=model_fields,
+        )
+
+    return conditional_json(
+        request, 'api_books', [CATALOG], load,
+        versions=lambda page: [('b', book.id, book.version, book.updated_at) for book in page[0]],
+        serialize=lambda page: {
+            'results': [serialize_book(book, names) for book in page[0]],
+            'next': page[1],
+        },
+    )
+
+
+@read_only_view
+@require_GET
+@api_view
+def book_detail(request, book_id):
+    """Одна книга: ?fields="""
+    names, _ = _fields(request, BOOK_FIELDS)
+
+    def load():
+        # Вся строка из памяти процесса, если книга не менялась (catalog.loaders)
+        return list(get_books([book_id]).values())
+
+    return conditional_json(
+        request, 'api_book', [book_tag(book_id)], load,
+        versions=lambda books: [('b', book.id, book.version, book.updated_at) for book in books],
+        serialize=lambda books: serialize_book(books[0], names),
+        missing='Книга не найдена',
+    )
+
+
+def _serialize_shelves(statuses):
+    shelves = {value: [] for value, _ in UserStatus.READING_STATUS}
+    for status in statuses:
+        shelves.setdefault(status.reading_status, []).append({
+            'book': {
+                'id': status.book.id,
+                'title': status.book.title,
+                'author': status.book.author,
+                'cover_url': cover_url(status.book, 'small') or None,
+            },
+            'updated_at': status.updated_at.isoformat(),
+        })
+    return {
+        'shelves': shelves,
+        'counts': {value: len(items) for value, items in shelves.items()},
+    }
+
+
+@read_only_view
+@require_GET
+@ensure_csrf_cookie
+@api_login_required
+def my_shelves(request):
+    """Книги пользователя по статусам (как страница "Мои книги")"""
+    return conditional_json(
+        request, 'api_shelves', [shelf_tag(request.user.pk), CATALOG],
+        lambda: list(user_book_statuses(request.user)),
+        versions=lambda statuses: [
+            row
+            for status in statuses
+            for row in (
+                ('s', status.id, status.version, status.updated_at),
+                ('b', status.book.id, status.book.version, status.book.updated_at),
+            )
+        ],
+        serialize=_serialize_shelves,
+    )
+
+
+def _parse_updates(request):
+    """
+    Разбирает {"statuses": [{"book": id, "status": "finished" | null}, ...]}.
+    """
+    try:
+        items = json.loads(request.body)['statuses']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError('Ожидается JSON вида {"statuses": [{"book": id, "status": "..."}]}')
+    if not isinstance(items, list) or not items:
+        raise ApiError('statuses должен быть непустым списком')
+    if len(items) > BULK_LIMIT:
+        raise ApiError(f'Не больше {BULK_LIMIT} статусов за запрос')
+
+    allowed = UserStatus.READING_STATUS_LABELS
+    updates = {}
+    for item in items:
+        # bool - тоже int для isinstance, поэтому тип сравнивается точно
+        if not isinstance(item, dict) or type(item.get('book')) is not int or item['book'] not in INTEGER_RANGE:
+            raise ApiError('У каждого статуса должен быть числовой book')
+        if item.get('status') is not None and item['status'] not in allowed:
+            raise ApiError(f'Неизвестный статус: {item["status"]}')
+        # Если книга повторяется, действует последний статус
+        updates[item['book']] = item.get('status')
+
+    missing = set(updates) - set(Book.objects.filter(id__in=updates).values_list('id', flat=True))
+    if missing:
+        raise ApiError(f'Книги не найдены: {", ".join(map(str, sorted(missing)))}')
+    return updates
+
+
+@serialized_write
+def apply_status_updates(user, updates):
+    """
+    Меняет статусы пользователя одной транзакцией: {id книги: статус или None (удалить)}.
+    """
+    deleted = UserStatus.objects.filter(
+        user=user, book_id__in=[book_id for book_id, status in updates.items() if status is None]
+    ).delete()[0]
+    for book_id, status in updates.items():
+        if status is not None:
+            UserStatus.objects.update_or_create(user=user, book_id=book_id, defaults={'reading_status': status})
+    return deleted
+
+
+@require_POST
+@api_view
+@api_login_required
+def update_statuses(request):
+    """Массовая смена статусов: POST {"statuses": [{"book": 1, "status": "finished"}, {"book": 2, "status": null}]}"""
+    updates = _parse_updates(request)
+    deleted = apply_status_updates(request.user, updates)
+    statuses = UserStatus.objects.filter(user=request.user, book_id__in=updates).only(
+        'book_id', 'reading_status', 'updated_at',
+    )
+    return JsonResponse({
+        'statuses': [
+            {'book': status.book_id, 'status': status.reading_status, 'updated_at': status.updated_at.isoformat()}
+            for status in statuses
+        ],
+        'deleted': deleted,
+    })
+
+
+def _since(request):
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        raise ApiError('since должен быть числом')
+    if since < 0:
+        raise ApiError('since должен быть числом')
+    return since
+
+
+def _latest(entries, model):
+    """
+    id строк модели из записей журнала, каждый один раз - на месте последней
+    записи о строке (важна только она), то есть по возрастанию версий строк.
+    """
+    ids = [entry.object_id for entry in entries if entry.model == model]
+    return list(dict.fromkeys(reversed(ids)))[::-1]
+
+
+@read_only_view
+@require_GET
+@api_view
+def changes(request):
+    """
+    Изменения после версии: ?since=<next из прошлого ответа>&limit=&fields=
+
+    Без since отдаётся весь каталог (первая синхронизация). Книги - все,
+    статусы - только свои. Удалённые строки приходят в deleted_books и
+    deleted_statuses. Если журнал сжат после since - 410, нужно начать заново.
+    """
+    names, model_fields = _fields(request, LIST_FIELDS)
+    query = Q(model='book', user_id__isnull=True)
+    if request.user.is_authenticated:
+        query |= Q(model='userstatus', user_id=request.user.pk)
+    try:
+        entries, next_version, more = read_changes(_since(request), _limit(request), query)
+    except ChangesExpired as error:
+        return _error(str(error), status=410)
+
+    book_ids = _latest(entries, 'book')
+    books = {book.id: book for book in Book.objects.filter(id__in=book_ids).only(*model_fields)}
+    status_ids = _latest(entries, 'userstatus')
+    statuses = {
+        status.id: status
+        for status in UserStatus.objects.filter(user=request.user, id__in=status_ids).only(
+            'id', 'book_id', 'reading_status', 'updated_at',
+        )
+    } if status_ids else {}
+
+    return JsonResponse({
+        'books': [serialize_book(books[book_id], names) for book_id in book_ids if book_id in books],
+        'deleted_books': [book_id for book_id in book_ids if book_id not in books],
+        'statuses': [
+            {
+                'id': status.id,
+                'book': status.book_id,
+                'status': status.reading_status,
+                'updated_at': status.updated_at.isoformat(),
+            }
+            for status in (statuses[status_id] for status_id in status_ids if status_id in statuses)
+        ],
+        'deleted_statuses': [status_id for status_id in status_ids if status_id not in statuses],
+        'next': next_version,
+        'more': more,
+    })
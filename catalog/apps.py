@@ -2,4 +2,13 @@ from django.apps import AppConfig
 
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'catalog'
\ No newline at end of file
+    name = 'catalog'
+
+    def ready(self):
+        # Подключаем обработчики сигналов моделей
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metrics import install_query_recorder
+        # Запись SQL-запросов для метрик на всех новых соединениях
+        connection_created.connect(install_query_recorder)
\ No newline at end of file
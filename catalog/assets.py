@@ -0,0 +1,120 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.views import serve as serve_from_finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Какие файлы сжимаем заранее (шрифты woff/woff2 и картинки уже сжаты)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.json', '.map')
+
+# Файлы меньше этого размера не сжимаем: выигрыш меньше заголовков
+MIN_COMPRESS_SIZE = 512
+
+# Имя с хешем содержимого от ManifestStaticFilesStorage: base.1a2b3c4d5e6f.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+# Файлы с хешем в имени никогда не меняются, их можно кэшировать на год
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'public, max-age=0, must-revalidate'
+
+# Варианты сжатия в порядке предпочтения: (Accept-Encoding, расширение)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path):
+    """
+    Кладёт рядом с файлом сжатые копии .gz и .br (если установлен brotli).
+    Копия не сохраняется, если она не меньше исходного файла.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+
+    # mtime=0, чтобы повторный collectstatic давал те же байты
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """
+    Хранилище для collectstatic: имена файлов с хешем содержимого
+    (как у ManifestStaticFilesStorage) и заранее сжатые gzip/brotli копии.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                compress_file(self.path(name))
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve_static(request, path):
+    """
+    Отдаёт файлы из STATIC_ROOT после collectstatic.
+
+    Файлы с хешем в имени кэшируются браузером навсегда, если клиент
+    поддерживает сжатие - отдаётся готовая .br или .gz копия. При DEBUG
+    файл, которого нет в STATIC_ROOT, ищется в static/ и приложениях, как
+    у runserver: под uvicorn страницы работают и без collectstatic.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        if settings.DEBUG:
+            return serve_from_finders(request, path)
+        raise Http404
+
+    stat = os.stat(full_path)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    serve_path, encoding = full_path, None
+    accepted = _accepted_encodings(request)
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            serve_path, encoding = full_path + suffix, name
+            break
+
+    response = FileResponse(open(serve_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    # FileResponse подставляет имя файла, а у сжатой копии оно с .gz/.br
+    del response['Content-Disposition']
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE if HASHED_NAME.search(path) else REVALIDATE_CACHE
+    return response
@@ -0,0 +1,129 @@
+"""
+Асинхронные варианты страниц, которые только читают данные.
+
+Используются вместо обычных при settings.ASYNC_VIEWS = True (запуск через
+ASGI-сервер, например uvicorn settings.asgi:application). Пока запрос ждёт
+базу, поток сервера не занят. Формирование контекста общее с views.py.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.shortcuts import redirect, render
+
+from .cache import COUNTERS, cache_page_by_tags
+from .db import read_only_view, serialized_write
+from .facets import facet_counts
+from .loaders import book_id, get_loader
+from .models import UserStatus
+from .pagination import aget_page
+from .recommendations import recommended_ids
+from .stats import aget_counters
+from .views import (
+    RECOMMENDATIONS_LIMIT, _book_detail_path, _book_detail_tags, _catalog_tags, browse_filters, catalog_context,
+    filtered_books, home_context, home_users, my_books_context, set_reading_status, user_book_statuses,
+)
+
+
+def load_user(view):
+    """
+    Загружает пользователя асинхронно до вызова представления.
+
+    Ленивый request.user обращается к БД синхронно, а в асинхронном коде
+    это запрещено, поэтому его заменяем уже загруженным пользователем
+    (его используют шаблоны, теги кэша и формы).
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@read_only_view
+@load_user
+@cache_page_by_tags(lambda request: [COUNTERS], per_user=True)
+async def home(request):
+    """Главная страница со списком пользователей"""
+    # Пользователи и общая статистика не зависят друг от друга - запрашиваем параллельно
+    users, counters = await asyncio.gather(
+        _as_list(home_users()),
+        aget_counters(),
+    )
+    return render(request, 'main_page.html', home_context(users, counters))
+
+
+@read_only_view
+@load_user
+@cache_page_by_tags(_catalog_tags, per_user=True)
+async def book_list(request):
+    """Список всех книг (все пользователи видят все книги) с фильтрами"""
+    filters = browse_filters(request)
+    # Полки и количества для фильтров не зависят друг от друга - запрашиваем параллельно
+    (books, next_cursor), counts = await asyncio.gather(
+        aget_page(filtered_books(request.user, filters)),
+        sync_to_async(facet_counts)(request.user, **filters),
+    )
+    return render(request, 'catalog.html', catalog_context(books, next_cursor, filters, counts))
+
+
+@read_only_view
+@load_user
+@cache_page_by_tags(_book_detail_tags, per_user=True, csrf=True, messages=True, path=_book_detail_path)
+async def book_detail(request):
+    """Детальная информация о книге"""
+    pk = book_id(request.GET.get('id'))
+
+    if pk is None:
+        messages.error(request, 'Книга не найдена')
+        return redirect('catalog')
+
+    loader = get_loader(request)
+    recommended = await _as_list(recommended_ids(pk, RECOMMENDATIONS_LIMIT))
+    loader.want_books(recommended)
+    book = await loader.abook(pk)
+    if book is None:
+        messages.error(request, 'Книга не найдена')
+        return redirect('catalog')
+
+    if request.method == 'POST':
+        if request.user.is_authenticated:
+            # Обновление статуса
+            reading_status = request.POST.get('reading_status')
+            if reading_status:
+                if reading_status not in UserStatus.READING_STATUS_LABELS:
+                    return HttpResponseBadRequest('Неизвестный статус чтения')
+                # Запись идёт через общую очередь записи процесса
+                await sync_to_async(set_reading_status)(request.user, book, reading_status)
+                messages.success(request, 'Статус обновлен!')
+                return redirect(f'/catalog/book/?id={pk}')
+
+            # Удаление книги
+            if 'delete_book' in request.POST:
+                await sync_to_async(serialized_write(book.delete))()
+                messages.success(request, 'Книга удалена!')
+                return redirect('catalog')
+
+    context = {
+        'book': book,
+        'user_status': await loader.astatus(book.id),
+        'recommendations': list((await loader.abooks(recommended)).values()),
+    }
+    return render(request, 'book.html', context)
+
+
+@read_only_view
+@load_user
+@login_required
+async def my_books(request):
+    """Страница с книгами пользователя"""
+    user_statuses = await _as_list(user_book_statuses(request.user))
+    return render(request, 'profil.html', my_books_context(user_statuses))
+
+
+async def _as_list(queryset):
+    return [item async for item in queryset]
@@ -0,0 +1,155 @@
+"""
+Быстрый путь сессий и входа.
+
+Запрос вошедшего пользователя по умолчанию читает сессию из django_session
+и строку auth_user. Хранилище сессий выбирается settings.SESSION_BACKEND
+(cached_db и signed_cookies не читают таблицу), а CachedModelBackend
+держит загруженных пользователей в кэше 'sessions' и сбрасывает их при
+сохранении (сигналы). Анонимный запрос без cookie сессии базу не трогает:
+сессия и пользователь загружаются лениво, только при обращении.
+
+Неудачные попытки входа считаются в том же кэше: после
+LOGIN_ATTEMPTS_PER_USER неудач для имени или неудач для LOGIN_ATTEMPTS_PER_IP
+разных имён с одного адреса вход отклоняется до проверки пароля, то есть
+без хеширования PBKDF2.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import router
+
+
+def _cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def user_key(user_id):
+    # id из сессии - строка, из сигналов - число
+    return f'auth-user:{user_id}'
+
+
+def _cached_fields():
+    # Хеш пароля в кэш не попадает (у файлового кэша он оказался бы на диске)
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+
+
+def _to_cache(user):
+    return [getattr(user, name) for name in _cached_fields()], user.get_session_auth_hash()
+
+
+def _from_cache(entry):
+    """
+    Пользователь из записи кэша. Поле password отложено: обращение к нему
+    (проверка или смена пароля) дочитывает его из базы. Сессию Django проверяет
+    готовым HMAC из записи - он и так хранится в самой сессии.
+    """
+    values, session_hash = entry
+    model = get_user_model()
+    user = model.from_db(router.db_for_read(model), _cached_fields(), values)
+    user.get_session_auth_hash = lambda: session_hash
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт пользователя сессии из кэша.
+
+    Кэшируется только найденный активный пользователь, без хеша пароля, на
+    settings.AUTH_USER_CACHE_TIMEOUT секунд (0 - читать auth_user каждый раз).
+    Проверка сессии сравнивает её хеш с сохранённым, поэтому смена пароля
+    (сигнал сбрасывает кэш) завершает остальные сессии.
+    """
+
+    def get_user(self, user_id):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+        key = user_key(user_id)
+        entry = _cache().get(key)
+        if entry is not None:
+            return _from_cache(entry)
+        user = super().get_user(user_id)
+        if user is not None:
+            _cache().set(key, _to_cache(user), timeout)
+        return user
+
+    async def aget_user(self, user_id):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if not timeout:
+            return await super().aget_user(user_id)
+        key = user_key(user_id)
+        entry = await _cache().aget(key)
+        if entry is not None:
+            return _from_cache(entry)
+        user = await super().aget_user(user_id)
+        if user is not None:
+            await _cache().aset(key, _to_cache(user), timeout)
+        return user
+
+
+def forget_user(user_id):
+    """
+    Убирает пользователя из кэша (после изменения или удаления).
+    """
+    _cache().delete(user_key(user_id))
+
+
+def _attempt_keys(request, username):
+    """
+    Ключи счётчиков: имени, адреса и пары (адрес, имя).
+    """
+    # Имя хешируем: в ключ кэша не должны попадать произвольные символы
+    name = hashlib.sha1((username or '').lower().encode('utf-8')).hexdigest()
+    ip = request.META.get('REMOTE_ADDR', '')
+    return f'login-attempts:user:{name}', f'login-attempts:ip:{ip}', f'login-attempts:ip:{ip}:user:{name}'
+
+
+def _increment(cache, key):
+    # Окно отсчитывается от первой неудачи
+    if cache.add(key, 1, settings.LOGIN_ATTEMPTS_WINDOW):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Окно закончилось между add и incr
+        cache.add(key, 1, settings.LOGIN_ATTEMPTS_WINDOW)
+
+
+def login_blocked(request, username):
+    """
+    True, если для этого имени или с этого адреса уже слишком много неудачных попыток.
+    Одно чтение кэша, пароль не проверяется.
+    """
+    name_key, ip_key, _ = _attempt_keys(request, username)
+    attempts = _cache().get_many([name_key, ip_key])
+    return (
+        attempts.get(name_key, 0) >= settings.LOGIN_ATTEMPTS_PER_USER
+        or attempts.get(ip_key, 0) >= settings.LOGIN_ATTEMPTS_PER_IP
+    )
+
+
+def login_failed(request, username):
+    """
+    Считает неудачную попытку.
+
+    Адрес считает не попытки, а разные имена с неудачами: опечатки одного
+    пользователя за общим NAT не закрывают вход всем остальным с этого адреса
+    (их ограничивает счётчик имени), а перебор многих имён - закрывает.
+    """
+    cache = _cache()
+    name_key, ip_key, pair_key = _attempt_keys(request, username)
+    _increment(cache, name_key)
+    if cache.add(pair_key, 1, settings.LOGIN_ATTEMPTS_WINDOW):
+        _increment(cache, ip_key)
+
+
+def login_succeeded(request, username):
+    """
+    Сбрасывает неудачные попытки для имени. Счётчик адреса остаётся:
+    вход в свой аккаунт не должен открывать перебор чужих.
+    """
+    name_key, _, _ = _attempt_keys(request, username)
+    _cache().delete(name_key)
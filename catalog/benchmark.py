@@ -0,0 +1,93 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+
+
+def percentiles(samples):
+    """
+    p50, p90, p99 и среднее по списку замеров в секундах (результат в мс).
+    """
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {'p50': value, 'p90': value, 'p99': value, 'mean': value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'p50': round(cuts[49] * 1000, 3),
+        'p90': round(cuts[89] * 1000, 3),
+        'p99': round(cuts[98] * 1000, 3),
+        'mean': round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def measure(action, repeat, warmup=1):
+    """
+    Выполняет action repeat раз и собирает задержки, число запросов к БД
+    (по последнему вызову) и пиковую память (отдельным вызовом под tracemalloc).
+    """
+    for _ in range(warmup):
+        action()
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        samples.append(time.perf_counter() - started)
+
+    # Считаем запросы обёрткой курсора: лог запросов Django очищается
+    # в начале каждого запроса и для этого не подходит
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        action()
+
+    # tracemalloc сильно замедляет код, поэтому память меряем отдельно от времени
+    tracemalloc.start()
+    try:
+        action()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = percentiles(samples)
+    result['requests'] = repeat
+    result['queries'] = len(queries)
+    result['peak_kb'] = round(peak / 1024, 1)
+    return result
+
+
+def compare(baseline, current, threshold=1.2):
+    """
+    Сравнивает два отчёта. Регрессия - рост числа запросов или p50/p90
+    больше чем в threshold раз. Возвращает список строк с описанием регрессий.
+    """
+    regressions = []
+    for name, new in current.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if new['queries'] > old['queries']:
+            regressions.append(f'{name}: запросов к БД {old["queries"]} -> {new["queries"]}')
+        for key in ('p50', 'p90'):
+            if old[key] and new[key] > old[key] * threshold:
+                regressions.append(f'{name}: {key} {old[key]:.2f} -> {new[key]:.2f} мс')
+    return regressions
+
+
+def save_report(path, results, meta=None):
+    """
+    Сохраняет результаты в JSON, чтобы сравнивать их между запусками.
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'meta': meta or {}, 'results': results}, file, ensure_ascii=False, indent=2)
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['results']
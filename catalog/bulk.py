@@ -0,0 +1,339 @@
+import csv
+import json
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache, changes, facets, recommendations, stats
+from .db import serialized_write
+from .models import Book, BookNeighbor, UserStatus
+from .renditions import schedule_cleanup, schedule_cover_delete
+from .search import python_index, uses_fts
+
+
+# Колонки файлов импорта и экспорта
+FIELDS = ('title', 'author', 'publication_year', 'genre', 'description')
+
+FORMATS = ('csv', 'jsonl')
+
+# Сколько строк меняет один UPDATE или DELETE в массовых операциях
+CHUNK_SIZE = 2000
+
+
+def detect_format(path, default='csv'):
+    """
+    Определяет формат файла по расширению.
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(file, file_format):
+    """
+    Построчно читает записи из CSV или JSON Lines, не загружая файл целиком.
+    Отдаёт пары (номер строки, словарь полей).
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, ValueError(f'некорректный JSON: {error}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ValueError('ожидается JSON-объект')
+            continue
+        yield line_number, row
+
+
+def clean_row(row):
+    """
+    Проверяет запись теми же валидаторами, что и модель Book.
+    Возвращает словарь значений полей или бросает ValidationError.
+    """
+    values = {}
+    errors = {}
+    for name in FIELDS:
+        field = Book._meta.get_field(name)
+        raw = row.get(name)
+        if isinstance(raw, str):
+            raw = raw.strip()
+        if raw in (None, ''):
+            raw = None if field.null else field.get_default()
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def _save_batch(batch):
+    """
+    Сохраняет пачку книг, пропуская те, что уже есть в каталоге.
+    Возвращает число добавленных книг.
+    """
+    titles = {book.title for book in batch}
+    with transaction.atomic():
+        existing = set(Book.objects.filter(title__in=titles).values_list('title', 'author'))
+        new_books = [book for book in batch if (book.title, book.author) not in existing]
+        Book.objects.bulk_create(new_books)
+        # bulk_create не вызывает сигналы, поэтому счётчик, журнал изменений и фильтры правим сами
+        stats.bump_counter(stats.BOOKS, len(new_books))
+        changes.record_untracked(Book)
+        facets.books_added(new_books)
+    return len(new_books)
+
+
+def import_books(rows, batch_size=1000, on_error=None, on_batch=None):
+    """
+    Импортирует книги пачками через bulk_create.
+
+    rows - пары (номер строки, словарь полей) из read_rows.
+    Дубликаты по (название, автор) пропускаются: внутри пачки по множеству,
+    с уже сохранёнными книгами - запросом к БД по названиям пачки.
+    Возвращает словарь со счётчиками created, duplicates, invalid.
+    """
+    result = {'created': 0, 'duplicates': 0, 'invalid': 0}
+    batch = []
+    seen = set()
+
+    def flush():
+        created = _save_batch(batch)
+        result['created'] += created
+        result['duplicates'] += len(batch) - created
+        batch.clear()
+        seen.clear()
+        if on_batch:
+            on_batch(result)
+
+    for line_number, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise ValidationError(str(row))
+            values = clean_row(row)
+        except ValidationError as error:
+            result['invalid'] += 1
+            if on_error:
+                on_error(line_number, error)
+            continue
+
+        key = (values['title'], values['author'])
+        if key in seen:
+            result['duplicates'] += 1
+            continue
+        seen.add(key)
+        batch.append(Book(**values))
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    if result['created']:
+        cache.invalidate(cache.CATALOG, cache.COUNTERS)
+        # На SQLite поисковый индекс обновили триггеры, иначе перестроим при поиске
+        if not uses_fts():
+            python_index.ready = False
+    return result
+
+
+def export_rows(file, file_format, queryset=None):
+    """
+    Пишет книги в CSV или JSON Lines, читая таблицу порциями через iterator().
+    Возвращает число записанных книг.
+    """
+    if queryset is None:
+        queryset = Book.objects.all()
+    rows = queryset.order_by('id').values_list('id', *FIELDS).iterator(chunk_size=2000)
+
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(('id',) + FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+
+    columns = ('id',) + FIELDS
+    for row in rows:
+        file.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def _chunks(queryset):
+    """
+    id строк queryset пачками по CHUNK_SIZE, по возрастанию id. Следующая
+    пачка выбирается после обработки предыдущей, поэтому фильтр queryset
+    может зависеть от меняемых полей (например, фильтр админки по жанру).
+    """
+    last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def set_genre(queryset, genre):
+    """
+    Меняет жанр книг queryset: на пачку один UPDATE вместо сохранения каждой книги.
+    Журнал изменений, фильтры каталога и кэш правятся так же, как сигналами.
+    Возвращает число изменённых книг.
+    """
+    updated = sum(_set_genre(ids, genre) for ids in _chunks(queryset))
+    # Запасной поисковый индекс фильтрует по жанру - перестроим при поиске
+    if updated and not uses_fts():
+        python_index.ready = False
+    return updated
+
+
+@serialized_write
+def _set_genre(ids, genre):
+    books = Book.objects.filter(pk__in=ids).exclude(genre=genre)
+    facets.genre_changed(books, genre)
+    changed = list(books.values_list('pk', flat=True))
+    updated = changes.stamp_bulk_update(books, genre=genre, updated_at=timezone.now())
+    cache.invalidate(cache.CATALOG, *(cache.book_tag(book_id) for book_id in changed))
+    return updated
+
+
+def set_status(queryset, reading_status):
+    """
+    Ставит статус чтения reading_status всем статусам queryset одним UPDATE на пачку.
+    Возвращает число изменённых статусов.
+    """
+    return sum(_set_status(ids, reading_status) for ids in _chunks(queryset))
+
+
+@serialized_write
+def _set_status(ids, reading_status):
+    statuses = UserStatus.objects.filter(pk__in=ids).exclude(reading_status=reading_status)
+    rows = list(statuses.values_list('user_id', 'book_id', 'reading_status'))
+    if not rows:
+        return 0
+    facets.statuses_changed(statuses, reading_status)
+    updated = changes.stamp_bulk_update(statuses, reading_status=reading_status, updated_at=timezone.now())
+    _statuses_moved(rows, reading_status)
+    return updated
+
+
+def delete_statuses(queryset):
+    """
+    Удаляет статусы queryset одним DELETE на пачку, без загрузки строк и сигналов.
+    Возвращает число удалённых статусов.
+    """
+    return sum(_delete_statuses(ids) for ids in _chunks(queryset))
+
+
+def _delete_where(model, ids, *columns):
+    """
+    Удаляет строки model, у которых любая из колонок columns входит в ids,
+    одним DELETE. Сборщик Django (QuerySet.delete) загрузил бы каждую строку
+    и вызвал бы по ней сигналы, поэтому он не используется: всё, что делают
+    сигналы удаления (журнал, счётчики, ячейки фильтров, рекомендации,
+    обложки, кэш), вызывающий выполняет сам в той же транзакции.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    where = ' OR '.join(f'{quote(model._meta.get_field(column).column)} IN ({placeholders})' for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE {where}', list(ids) * len(columns))
+        return cursor.rowcount
+
+
+@serialized_write
+def _delete_statuses(ids):
+    statuses = UserStatus.objects.filter(pk__in=ids)
+    rows = list(statuses.values_list('user_id', 'book_id', 'reading_status'))
+    facets.statuses_changed(statuses, None)
+    changes.record_bulk_delete(statuses)
+    deleted = _delete_where(UserStatus, ids, 'id')
+    _statuses_moved(rows, None)
+    return deleted
+
+
+def _statuses_moved(rows, new_status, refresh=True):
+    """
+    Счётчики, рекомендации и кэш после массовой смены или удаления статусов.
+    rows - (пользователь, книга, прежний статус), new_status None - статусы удалены.
+    """
+    for old_status, count in Counter(old_status for _, _, old_status in rows).items():
+        stats.bump_counter(stats.status_counter(old_status), -count)
+    if new_status:
+        stats.bump_counter(stats.status_counter(new_status), len(rows))
+    users = {user_id for user_id, _, _ in rows}
+    stats.recount_users(users)
+
+    if refresh:
+        weights = recommendations.STATUS_WEIGHTS
+        recommendations.schedule_refresh_many({
+            book_id for _, book_id, old_status in rows
+            if weights.get(old_status) != weights.get(new_status)
+        })
+
+    cache.invalidate(
+        cache.COUNTERS,
+        *(cache.shelf_tag(user_id) for user_id in users),
+        *(cache.status_tag(user_id, book_id) for user_id, book_id, _ in rows),
+    )
+
+
+def delete_books(queryset):
+    """
+    Удаляет книги queryset вместе с их статусами и соседями одним DELETE
+    на таблицу и пачку. Сборщик Django загрузил бы каждую книгу и каждый
+    статус и вызвал бы по ним сигналы. Возвращает число удалённых книг.
+    """
+    deleted = sum(_delete_books(ids) for ids in _chunks(queryset))
+    if deleted and not uses_fts():
+        python_index.ready = False
+    return deleted
+
+
+@serialized_write
+def _delete_books(ids):
+    books = Book.objects.filter(pk__in=ids)
+    statuses = UserStatus.objects.filter(book_id__in=ids)
+    rows = list(statuses.values_list('user_id', 'book_id', 'reading_status'))
+    covers = list(books.exclude(cover_image='').exclude(cover_image=None).values_list('cover_image', 'cover_hash'))
+    # Книги, в чьих списках соседей были удаляемые, пересчитаем заново
+    refresh = set(
+        BookNeighbor.objects.filter(neighbor_id__in=ids).exclude(book_id__in=ids).values_list('book_id', flat=True)
+    )
+
+    facets.books_removed(books)
+    changes.record_bulk_delete(statuses)
+    changes.record_bulk_delete(books)
+    # Каскад ForeignKey вручную: статусы и соседи удаляемых книг
+    _delete_where(UserStatus, ids, 'book')
+    _delete_where(BookNeighbor, ids, 'book', 'neighbor')
+    deleted = _delete_where(Book, ids, 'id')
+
+    stats.bump_counter(stats.BOOKS, -deleted)
+    _statuses_moved(rows, None, refresh=False)
+    recommendations.schedule_refresh_many(refresh)
+    for name, cover_hash in covers:
+        schedule_cover_delete(name)
+        schedule_cleanup(cover_hash)
+    cache.invalidate(cache.CATALOG, cache.COUNTERS, *(cache.book_tag(book_id) for book_id in ids))
+    return deleted
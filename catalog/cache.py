@@ -0,0 +1,265 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+# Тег общих счётчиков (главная страница)
+COUNTERS = 'counters'
+
+# Тег списка книг (каталог, поиск, подгрузка полок)
+CATALOG = 'catalog'
+
+# Тег рекомендаций всех книг (сбрасывается полным пересчётом)
+RECOMMENDATIONS = 'recommendations'
+
+# Счётчики попаданий и промахов по представлениям (в памяти процесса)
+_stats = {'hit': Counter(), 'miss': Counter(), 'bypass': Counter()}
+_stats_lock = threading.Lock()
+
+
+def book_tag(book_id):
+    """
+    Тег страницы одной книги.
+    """
+    return f'book:{book_id}'
+
+
+def status_tag(user_id, book_id):
+    """
+    Тег статуса книги у конкретного пользователя.
+    """
+    return f'status:{user_id}:{book_id}'
+
+
+def shelf_tag(user_id):
+    """
+    Тег всех статусов одного пользователя (его полки в API).
+    """
+    return f'shelf:{user_id}'
+
+
+def recommendations_tag(book_id):
+    """
+    Тег рекомендаций на странице одной книги.
+    """
+    return f'recommendations:{book_id}'
+
+
+def _version_key(tag):
+    return f'tag-version:{tag}'
+
+
+def _new_version():
+    # Время в мс: если ключ версии вытеснят из кэша, новая версия
+    # всё равно не совпадёт со старой и устаревшие страницы не вернутся
+    return int(time.time() * 1000)
+
+
+def tag_versions(tags):
+    """
+    Текущие версии тегов одним обращением к кэшу.
+
+    По ним же проверяют свежесть своих данных другие кэши (строки книг
+    в catalog.loaders, ответы API, обложки полок): запомненное с версией
+    устаревает, когда invalidate() меняет её.
+    """
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def atag_versions(tags):
+    """
+    Асинхронный вариант tag_versions.
+    """
+    keys = [_version_key(tag) for tag in tags]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, _new_version(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    """
+    Сбрасывает все закэшированные страницы с этими тегами.
+
+    Страницы не удаляются по одной: меняется версия тега, и старые
+    ключи просто перестают совпадать.
+
+    Внутри транзакции версия меняется дважды: сразу и после коммита.
+    Запрос, который прочитал новую версию до коммита, видел ещё старые
+    строки и мог сохранить их под этой версией - вторая смена их сбрасывает.
+    """
+    _bump(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(tags))
+
+
+def _bump(tags):
+    for tag in tags:
+        key = _version_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def _count(kind, view_name):
+    with _stats_lock:
+        _stats[kind][view_name] += 1
+
+
+def get_stats():
+    """
+    Попадания, промахи и обходы кэша по представлениям.
+    """
+    with _stats_lock:
+        views = set(_stats['hit']) | set(_stats['miss']) | set(_stats['bypass'])
+        result = {}
+        for view_name in sorted(views):
+            hits, misses = _stats['hit'][view_name], _stats['miss'][view_name]
+            result[view_name] = {
+                'hit': hits,
+                'miss': misses,
+                'bypass': _stats['bypass'][view_name],
+                'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+        return result
+
+
+def _should_bypass(request, user, csrf, messages):
+    """
+    Нужно ли обойти кэш. Возвращает (обход, есть ли у страницы CSRF-токен).
+    """
+    has_csrf = csrf and user.is_authenticated
+    bypass = (
+        request.method not in ('GET', 'HEAD')
+        or (messages and len(get_messages(request)))
+        # Без CSRF-cookie страница выдаст новый токен, его нельзя кэшировать
+        or (has_csrf and settings.CSRF_COOKIE_NAME not in request.COOKIES)
+    )
+    return bypass, has_csrf
+
+
+def page_key(view_name, request, user, per_user, has_csrf, page_tags, versions, path=None):
+    """
+    Ключ закэшированного ответа: представление, адрес (path, по умолчанию
+    полный адрес запроса), пользователь (per_user), CSRF-cookie (has_csrf)
+    и версии тегов page_tags.
+    """
+    scope = 'anon'
+    if per_user and user.is_authenticated:
+        scope = f'user{user.pk}'
+    if has_csrf:
+        scope += ':' + request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+
+    raw_key = '|'.join([
+        view_name,
+        path or request.get_full_path(),
+        scope,
+        *(f'{tag}={version}' for tag, version in zip(page_tags, versions)),
+    ])
+    return 'view:' + hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def cache_page_by_tags(tags, per_user=False, csrf=False, messages=False, path=None):
+    """
+    Кэширует HTML-ответ представления до изменения связанных данных.
+
+    tags(request) возвращает теги, от которых зависит страница.
+    path(request) - адрес для ключа вместо полного адреса запроса, если
+    страница зависит не от всех его параметров или они бывают в разной записи.
+    per_user - страница у авторизованных пользователей своя (имя в меню, статус).
+    csrf - у авторизованных в странице есть формы с CSRF-токеном,
+    ключ зависит от CSRF-cookie.
+    messages - шаблон выводит сообщения, при их наличии кэш не используется.
+    Подходит и для обычных, и для асинхронных представлений.
+    """
+    def decorator(view):
+        view_name = view.__name__
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                bypass, has_csrf = _should_bypass(request, user, csrf, messages)
+                if bypass:
+                    _count('bypass', view_name)
+                    return await view(request, *args, **kwargs)
+
+                page_tags = tags(request)
+                versions = await atag_versions(page_tags)
+                key = page_key(
+                    view_name, request, user, per_user, has_csrf, page_tags, versions, path and path(request),
+                )
+
+                cached = await cache.aget(key)
+                if cached is not None:
+                    _count('hit', view_name)
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                _count('miss', view_name)
+                response = await view(request, *args, **kwargs)
+                if _cacheable(response):
+                    await cache.aset(
+                        key,
+                        (response.content, response['Content-Type']),
+                        settings.VIEW_CACHE_TIMEOUT,
+                    )
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = request.user
+            bypass, has_csrf = _should_bypass(request, user, csrf, messages)
+            if bypass:
+                _count('bypass', view_name)
+                return view(request, *args, **kwargs)
+
+            page_tags = tags(request)
+            key = page_key(
+                view_name, request, user, per_user, has_csrf, page_tags, tag_versions(page_tags),
+                path and path(request),
+            )
+
+            cached = cache.get(key)
+            if cached is not None:
+                _count('hit', view_name)
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            _count('miss', view_name)
+            response = view(request, *args, **kwargs)
+            if _cacheable(response):
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    settings.VIEW_CACHE_TIMEOUT,
+                )
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,257 @@
+"""
+Журнал изменений книг и статусов чтения (ChangeLog).
+
+Каждое изменение строки Book или UserStatus добавляет запись в журнал в той
+же транзакции, номер записи становится версией строки. Потребители (API,
+выгрузки, фоновые задачи) помнят последний прочитанный номер и читают
+только то, что изменилось после него, а не всю таблицу.
+
+Создание и изменение для потребителя одинаковы: по id строки он читает её
+текущее состояние. Если строки уже нет - значит, она удалена.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .db import serialized_write
+from .models import ChangeLog, GlobalCounter, UserStatus
+from .stats import CHANGES_HORIZON
+
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+# Размер пачки при записи журнала для bulk_create
+BATCH_SIZE = 2000
+
+
+class ChangesExpired(Exception):
+    """
+    Курсор старше горизонта журнала: удаления до него уже стёрты
+    compact_changes, нужна полная синхронизация с начала.
+    """
+
+
+def _entry(model, object_id, action, user_id=None):
+    return ChangeLog.objects.create(
+        model=model._meta.model_name, object_id=object_id, action=action, user_id=user_id,
+    )
+
+
+def assign_version(instance):
+    """
+    Добавляет запись в журнал перед сохранением строки и ставит её номер в instance.version.
+    У новой строки ещё нет id - его допишет record_saved.
+    """
+    adding = instance._state.adding
+    entry = _entry(
+        type(instance), None if adding else instance.pk,
+        CREATE if adding else UPDATE, getattr(instance, 'user_id', None),
+    )
+    instance.version = entry.version
+
+
+def record_saved(instance, created, update_fields=None):
+    """
+    Дописывает id созданной строки в её запись журнала. Если строку
+    сохранили с update_fields без version (update_or_create), версию
+    записывает отдельный UPDATE.
+    """
+    if created:
+        ChangeLog.objects.filter(version=instance.version).update(object_id=instance.pk)
+    elif update_fields is not None and 'version' not in update_fields:
+        type(instance).objects.filter(pk=instance.pk).update(version=instance.version)
+
+
+def record_deleted(instance):
+    """
+    Запись об удалении строки.
+    """
+    _entry(type(instance), instance.pk, DELETE, getattr(instance, 'user_id', None))
+
+
+def record_update(model, object_id, user_id=None):
+    """
+    Запись об изменении строки через QuerySet.update() (сигналы не вызываются).
+    Возвращает версию, которую нужно записать в строку тем же update().
+    """
+    return _entry(model, object_id, UPDATE, user_id).version
+
+
+def _log_rows(rows, action):
+    """
+    Пишет в журнал по записи на каждую строку queryset rows пачками bulk_create.
+    Возвращает число записей.
+    """
+    model = rows.model
+    name = model._meta.model_name
+    owner = 'user_id' if model is UserStatus else None
+    rows = rows.order_by('pk')
+    values = rows.values_list('pk', owner) if owner else rows.values_list('pk', flat=True)
+
+    count = 0
+    batch = []
+    for row in values.iterator(chunk_size=BATCH_SIZE):
+        object_id, user_id = row if owner else (row, None)
+        batch.append(ChangeLog(model=name, object_id=object_id, action=action, user_id=user_id))
+        if len(batch) >= BATCH_SIZE:
+            ChangeLog.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        ChangeLog.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+def _latest_version(model):
+    """
+    Подзапрос: версия последней записи журнала о строке (для UPDATE по многим строкам).
+    """
+    return Subquery(
+        ChangeLog.objects.filter(model=model._meta.model_name, object_id=OuterRef('pk'))
+        .order_by('-version').values('version')[:1]
+    )
+
+
+def record_untracked(model):
+    """
+    Пишет в журнал строки с version = 0 - добавленные bulk_create, мимо сигналов.
+    Вызывается в той же транзакции сразу после bulk_create. Возвращает число строк.
+    """
+    rows = model.objects.filter(version=0)
+    count = _log_rows(rows, CREATE)
+    if count:
+        # Версии одним UPDATE по индексу version
+        rows.update(version=_latest_version(model))
+    return count
+
+
+def stamp_bulk_update(queryset, **values):
+    """
+    QuerySet.update() многих строк с записью каждой в журнал (сигналы не вызываются).
+    Вызывается в транзакции, queryset - пачка строк (фильтр по списку id).
+    Возвращает число обновлённых строк.
+    """
+    if not _log_rows(queryset, UPDATE):
+        return 0
+    values['version'] = _latest_version(queryset.model)
+    return queryset.update(**values)
+
+
+def record_bulk_delete(queryset):
+    """
+    Записи об удалении строк queryset, которые удаляются мимо сигналов.
+    Вызывается в той же транзакции до удаления. Возвращает число записей.
+    """
+    return _log_rows(queryset, DELETE)
+
+
+def horizon():
+    """
+    Горизонт журнала: курсоры меньше него устарели (см. ChangesExpired).
+    """
+    value = GlobalCounter.objects.filter(name=CHANGES_HORIZON).values_list('value', flat=True).first()
+    return value or 0
+
+
+def latest_version():
+    """
+    Номер последней записи журнала (0, если журнал пуст).
+    """
+    return ChangeLog.objects.aggregate(latest=Max('version'))['latest'] or 0
+
+
+def read_changes(after=0, limit=1000, query=None):
+    """
+    Записи журнала после версии after по порядку, не больше limit.
+
+    query - Q-фильтр по записям (модель, владелец статуса). Возвращает
+    (записи, курсор для следующего вызова, есть ли ещё записи).
+    Курсор 0 - чтение с начала, оно устареть не может: последняя запись
+    о каждой живой строке сжатием журнала не удаляется.
+    """
+    if after and after < horizon():
+        raise ChangesExpired('Журнал изменений сжат после этого курсора, нужна полная синхронизация')
+
+    entries = ChangeLog.objects.filter(version__gt=after, object_id__isnull=False)
+    if query is not None:
+        entries = entries.filter(query)
+    entries = list(entries.order_by('version')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+    return entries, entries[-1].version if entries else after, more
+
+
+@serialized_write
+def _compact_range(start, end):
+    """
+    Удаляет из диапазона версий записи, после которых о той же строке есть
+    более новые. Потребитель, ещё не дошедший до удалённой записи, всё
+    равно увидит новую, так что сжатие безопасно для любого курсора.
+    """
+    newer = ChangeLog.objects.filter(
+        model=OuterRef('model'), object_id=OuterRef('object_id'), version__gt=OuterRef('version'),
+    )
+    superseded = ChangeLog.objects.filter(version__gt=start, version__lte=end).filter(Exists(newer))
+    # Записи без id строки остались от несостоявшегося создания
+    orphans = ChangeLog.objects.filter(version__gt=start, version__lte=end, object_id__isnull=True)
+    return superseded.delete()[0] + orphans.delete()[0]
+
+
+@serialized_write
+def _drop_tombstones(before):
+    """
+    Удаляет записи об удалении старше before и поднимает горизонт журнала.
+    """
+    tombstones = ChangeLog.objects.filter(action=DELETE, created_at__lt=before)
+    last = tombstones.aggregate(last=Max('version'))['last']
+    if last is None:
+        return 0
+    deleted = tombstones.filter(version__lte=last).delete()[0]
+    counter, _ = GlobalCounter.objects.get_or_create(name=CHANGES_HORIZON)
+    if last > counter.value:
+        GlobalCounter.objects.filter(pk=counter.pk).update(value=last)
+    return deleted
+
+
+def compact(tombstone_days=None, batch_size=50000, on_batch=None):
+    """
+    Сжимает журнал: оставляет по одной (последней) записи на строку.
+
+    Диапазоны версий обрабатываются короткими транзакциями по batch_size,
+    чтобы не держать блокировку записи. Если задан tombstone_days, записи
+    об удалении старше стольких дней тоже удаляются - курсоры до них
+    становятся устаревшими. Возвращает (удалено записей, удалено удалений).
+    """
+    latest = latest_version()
+    removed = 0
+    start = 0
+    while start < latest:
+        end = min(start + batch_size, latest)
+        removed += _compact_range(start, end)
+        start = end
+        if on_batch:
+            on_batch(end, latest, removed)
+
+    tombstones = 0
+    if tombstone_days is not None:
+        tombstones = _drop_tombstones(timezone.now() - timedelta(days=tombstone_days))
+    return removed, tombstones
+
+
+def stamp_update(queryset, object_id, **values):
+    """
+    QuerySet.update() одной строки с записью в журнал в одной транзакции.
+    Если строка не подошла под фильтр queryset, запись журнала откатывается.
+    Возвращает число обновлённых строк.
+    """
+    with transaction.atomic():
+        values['version'] = record_update(queryset.model, object_id)
+        updated = queryset.filter(pk=object_id).update(**values)
+        if not updated:
+            transaction.set_rollback(True)
+    return updated
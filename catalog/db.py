@@ -0,0 +1,124 @@
+"""
+SQLite под одновременной нагрузкой.
+
+Настройки соединений (WAL, busy_timeout, pragma) заданы в settings.DATABASE_PROFILES,
+здесь - то, что делается в коде: запись по одной с повтором при "database is locked"
+и чтение страниц через отдельное соединение (алиас 'read').
+"""
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+READ_ALIAS = 'read'
+
+# Записи одного процесса идут по очереди: потоки ждут блокировку в Python,
+# а не отбирают друг у друга блокировку файла внутри SQLite.
+# RLock - чтобы serialized_write можно было вызывать внутри другой такой же функции
+_write_lock = threading.RLock()
+
+# Повторы и отказы записи (выводит stress_db)
+write_stats = Counter()
+
+# Страница только читает данные - чтение можно отправить в соединение 'read'
+_read_only = ContextVar('read_only', default=False)
+
+
+def is_locked(error):
+    """Ошибка из-за того, что базу держит другая транзакция"""
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def serialized_write(func):
+    """
+    Выполняет func в транзакции под общей блокировкой записи процесса.
+
+    Если база всё равно занята (пишет другой процесс дольше busy_timeout),
+    транзакция повторяется с растущей паузой до settings.DATABASE_WRITE_RETRIES раз.
+    Внутри внешней транзакции повтор невозможен - ошибка уходит наружу.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            nested = connections[DEFAULT_DB_ALIAS].in_atomic_block
+            try:
+                with _write_lock, transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if nested or not is_locked(error) or attempt >= settings.DATABASE_WRITE_RETRIES:
+                    write_stats['failures'] += 1
+                    raise
+            attempt += 1
+            write_stats['retries'] += 1
+            # Случайная добавка, чтобы процессы не повторяли запись одновременно
+            delay = settings.DATABASE_WRITE_BACKOFF * 2 ** (attempt - 1)
+            time.sleep(delay + random.uniform(0, delay))
+
+    return wrapper
+
+
+def read_only_view(view):
+    """
+    Помечает представление как читающее: при GET и HEAD его запросы к базе
+    идут через соединение 'read' (если оно настроено, см. DATABASE_READ_SPLIT).
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_only.set(request.method in ('GET', 'HEAD'))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_only.set(request.method in ('GET', 'HEAD'))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+class ReadRouter:
+    """
+    Чтение внутри read_only_view - в алиас 'read', всё остальное - в 'default'.
+
+    Оба алиаса открывают один и тот же файл, так что отставания реплики нет:
+    'read' - отдельное соединение с query_only, которое не ждёт пишущих
+    благодаря WAL и не может случайно начать запись.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            _read_only.get()
+            and READ_ALIAS in settings.DATABASES
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return READ_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные через 'read', сохраняются в основную базу
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == READ_ALIAS:
+            return False
+        return None
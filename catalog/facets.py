@@ -0,0 +1,261 @@
+"""
+Фильтры каталога по жанру, десятилетию и статусу среди моих книг.
+
+Количества рядом с вариантами фильтров не считаются COUNT по таблице
+книг: они складываются из заранее посчитанных ячеек. BookFacet - книги
+в ячейке жанр x десятилетие (сотни строк на весь каталог), UserFacet -
+книги пользователя в ячейке статус x жанр x десятилетие. Ячейки меняются
+вместе с Book и UserStatus (сигналы, та же транзакция), пересчитать их
+с нуля можно командой rebuild_facets.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import Book, BookFacet, UserFacet, UserStatus
+
+
+# Десятилетие книг без года издания (как Book.decade)
+UNKNOWN_DECADE = 0
+
+
+def decade_of(year):
+    """
+    Десятилетие года издания: 1990 для 1994, UNKNOWN_DECADE без года.
+    Год из формы может прийти строкой.
+    """
+    if year in (None, ''):
+        return UNKNOWN_DECADE
+    return int(year) // 10 * 10
+
+
+def _upsert(model, key_fields, changes):
+    """
+    Прибавляет к ячейкам {ключ: изменение} одним INSERT ... ON CONFLICT на ячейку.
+    """
+    rows = [(*key, delta) for key, delta in changes.items() if delta]
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = [model._meta.get_field(name).column for name in key_fields]
+    count = quote('count')
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ({", ".join(map(quote, columns))}, {count}) '
+            f'VALUES ({", ".join(["%s"] * (len(columns) + 1))}) '
+            f'ON CONFLICT ({", ".join(map(quote, columns))}) '
+            f'DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+            rows,
+        )
+
+
+def change_books(changes):
+    """
+    Меняет ячейки каталога: {(жанр, десятилетие): изменение}.
+    """
+    _upsert(BookFacet, ('genre', 'decade'), changes)
+
+
+def change_user_books(changes):
+    """
+    Меняет ячейки пользователей: {(id пользователя, статус, жанр, десятилетие): изменение}.
+    """
+    _upsert(UserFacet, ('user', 'reading_status', 'genre', 'decade'), changes)
+
+
+def book_cell(book):
+    """
+    Ячейка книги (жанр, десятилетие) по её текущим полям.
+    """
+    return book.genre, decade_of(book.publication_year)
+
+
+def _status_cell(status):
+    """
+    Ячейка книги статуса: из загруженной книги или одним запросом.
+    """
+    if UserStatus.book.is_cached(status):
+        return book_cell(status.book)
+    genre, year = Book.objects.values_list('genre', 'publication_year').get(id=status.book_id)
+    return genre, decade_of(year)
+
+
+def book_saved(book, created):
+    """
+    Переносит книгу (и её статусы у всех читателей) между ячейками после сохранения.
+    """
+    new_cell = book_cell(book)
+    old_cell = None if created else getattr(book, '_loaded_facet', None)
+    # Прежние жанр и год неизвестны (книга загружена без них) - поправит rebuild_facets
+    if created or (old_cell is not None and old_cell != new_cell):
+        changes = Counter({new_cell: 1})
+        if old_cell is not None:
+            changes[old_cell] -= 1
+            _move_statuses(book.id, old_cell, new_cell)
+        change_books(changes)
+    book._loaded_facet = new_cell
+
+
+def _move_statuses(book_id, old_cell, new_cell):
+    """
+    Переносит статусы книги между ячейками пользователей одним проходом по её статусам.
+    """
+    changes = Counter()
+    for user_id, reading_status in UserStatus.objects.filter(book_id=book_id).values_list('user_id', 'reading_status'):
+        changes[(user_id, reading_status, *old_cell)] -= 1
+        changes[(user_id, reading_status, *new_cell)] += 1
+    change_user_books(changes)
+
+
+def book_deleted(book):
+    """
+    Убирает удаляемую книгу и все её статусы из ячеек (до каскадного удаления статусов).
+    """
+    cell = getattr(book, '_loaded_facet', None) or book_cell(book)
+    change_books({cell: -1})
+    changes = Counter()
+    for user_id, reading_status in UserStatus.objects.filter(book_id=book.id).values_list('user_id', 'reading_status'):
+        changes[(user_id, reading_status, *cell)] -= 1
+    change_user_books(changes)
+
+
+def status_changed(status, old_status, new_status):
+    """
+    Переносит книгу пользователя между ячейками статусов. None - статуса не было или больше нет.
+    """
+    if old_status == new_status:
+        return
+    genre, decade = _status_cell(status)
+    changes = Counter()
+    if old_status:
+        changes[(status.user_id, old_status, genre, decade)] -= 1
+    if new_status:
+        changes[(status.user_id, new_status, genre, decade)] += 1
+    change_user_books(changes)
+
+
+def books_added(books):
+    """
+    Добавляет в ячейки книги, сохранённые bulk_create (сигналы не вызываются).
+    """
+    change_books(Counter(book_cell(book) for book in books))
+
+
+def _status_groups(statuses):
+    """
+    Статусы queryset statuses, сгруппированные по ячейкам пользователей.
+    """
+    return (
+        statuses.values('user_id', 'reading_status', 'book__genre', 'book__decade')
+        .annotate(count=Count('id')).order_by()
+    )
+
+
+def statuses_changed(statuses, new_status):
+    """
+    Переносит статусы queryset statuses в new_status (None - статусы удаляются).
+    Вызывается до массового UPDATE или удаления мимо сигналов: одна группировка.
+    """
+    changes = Counter()
+    for row in _status_groups(statuses):
+        cell = (row['book__genre'], row['book__decade'])
+        changes[(row['user_id'], row['reading_status'], *cell)] -= row['count']
+        if new_status:
+            changes[(row['user_id'], new_status, *cell)] += row['count']
+    change_user_books(changes)
+
+
+def genre_changed(books, genre):
+    """
+    Переносит книги queryset books и их статусы в жанр genre (до массового UPDATE).
+    """
+    changes = Counter()
+    for row in books.values('genre', 'decade').annotate(count=Count('id')).order_by():
+        changes[(row['genre'], row['decade'])] -= row['count']
+        changes[(genre, row['decade'])] += row['count']
+    change_books(changes)
+
+    user_changes = Counter()
+    for row in _status_groups(UserStatus.objects.filter(book__in=books)):
+        user_id, reading_status, decade = row['user_id'], row['reading_status'], row['book__decade']
+        user_changes[(user_id, reading_status, row['book__genre'], decade)] -= row['count']
+        user_changes[(user_id, reading_status, genre, decade)] += row['count']
+    change_user_books(user_changes)
+
+
+def books_removed(books):
+    """
+    Убирает из ячеек книги queryset books и все их статусы (до массового удаления).
+    """
+    change_books(Counter({
+        (row['genre'], row['decade']): -row['count']
+        for row in books.values('genre', 'decade').annotate(count=Count('id')).order_by()
+    }))
+    statuses_changed(UserStatus.objects.filter(book__in=books), None)
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Пересчитывает все ячейки с нуля. Возвращает (ячеек каталога, ячеек пользователей).
+    """
+    BookFacet.objects.all().delete()
+    book_cells = BookFacet.objects.bulk_create(
+        BookFacet(genre=row['genre'], decade=row['decade'], count=row['count'])
+        for row in Book.objects.values('genre', 'decade').annotate(count=Count('id')).order_by()
+    )
+
+    UserFacet.objects.all().delete()
+    rows = _status_groups(UserStatus.objects.all())
+    user_cells = UserFacet.objects.bulk_create(
+        (
+            UserFacet(
+                user_id=row['user_id'], reading_status=row['reading_status'],
+                genre=row['book__genre'], decade=row['book__decade'], count=row['count'],
+            )
+            for row in rows
+        ),
+        batch_size=1000,
+    )
+    return len(book_cells), len(user_cells)
+
+
+def _sums(cells, field):
+    return {
+        row[field]: row['total']
+        for row in cells.values(field).annotate(total=Sum('count')).order_by()
+        if row['total'] > 0
+    }
+
+
+def facet_counts(user, genre=None, decade=None, status=None):
+    """
+    Количества книг для вариантов фильтров при остальных выбранных фильтрах.
+
+    Возвращает словарь {'genre': {жанр: n}, 'decade': {десятилетие: n},
+    'status': {статус: n} (только для вошедших), 'total': книг под всеми фильтрами}.
+    Каждое количество - одна группировка по нескольким сотням ячеек.
+    """
+    if status:
+        cells = UserFacet.objects.filter(user=user, reading_status=status)
+    else:
+        cells = BookFacet.objects.all()
+
+    genres = _sums(cells.filter(decade=decade) if decade is not None else cells, 'genre')
+    decades = _sums(cells.filter(genre=genre) if genre else cells, 'decade')
+    counts = {
+        'genre': genres,
+        'decade': decades,
+        'total': genres.get(genre, 0) if genre else sum(genres.values()),
+    }
+
+    if user.is_authenticated:
+        mine = UserFacet.objects.filter(user=user)
+        if genre:
+            mine = mine.filter(genre=genre)
+        if decade is not None:
+            mine = mine.filter(decade=decade)
+        counts['status'] = _sums(mine, 'reading_status')
+    return counts
@@ -0,0 +1,223 @@
+"""
+Книги и статусы чтения по id без повторных запросов к БД.
+
+BookCache - строки книг в памяти процесса, не больше settings.BOOK_CACHE_SIZE
+(вытесняются давно не использованные). Строка действительна, пока не
+изменилась версия тега book_tag(id) в общем кэше: тот же тег сбрасывает
+страницу книги при любом её изменении (сигналы, массовые действия,
+нарезка обложки), поэтому свежесть всех нужных книг проверяется одним
+чтением кэша, без запроса к базе.
+
+Loader - карта объектов одного запроса: книга или статус, уже загруженные
+в этом запросе, повторно не запрашиваются, а id, заявленные заранее
+(want_books), загружаются вместе одним запросом при первом обращении
+к любой из книг.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router
+
+from .cache import book_tag, tag_versions
+from .models import Book, UserStatus
+
+
+# Поля строки книги в том порядке, в котором они хранятся в BookCache
+BOOK_FIELDS = [field.attname for field in Book._meta.concrete_fields]
+
+# Целые, которые помещаются в INTEGER SQLite: большее число не передать параметром запроса
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def book_id(value):
+    """
+    id книги из параметра запроса или None, если это не число
+    или число, которого не может быть в базе.
+    """
+    try:
+        pk = int(value)
+    except (TypeError, ValueError):
+        return None
+    return pk if pk in INTEGER_RANGE else None
+
+
+class BookCache:
+    """
+    LRU строк книг в памяти процесса: id -> (версия тега, время загрузки, значения полей).
+
+    Хранятся значения полей, а не объекты: каждый запрос получает свой
+    экземпляр Book и может менять его, не трогая чужие.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def get_many(self, versions):
+        """
+        Книги с текущими версиями versions ({id: версия}) - {id: Book}.
+        Устаревшие и просроченные строки удаляются.
+        """
+        expired = time.monotonic() - settings.BOOK_CACHE_TIMEOUT
+        rows = {}
+        with self._lock:
+            for pk, version in versions.items():
+                entry = self._rows.get(pk)
+                if entry is None:
+                    self._stats['miss'] += 1
+                elif entry[0] != version or entry[1] < expired:
+                    self._stats['stale'] += 1
+                    del self._rows[pk]
+                else:
+                    self._stats['hit'] += 1
+                    self._rows.move_to_end(pk)
+                    rows[pk] = entry[2]
+        db = router.db_for_read(Book)
+        return {pk: Book.from_db(db, BOOK_FIELDS, values) for pk, values in rows.items()}
+
+    def put_many(self, rows, versions):
+        """
+        Запоминает строки rows (кортежи значений BOOK_FIELDS) с версиями,
+        прочитанными до их загрузки из базы.
+        """
+        if not self.size:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for values in rows:
+                pk = values[0]
+                self._rows[pk] = (versions[pk], now, values)
+                self._rows.move_to_end(pk)
+            while len(self._rows) > self.size:
+                self._rows.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def stats(self):
+        """
+        Попадания, промахи, устаревшие и вытесненные строки, заполненность.
+        """
+        with self._lock:
+            hits, misses = self._stats['hit'], self._stats['miss'] + self._stats['stale']
+            return {
+                'hit': hits,
+                'miss': self._stats['miss'],
+                'stale': self._stats['stale'],
+                'evicted': self._stats['evicted'],
+                'size': len(self._rows),
+                'max_size': self.size,
+                'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+
+
+book_cache = BookCache(settings.BOOK_CACHE_SIZE)
+
+
+def get_books(ids):
+    """
+    Книги по id - {id: Book}, ненайденных в словаре нет.
+
+    Одно чтение версий из кэша, затем один запрос к БД за книгами,
+    которых нет в памяти процесса или которые изменились.
+    """
+    # Таких книг нет, а в запрос такое число не передать
+    ids = [pk for pk in dict.fromkeys(ids) if pk in INTEGER_RANGE]
+    if not ids:
+        return {}
+    # Версии читаются до строк: изменение, сделанное между ними, сбросит запись
+    versions = dict(zip(ids, tag_versions([book_tag(pk) for pk in ids])))
+    books = book_cache.get_many(versions)
+    missing = [pk for pk in ids if pk not in books]
+    if missing:
+        queryset = Book.objects.filter(id__in=missing)
+        rows = list(queryset.values_list(*BOOK_FIELDS))
+        book_cache.put_many(rows, versions)
+        books.update((values[0], Book.from_db(queryset.db, BOOK_FIELDS, values)) for values in rows)
+    return books
+
+
+class Loader:
+    """
+    Книги и статусы пользователя, загруженные в одном запросе.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        # id -> Book или None (книги нет)
+        self._books = {}
+        # id книги -> UserStatus пользователя или None
+        self._statuses = {}
+        self._wanted = set()
+
+    def want_books(self, ids):
+        """
+        Заявляет книги, которые понадобятся: они загрузятся вместе с первой запрошенной.
+        """
+        self._wanted.update(pk for pk in map(book_id, ids) if pk is not None)
+
+    def books(self, ids):
+        """
+        Книги по id - {id: Book}, ненайденных в словаре нет.
+        """
+        ids = [pk for pk in map(book_id, ids) if pk is not None]
+        missing = {pk for pk in [*ids, *self._wanted] if pk not in self._books}
+        self._wanted.clear()
+        if missing:
+            found = get_books(missing)
+            self._books.update((pk, found.get(pk)) for pk in missing)
+        return {pk: self._books[pk] for pk in ids if self._books[pk] is not None}
+
+    def book(self, pk):
+        """
+        Книга по id (можно строкой из запроса) или None.
+        """
+        return self.books([pk]).get(book_id(pk))
+
+    def statuses(self, ids):
+        """
+        Статусы текущего пользователя для книг ids - {id книги: UserStatus}.
+        Книга статуса - объект из этой же карты, без отдельного запроса.
+        """
+        if not self.user.is_authenticated:
+            return {}
+        books = self.books(ids)
+        missing = [pk for pk in books if pk not in self._statuses]
+        if missing:
+            self._statuses.update(dict.fromkeys(missing))
+            for status in UserStatus.objects.filter(user=self.user, book_id__in=missing):
+                status.book = books[status.book_id]
+                status.user = self.user
+                self._statuses[status.book_id] = status
+        return {pk: self._statuses[pk] for pk in books if self._statuses[pk] is not None}
+
+    def status(self, pk):
+        """
+        Статус книги у текущего пользователя или None.
+        """
+        return self.statuses([pk]).get(book_id(pk))
+
+    async def abooks(self, ids):
+        return await sync_to_async(self.books)(ids)
+
+    async def abook(self, pk):
+        return await sync_to_async(self.book)(pk)
+
+    async def astatus(self, pk):
+        return await sync_to_async(self.status)(pk)
+
+
+def get_loader(request):
+    """
+    Карта объектов запроса (создаётся при первом обращении).
+    """
+    if not hasattr(request, '_loader'):
+        request._loader = Loader(request.user)
+    return request._loader
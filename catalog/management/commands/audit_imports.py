@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.benchmark import save_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Время импорта модулей при запуске рабочего процесса (python -X importtime '
+        'в отдельном процессе): самые медленные модули и пакеты, из-за которых их импортируют'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module', default=settings.WSGI_APPLICATION.rsplit('.', 1)[0],
+            help='Что импортировать (по умолчанию модуль WSGI-приложения)',
+        )
+        parser.add_argument('--limit', type=int, default=25, help='Сколько модулей вывести')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative',
+                            help='cumulative - с вложенными импортами, self - только код самого модуля')
+        parser.add_argument('--threshold', type=float, default=5.0,
+                            help='Не выводить модули быстрее стольких мс (с учётом вложенных)')
+        parser.add_argument('--output', help='Куда сохранить отчёт в JSON')
+
+    def handle(self, *args, **options):
+        # Свежий процесс: в этом модули уже импортированы
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'settings.settings')}
+        # Подготовка при запуске (catalog.warmup) обратилась бы к базе - выключаем её
+        code = f'from django.conf import settings; settings.WARMUP_ON_START = False; import {options["module"]}'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Импорт {options["module"]} не удался:\n{result.stderr[-2000:]}')
+
+        modules = parse(result.stderr)
+        total = next((item['cumulative'] for item in modules if item['name'] == options['module']), 0)
+        # Импорты верхнего уровня после запуска интерпретатора (site) - это настройки и сам модуль
+        names = [item['name'] for item in modules]
+        start = names.index('site') + 1 if 'site' in names else 0
+        with_settings = sum(item['cumulative'] for item in modules[start:] if item['depth'] == 0)
+        self.stdout.write(
+            f'Импорт {options["module"]}: {total:.1f} мс, вместе с настройками Django: '
+            f'{with_settings:.1f} мс, модулей: {len(modules)}'
+        )
+
+        slow = sorted(
+            (item for item in modules if item['cumulative'] >= options['threshold'] and item['name'] != options['module']),
+            key=lambda item: item[options['sort']], reverse=True,
+        )[:options['limit']]
+        self.stdout.write(f'{"модуль":<52}{"свой, мс":>10}{"всего, мс":>11}  импортирован из')
+        for item in slow:
+            self.stdout.write(
+                f'{item["name"]:<52}{item["self"]:>10.1f}{item["cumulative"]:>11.1f}  {item["parent"] or "-"}'
+            )
+
+        if options['output']:
+            save_report(options['output'], {item['name']: item for item in modules},
+                        meta={'module': options['module'], 'total': total})
+            self.stdout.write(f'Отчёт сохранён: {options["output"]}')
+
+
+def parse(output):
+    """
+    Разбирает вывод -X importtime: [{'name', 'self', 'cumulative' (мс), 'depth', 'parent'}].
+
+    Модуль печатается после всех модулей, которые он импортировал, с отступом
+    на уровень меньше, поэтому родитель находится по стеку ещё не закрытых строк.
+    """
+    modules = []
+    waiting = []  # (глубина, модуль) ещё без родителя
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        item = {
+            'name': name.strip(),
+            'self': int(own) / 1000,
+            'cumulative': int(cumulative) / 1000,
+            'depth': depth,
+            'parent': None,
+        }
+        while waiting and waiting[-1][0] > depth:
+            waiting.pop()[1]['parent'] = item['name']
+        waiting.append((depth, item))
+        modules.append(item)
+    return modules
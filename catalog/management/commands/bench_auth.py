@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from catalog.benchmark import measure, save_report
+from catalog.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Накладные расходы сессий и входа на запрос: анонимный и вошедший пользователь '
+        'на закэшированной странице каталога для каждого хранилища settings.SESSION_ENGINES, '
+        'с кэшем пользователей (catalog.auth.CachedModelBackend) и без'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', nargs='+', choices=list(settings.SESSION_ENGINES),
+                            default=list(settings.SESSION_ENGINES))
+        parser.add_argument('--repeat', type=int, default=300, help='Запросов на замер')
+        parser.add_argument('--output', help='Куда сохранить отчёт в JSON')
+
+    def handle(self, *args, **options):
+        overrides = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': ['testserver'],
+            'STORAGES': {
+                **settings.STORAGES,
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        }
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                started = time.perf_counter()
+                seed(50, 500, 2000)
+                self.stdout.write(f'База заполнена за {time.perf_counter() - started:.1f} с')
+                results = self._run(options['sessions'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f'{"замер":<46}{"p50":>9}{"p90":>9}{"p99":>9}{"запросов":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<46}{result["p50"]:>9.3f}{result["p90"]:>9.3f}{result["p99"]:>9.3f}{result["queries"]:>10}'
+            )
+
+        if options['output']:
+            save_report(options['output'], results, meta={'repeat': options['repeat']})
+            self.stdout.write(f'Отчёт сохранён: {options["output"]}')
+
+    def _run(self, backends, repeat):
+        """
+        Страница каталога берётся из кэша страниц, поэтому разница между
+        замерами - это чтение сессии и пользователя.
+        """
+        reader = User.objects.order_by('id').first()
+        user_cache = settings.AUTH_USER_CACHE_TIMEOUT or 300
+        results = {}
+        for backend in backends:
+            variants = [('аноним', 0), ('вошедший', 0), ('вошедший, кэш пользователей', user_cache)]
+            for label, timeout in variants:
+                with override_settings(
+                    SESSION_ENGINE=settings.SESSION_ENGINES[backend],
+                    AUTH_USER_CACHE_TIMEOUT=timeout,
+                ):
+                    for cache in caches.all():
+                        cache.clear()
+                    # Клиент создаёт middleware с хранилищем сессий из текущих настроек
+                    client = Client()
+                    if label != 'аноним':
+                        client.force_login(reader)
+                    results[f'{backend}: {label}'] = measure(lambda: client.get('/catalog/'), repeat)
+        return results
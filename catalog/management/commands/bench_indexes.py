@@ -0,0 +1,88 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from catalog.models import Book, UserStatus
+from catalog.seed import seed
+
+
+# Миграции до и после добавления индексов и ограничения (user, book)
+BEFORE_MIGRATION = '0005_book_cover_hash'
+AFTER_MIGRATION = '0006_status_constraints_and_indexes'
+
+
+# Замер "до" идёт на схеме BEFORE_MIGRATION, а модели - текущие: запросы
+# читают только колонки, которые были уже тогда (поля из 0006 и позже,
+# например updated_at и version, на откаченной схеме не существуют)
+STATUS_COLUMNS = ('id', 'user_id', 'book_id', 'reading_status')
+
+
+def hot_queries(user_id, book_id, author):
+    """
+    Запросы из представлений, которые должны использовать новые индексы.
+    """
+    statuses = UserStatus.objects.only(*STATUS_COLUMNS)
+    return {
+        'book_detail: статус (user, book)': statuses.filter(user_id=user_id, book_id=book_id),
+        'my_books: статусы пользователя': statuses.filter(user_id=user_id, reading_status='reading'),
+        'читатели книги по статусу': statuses.filter(book_id=book_id, reading_status='finished'),
+        'книги жанра': Book.objects.filter(genre='fantasy').only('id'),
+        'книги автора': Book.objects.filter(author=author).only('id'),
+        'книги по годам': Book.objects.filter(publication_year__range=(1990, 1995)).only('id'),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает планы и время горячих запросов без индексов и с ними на тестовой базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--books', type=int, default=20000)
+        parser.add_argument('--statuses', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=50, help='Сколько раз выполнять каждый запрос')
+
+    def handle(self, *args, **options):
+        # Отдельная тестовая база, рабочая не трогается
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Заполнение тестовой базы...')
+            seed(options['users'], options['books'], options['statuses'])
+            status = UserStatus.objects.order_by('id').first()
+            author = Book.objects.values_list('author', flat=True).first()
+            queries = hot_queries(status.user_id, status.book_id, author)
+
+            # Откатываем миграцию с индексами, замеряем, накатываем обратно
+            call_command('migrate', 'catalog', BEFORE_MIGRATION, verbosity=0)
+            before = self._measure(queries, options['repeat'])
+
+            call_command('migrate', 'catalog', AFTER_MIGRATION, verbosity=0)
+            after = self._measure(queries, options['repeat'])
+
+            for name in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, result in (('без индексов', before[name]), ('с индексами', after[name])):
+                    plan, elapsed = result
+                    self.stdout.write(f'  {label}: {elapsed * 1000:.3f} мс')
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _measure(self, queries, repeat):
+        """
+        План и среднее время каждого запроса.
+        """
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        results = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain().splitlines()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            results[name] = (plan, (time.perf_counter() - started) / repeat)
+        return results
@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+
+from catalog.benchmark import percentiles
+from catalog.models import Book
+from catalog.seed import seed
+
+
+HOST = '127.0.0.1'
+
+# Режимы: WSGI с обычными представлениями и ASGI с асинхронными
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI-сервера (обычные представления) '
+        'и ASGI-сервера uvicorn (асинхронные представления) при множестве '
+        'одновременных соединений на отдельной тестовой базе'
+    )
+    # Дочерний процесс меняет настройки до загрузки URL-схемы, проверки её загрузили бы раньше
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 200])
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на каждый уровень нагрузки')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--statuses', type=int, default=30000)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--no-cache', action='store_true', help='Отключить кэш страниц')
+        # Служебные параметры дочернего процесса с сервером
+        parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+        parser.add_argument('--database', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self._serve(options)
+
+        workdir = tempfile.mkdtemp(prefix='napolku-bench-')
+        database = os.path.join(workdir, 'bench.sqlite3')
+        # Тестовая база в файле: серверы работают в отдельных процессах
+        connection.settings_dict['TEST']['NAME'] = database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Заполнение тестовой базы...')
+            seed(options['users'], options['books'], options['statuses'])
+            targets = self._targets()
+            connection.close()
+
+            self.stdout.write(
+                f'{"режим":<6}{"соединений":>12}{"запросов/с":>12}{"p50, мс":>10}{"p99, мс":>10}{"ошибок":>8}'
+            )
+            for mode in MODES:
+                server = self._start_server(mode, database, options)
+                try:
+                    for concurrency in options['concurrency']:
+                        result = asyncio.run(load(options['port'], targets, options['requests'], concurrency))
+                        self.stdout.write(
+                            f'{mode:<6}{concurrency:>12}{result["rps"]:>12.0f}'
+                            f'{result["p50"]:>10.1f}{result["p99"]:>10.1f}{result["errors"]:>8}'
+                        )
+                finally:
+                    server.terminate()
+                    server.wait()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _targets(self):
+        """
+        Смесь запросов: главная, каталог, страницы книг анонимно и профиль читателя.
+        """
+        # Обычный читатель (медиана по числу книг), а не самый активный
+        readers = User.objects.annotate(books=Count('book_statuses')).filter(books__gt=0).order_by('books')
+        reader = readers[readers.count() // 2]
+        client = Client()
+        client.force_login(reader)
+        session = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        targets = []
+        for book_id in Book.objects.order_by('?').values_list('id', flat=True)[:20]:
+            targets += [
+                ('/', None),
+                ('/catalog/', None),
+                (f'/catalog/book/?id={book_id}', None),
+                ('/profil/', session),
+            ]
+        return targets
+
+    def _start_server(self, mode, database, options):
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_server',
+            '--serve', mode, '--database', database, '--port', str(options['port']),
+        ]
+        if options['no_cache']:
+            command.append('--no-cache')
+        server = subprocess.Popen(command)
+
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} не запустился')
+            try:
+                socket.create_connection((HOST, options['port']), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.1)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не начал принимать соединения')
+
+    def _serve(self, options):
+        """
+        Дочерний процесс: сервер нужного типа на тестовой базе.
+        """
+        mode = options['serve']
+        connection.close()
+        settings.DATABASES['default']['NAME'] = options['database']
+        connection.settings_dict['NAME'] = options['database']
+
+        settings.DEBUG = False
+        settings.ALLOWED_HOSTS = ['*']
+        settings.ASYNC_VIEWS = mode == 'asgi'
+        settings.SLOW_REQUEST_THRESHOLD = float('inf')
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+        if options['no_cache']:
+            settings.CACHES = {
+                alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'} for alias in settings.CACHES
+            }
+
+        if mode == 'asgi':
+            try:
+                import uvicorn
+            except ImportError:
+                raise CommandError('Для замера ASGI нужен uvicorn: pip install uvicorn')
+            from django.core.asgi import get_asgi_application
+
+            uvicorn.run(
+                get_asgi_application(), host=HOST, port=options['port'],
+                log_level='warning', lifespan='off', backlog=2048,
+            )
+            return
+
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadedWSGIServer):
+            # Очередь как у uvicorn, иначе соединения сверх 10 ждут повторного SYN
+            request_queue_size = 2048
+
+        server = Server((HOST, options['port']), QuietHandler)
+        server.set_app(get_wsgi_application())
+        server.serve_forever()
+
+
+async def _request(port, path, cookie):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    headers = f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n'
+    if cookie:
+        headers += f'Cookie: {cookie}\r\n'
+    writer.write((headers + '\r\n').encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(port, targets, total, concurrency):
+    """
+    Отправляет total запросов через concurrency одновременных соединений.
+    """
+    queue = itertools.islice(itertools.cycle(targets), total)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for path, cookie in queue:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(_request(port, path, cookie), timeout=30)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = percentiles(latencies)
+    result['rps'] = total / elapsed
+    result['errors'] = errors
+    return result
@@ -0,0 +1,80 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+from django.test import override_settings
+
+from catalog.benchmark import percentiles
+from catalog.models import Book
+from catalog.pagination import SHELF_SIZE, split_into_shelves
+from catalog.seed import TITLE_WORDS, _title, _year
+
+
+SHELVES_TEMPLATE = '{% load shelves %}{% render_shelves shelves %}'
+
+LOCMEM = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'bench-shelves',
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+}
+DUMMY = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+class Command(BaseCommand):
+    help = 'Замеряет отрисовку полок каталога без кэша карточек, с пустым и с заполненным кэшем'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shelves', type=int, nargs='+', default=[1, 10, 100, 334],
+            help='Сколько полок отрисовывать (334 полки - 1000 книг)',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        template = Engine.get_default().from_string(SHELVES_TEMPLATE)
+        rng = random.Random(0)
+
+        self.stdout.write(f'{"полок":>6}{"без кэша":>12}{"холодный":>12}{"тёплый":>12}{"тёплый/полка":>15}')
+        for count in options['shelves']:
+            # Книги в памяти: замеряем только шаблоны и кэш, без БД
+            books = [
+                Book(
+                    id=i + 1,
+                    title=_title(rng, i),
+                    author=' '.join(rng.sample(TITLE_WORDS, 2)).title(),
+                    publication_year=_year(rng),
+                )
+                for i in range(count * SHELF_SIZE)
+            ]
+            context = Context({'shelves': split_into_shelves(books)})
+
+            def render():
+                template.render(context)
+
+            with override_settings(CACHES={'default': DUMMY}):
+                uncached = self._measure(render, options['repeat'])
+
+            with override_settings(CACHES={'default': LOCMEM}):
+                def cold():
+                    cache.clear()
+                    render()
+
+                cold_result = self._measure(cold, options['repeat'])
+                render()
+                warm = self._measure(render, options['repeat'])
+                cache.clear()
+
+            self.stdout.write(
+                f'{count:>6}{uncached:>12.2f}{cold_result:>12.2f}{warm:>12.2f}{warm / count:>15.3f}'
+            )
+        self.stdout.write('Время в мс (p50)')
+
+    def _measure(self, action, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            action()
+            samples.append(time.perf_counter() - started)
+        return percentiles(samples)['p50']
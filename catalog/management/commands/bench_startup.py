@@ -0,0 +1,168 @@
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from catalog.benchmark import save_report
+from catalog.models import Book
+from catalog.seed import seed
+
+
+HOST = '127.0.0.1'
+
+# Режимы: без подготовки (первые запросы сами импортируют представления и
+# компилируют шаблоны) и с подготовкой catalog.warmup при запуске
+MODES = ('cold', 'warmup')
+
+
+class Command(BaseCommand):
+    help = (
+        'Холодный запуск рабочего процесса: время от запуска WSGI-сервера до приёма '
+        'соединений, до готовности (/ready/) и до первого байта первых страниц, '
+        'без подготовки при запуске и с ней (catalog.warmup)'
+    )
+    # Дочерний процесс меняет настройки до загрузки URL-схемы, проверки её загрузили бы раньше
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Запусков на режим (в отчёте медиана)')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--output', help='Куда сохранить отчёт в JSON')
+        # Служебные параметры дочернего процесса с сервером
+        parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+        parser.add_argument('--database', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self._serve(options)
+
+        workdir = tempfile.mkdtemp(prefix='napolku-startup-')
+        database = os.path.join(workdir, 'bench.sqlite3')
+        # Тестовая база в файле: серверы работают в отдельных процессах
+        connection.settings_dict['TEST']['NAME'] = database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed(50, 500, 2000)
+            book_id = Book.objects.order_by('id').values_list('id', flat=True).first()
+            paths = ['/', '/catalog/', f'/catalog/book/?id={book_id}']
+            connection.close()
+
+            results = {}
+            for mode in MODES:
+                runs = [self._run(mode, database, paths, options['port']) for _ in range(options['repeat'])]
+                results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        columns = ['listen', 'ready', *paths, 'total']
+        self.stdout.write('Медианы, мс. listen - сервер принимает соединения, ready - /ready/ отвечает 200,')
+        self.stdout.write('страницы - первый байт первого запроса, total - от запуска до первого байта последней')
+        self.stdout.write(f'{"замер":<28}' + ''.join(f'{mode:>10}' for mode in MODES))
+        for column in columns:
+            values = ''.join(
+                f'{results[mode][column]:>10.0f}' if column in results[mode] else f'{"-":>10}' for mode in MODES
+            )
+            self.stdout.write(f'{column:<28}{values}')
+
+        if options['output']:
+            save_report(options['output'], results, meta={'repeat': options['repeat'], 'paths': paths})
+            self.stdout.write(f'Отчёт сохранён: {options["output"]}')
+
+    def _run(self, mode, database, paths, port):
+        """
+        Один запуск сервера: задержки от запуска процесса в мс.
+        """
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_startup',
+            '--serve', mode, '--database', database, '--port', str(port),
+        ]
+        started = time.perf_counter()
+        server = subprocess.Popen(command)
+        try:
+            timings = {'listen': self._wait_listen(server, port, started)}
+            if mode == 'warmup':
+                deadline = time.monotonic() + 30
+                while first_byte(port, '/ready/')[0] != 200:
+                    if time.monotonic() > deadline:
+                        raise CommandError('Сервер не стал готов за 30 с')
+                    time.sleep(0.01)
+                timings['ready'] = (time.perf_counter() - started) * 1000
+            for path in paths:
+                status, elapsed = first_byte(port, path)
+                if status != 200:
+                    raise CommandError(f'{path}: ответ {status}')
+                timings[path] = elapsed * 1000
+            timings['total'] = (time.perf_counter() - started) * 1000
+            return timings
+        finally:
+            server.terminate()
+            server.wait()
+
+    def _wait_listen(self, server, port, started):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Сервер не запустился')
+            try:
+                socket.create_connection((HOST, port), timeout=1).close()
+                return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise CommandError('Сервер не начал принимать соединения')
+
+    def _serve(self, options):
+        """
+        Дочерний процесс: WSGI-сервер на тестовой базе, как settings/wsgi.py.
+        """
+        connection.close()
+        settings.DATABASES['default']['NAME'] = options['database']
+        connection.settings_dict['NAME'] = options['database']
+
+        settings.DEBUG = False
+        settings.ALLOWED_HOSTS = ['*']
+        settings.ASYNC_VIEWS = False
+        settings.SLOW_REQUEST_THRESHOLD = float('inf')
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        application = get_wsgi_application()
+        if options['serve'] == 'warmup':
+            from catalog import warmup
+
+            warmup.start()
+        server = ThreadedWSGIServer((HOST, options['port']), QuietHandler)
+        server.set_app(application)
+        server.serve_forever()
+
+
+def first_byte(port, path):
+    """
+    GET path: (код ответа, время до первого байта в секундах).
+    """
+    started = time.perf_counter()
+    with socket.create_connection((HOST, port), timeout=30) as sock:
+        sock.sendall(f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n\r\n'.encode())
+        head = sock.recv(1)
+        elapsed = time.perf_counter() - started
+        while chunk := sock.recv(65536):
+            head += chunk
+    return int(head.split(b' ', 2)[1]), elapsed
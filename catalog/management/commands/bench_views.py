@@ -0,0 +1,125 @@
+import itertools
+import platform
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from catalog import tasks
+from catalog.benchmark import compare, load_report, measure, save_report
+from catalog.models import Book
+from catalog.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер страниц на тестовой базе: задержки (p50/p90/p99), '
+        'запросы к БД и пиковая память по каждому представлению'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--statuses', type=int, default=30000)
+        parser.add_argument('--repeat', type=int, default=100, help='Запросов на представление')
+        parser.add_argument('--output', help='Куда сохранить отчёт в JSON')
+        parser.add_argument('--compare', help='Отчёт прошлого запуска для сравнения')
+        parser.add_argument('--threshold', type=float, default=1.2, help='Допустимый рост задержки (во сколько раз)')
+        parser.add_argument('--no-cache', action='store_true', help='Отключить кэш страниц')
+
+    def handle(self, *args, **options):
+        baseline = load_report(options['compare']) if options['compare'] else None
+
+        # Замеряем как в продакшене: без DEBUG запросы не копятся в памяти
+        overrides = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': ['testserver'],
+            # Без DEBUG хранилище с хешами требует collectstatic, для замера он не нужен
+            'STORAGES': {
+                **settings.STORAGES,
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            # Потоки задач работали бы с той же тестовой базой во время замера
+            # (блокировки и чужое время в status_update и my_books): в замер
+            # входит только постановка задач, выполняются они после него
+            'TASKS_IN_PROCESS': False,
+        }
+        if options['no_cache']:
+            overrides['CACHES'] = {
+                alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'} for alias in settings.CACHES
+            }
+
+        # Отдельная тестовая база, рабочая не трогается
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                started = time.perf_counter()
+                seed(options['users'], options['books'], options['statuses'])
+                self.stdout.write(f'База заполнена за {time.perf_counter() - started:.1f} с')
+                results = self._run(options['repeat'])
+                started = time.perf_counter()
+                done = tasks.run_pending()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'Фоновых задач после замера: {done}, выполнены за {elapsed:.1f} с')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        header = f'{"представление":<20}{"p50":>9}{"p90":>9}{"p99":>9}{"запросов":>10}{"память, КБ":>12}'
+        self.stdout.write(header)
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<20}{result["p50"]:>9.2f}{result["p90"]:>9.2f}{result["p99"]:>9.2f}'
+                f'{result["queries"]:>10}{result["peak_kb"]:>12.1f}'
+            )
+
+        if options['output']:
+            save_report(options['output'], results, meta={
+                'users': options['users'],
+                'books': options['books'],
+                'statuses': options['statuses'],
+                'repeat': options['repeat'],
+                'cache': not options['no_cache'],
+                'python': platform.python_version(),
+            })
+            self.stdout.write(f'Отчёт сохранён: {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare(baseline, results, options['threshold'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f'Найдено регрессий: {len(regressions)}')
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def _run(self, repeat):
+        """
+        Прогоняет каждое представление через тестовый клиент.
+        """
+        # Самый активный читатель - худший случай для профиля
+        reader = User.objects.annotate(books=Count('book_statuses')).order_by('-books').first()
+        book_ids = itertools.cycle(Book.objects.order_by('?').values_list('id', flat=True)[:100])
+        reading_statuses = itertools.cycle(['reading', 'finished', 'planned'])
+
+        anonymous = Client()
+        client = Client()
+        client.force_login(reader)
+        client.get('/')  # получаем CSRF-cookie и сессию
+
+        def status_update():
+            client.post(f'/catalog/book/?id={next(book_ids)}', {'reading_status': next(reading_statuses)})
+            # Сообщение "Статус обновлен!" выбрасываем, чтобы cookie не росла
+            client.cookies.pop('messages', None)
+
+        actions = {
+            'home': lambda: anonymous.get('/'),
+            'home (вход)': lambda: client.get('/'),
+            'book_list': lambda: anonymous.get('/catalog/'),
+            'book_detail': lambda: client.get(f'/catalog/book/?id={next(book_ids)}'),
+            'my_books': lambda: client.get('/profil/'),
+            'status_update': status_update,
+        }
+        return {name: measure(action, repeat) for name, action in actions.items()}
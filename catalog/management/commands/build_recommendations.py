@@ -0,0 +1,33 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие книги ("Читатели также выбирают") по всем статусам чтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=recommendations.NEIGHBORS, help='Соседей на книгу')
+        parser.add_argument(
+            '--pairs-per-block', type=int, default=recommendations.PAIRS_PER_BLOCK,
+            help='Предел пар книг в одном блоке (меньше - меньше памяти, но медленнее)',
+        )
+
+    def handle(self, *args, **options):
+        if not recommendations.matrix_libs():
+            self.stdout.write(self.style.WARNING(
+                'numpy и scipy не установлены, книги считаются по одной через SQL (медленно)'
+            ))
+
+        started = time.perf_counter()
+        books, pairs = recommendations.rebuild(options['neighbors'], options['pairs_per_block'])
+        elapsed = time.perf_counter() - started
+
+        # ru_maxrss на Linux в килобайтах
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Соседи посчитаны для {books} книг ({pairs} пар) за {elapsed:.2f} с, пик памяти процесса {peak:.0f} МБ'
+        ))
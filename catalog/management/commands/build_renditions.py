@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import Book
+from catalog.renditions import build_renditions
+
+
+class Command(BaseCommand):
+    help = 'Нарезает уменьшенные обложки для книг, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перенарезать обложки всех книг, а не только новых',
+        )
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        if not options['all']:
+            books = books.filter(cover_hash='')
+
+        started = time.perf_counter()
+        done = failed = 0
+        for book_id in books.values_list('id', flat=True).iterator():
+            try:
+                build_renditions(book_id)
+                done += 1
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Книга {book_id}: {error}')
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано обложек: {done}, с ошибками: {failed} за {elapsed:.2f} с'
+        ))
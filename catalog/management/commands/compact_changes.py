@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from catalog import changes
+
+
+class Command(BaseCommand):
+    help = 'Сжимает журнал изменений: по одной последней записи на книгу и статус'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tombstone-days', type=int,
+            help='Удалять и записи об удалении старше стольких дней (курсоры до них устареют)',
+        )
+        parser.add_argument('--batch-size', type=int, default=50000, help='Версий журнала в одной транзакции')
+
+    def handle(self, *args, **options):
+        def progress(version, latest, removed):
+            self.stdout.write(f'  версии до {version} из {latest}: удалено {removed}')
+
+        removed, tombstones = changes.compact(
+            options['tombstone_days'], options['batch_size'], on_batch=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено устаревших записей: {removed}, записей об удалении: {tombstones}. '
+            f'Горизонт журнала: {changes.horizon()}'
+        ))
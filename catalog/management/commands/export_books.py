@@ -0,0 +1,36 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.bulk import FORMATS, detect_format, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Выгружает каталог книг в CSV или JSON Lines потоком'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для вывода в stdout')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию по расширению)')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+
+        try:
+            file = nullcontext(sys.stdout) if path == '-' else open(path, 'w', encoding=options['encoding'], newline='')
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть файл: {error}')
+
+        started = time.perf_counter()
+        with file as file:
+            count = export_rows(file, file_format)
+        elapsed = time.perf_counter() - started
+
+        # При выводе в stdout отчёт пишем в stderr, чтобы не смешивать с данными
+        report = self.stderr if path == '-' else self.stdout
+        report.write(self.style.SUCCESS(
+            f'Выгружено книг: {count} за {elapsed:.2f} с ({count / max(elapsed, 1e-9):.0f} книг/с)'
+        ))
@@ -0,0 +1,63 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.bulk import FORMATS, detect_format, import_books, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Импортирует книги из CSV или JSON Lines пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для чтения из stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию по расширению)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Сколько книг сохранять за одну транзакцию')
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--max-errors', type=int, default=20, help='Сколько ошибок выводить подробно')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        errors_shown = 0
+
+        def on_error(line_number, error):
+            nonlocal errors_shown
+            if errors_shown < options['max_errors']:
+                self.stderr.write(f'Строка {line_number}: {"; ".join(error.messages)}')
+            errors_shown += 1
+
+        started = time.perf_counter()
+
+        def on_batch(result):
+            elapsed = time.perf_counter() - started
+            processed = sum(result.values())
+            self.stdout.write(
+                f'Обработано {processed}, добавлено {result["created"]} '
+                f'({processed / elapsed:.0f} строк/с)'
+            )
+
+        try:
+            file = nullcontext(sys.stdin) if path == '-' else open(path, encoding=options['encoding'], newline='')
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть файл: {error}')
+
+        with file as file:
+            result = import_books(
+                read_rows(file, file_format),
+                batch_size=options['batch_size'],
+                on_error=on_error,
+                on_batch=on_batch,
+            )
+
+        elapsed = time.perf_counter() - started
+        processed = sum(result.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено книг: {result["created"]}, дубликатов: {result["duplicates"]}, '
+            f'с ошибками: {result["invalid"]}. '
+            f'{processed} строк за {elapsed:.2f} с ({processed / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
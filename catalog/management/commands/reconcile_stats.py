@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.stats import get_counters, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики статусов чтения с нуля'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = reconcile()
+        elapsed = time.perf_counter() - started
+
+        counters = get_counters()
+        self.stdout.write(f"Книг: {counters['books']}, пользователей: {counters['users']}")
+        for status, count in counters['statuses'].items():
+            self.stdout.write(f'  {status}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны для {users} пользователей за {elapsed:.2f} с'
+        ))
@@ -0,0 +1,66 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from catalog import tasks
+from catalog.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из таблицы Task (обложки, удаление файлов, рекомендации). '
+        'Можно запускать несколько процессов; при TASKS_IN_PROCESS = False задачи выполняет только эта команда'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Потоков-исполнителей')
+        parser.add_argument('--poll', type=float, default=1.0, help='Пауза между проверками пустой очереди, с')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и выйти')
+        parser.add_argument('--retry-failed', action='store_true', help='Вернуть в очередь задачи со статусом failed')
+
+    def handle(self, *args, **options):
+        # Повторы подбирает опрос очереди, потоки веб-процесса здесь не нужны
+        settings.TASKS_IN_PROCESS = False
+
+        if options['retry_failed']:
+            count = Task.objects.filter(state=Task.FAILED).update(
+                state=Task.PENDING, attempts=0, run_at=timezone.now(),
+            )
+            self.stdout.write(f'Возвращено в очередь: {count}')
+
+        stop = threading.Event()
+        done = []
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    count = tasks.run_pending()
+                    done.append(count)
+                    if not count:
+                        if options['once']:
+                            break
+                        stop.wait(options['poll'])
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Исполнителей: {len(threads)}, ожидание задач...')
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка после текущих задач...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        failed = Task.objects.filter(state=Task.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано задач: {sum(done)}, не выполнено после всех попыток: {failed}'
+        ))
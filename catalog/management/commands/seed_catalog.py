@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.seed import seed
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями, книгами и статусами чтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--statuses', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора для воспроизводимых данных')
+        parser.add_argument('--prefix', default='seed', help='Префикс имён создаваемых пользователей')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_user_').exists():
+            raise CommandError(f'Пользователи с префиксом "{prefix}" уже есть, укажите другой --prefix')
+
+        started = time.perf_counter()
+        statuses = seed(
+            options['users'], options['books'], options['statuses'],
+            seed=options['seed'], prefix=prefix,
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {options["users"]}, книг: {options["books"]}, '
+            f'статусов: {statuses} за {elapsed:.2f} с'
+        ))
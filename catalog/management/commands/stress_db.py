@@ -0,0 +1,212 @@
+import copy
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+
+from catalog import tasks
+from catalog.benchmark import percentiles
+from catalog.db import READ_ALIAS, is_locked, write_stats
+from catalog.models import Book
+from catalog.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузка на SQLite из нескольких потоков: читатели открывают страницы, '
+        'писатели меняют статусы книг и входят заново. Сравнивает профили '
+        'settings.DATABASE_PROFILES на одинаковых копиях тестовой базы'
+    )
+    # Потоки моделируют WSGI-сервер, URL-схема должна загрузиться уже с обычными представлениями
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=['basic', 'production'])
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=4, help='Потоков записи')
+        parser.add_argument('--seconds', type=float, default=10, help='Длительность на профиль')
+        parser.add_argument('--retries', type=int, help='Повторов записи вместо DATABASE_WRITE_RETRIES (0 - без повторов)')
+        parser.add_argument('--read-split', action='store_true', help='Читать страницы через алиас read')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--statuses', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        settings.ASYNC_VIEWS = False
+        overrides = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': ['testserver'],
+            'SLOW_REQUEST_THRESHOLD': float('inf'),
+            # Страницы без кэша: каждая должна дойти до базы
+            'CACHES': {
+                alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'} for alias in settings.CACHES
+            },
+            'STORAGES': {
+                **settings.STORAGES,
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        }
+        if options['retries'] is not None:
+            overrides['DATABASE_WRITE_RETRIES'] = options['retries']
+
+        workdir = tempfile.mkdtemp(prefix='napolku-stress-')
+        template = os.path.join(workdir, 'seed.sqlite3')
+        connection.settings_dict['TEST']['NAME'] = template
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        default = settings.DATABASES['default']
+        original = dict(default)
+        # Словарь default - это один из профилей, поэтому профили копируем до переключений
+        profiles = copy.deepcopy(settings.DATABASE_PROFILES)
+        try:
+            with override_settings(**overrides):
+                self.stdout.write('Заполнение тестовой базы...')
+                seed(options['users'], options['books'], options['statuses'])
+                fixtures = self._fixtures(options['writers'] + options['readers'])
+                connection.close()
+                # Копии базы для профилей должны быть одним файлом, без журнала WAL рядом
+                with sqlite3.connect(template) as db:
+                    db.execute('PRAGMA journal_mode=DELETE')
+
+                self.stdout.write(
+                    f'{"профиль":<12}{"журнал":>8}{"чтений/с":>10}{"p99 чт., мс":>13}'
+                    f'{"записей/с":>11}{"p99 зап., мс":>14}{"повторов":>10}{"locked":>8}{"ошибок":>8}'
+                )
+                for profile in options['profiles']:
+                    database = os.path.join(workdir, f'{profile}.sqlite3')
+                    shutil.copy(template, database)
+                    self._configure(default, original, profiles[profile], database, options['read_split'])
+                    result = self._run(fixtures, options)
+                    self.stdout.write(
+                        f'{profile:<12}{result["journal"]:>8}{result["reads"]:>10.0f}{result["read_p99"]:>13.1f}'
+                        f'{result["writes"]:>11.0f}{result["write_p99"]:>14.1f}{result["retries"]:>10}'
+                        f'{result["locked"]:>8}{result["errors"]:>8}'
+                    )
+                    connections.close_all()
+        finally:
+            # Фоновые задачи после записей ещё могут работать с базой
+            tasks.shutdown()
+            settings.DATABASES.pop(READ_ALIAS, None)
+            default.clear()
+            default.update(original)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _fixtures(self, clients):
+        """
+        Книги для запросов и cookie входа для каждого потока.
+        """
+        users = list(User.objects.order_by('?')[:clients])
+        sessions = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            sessions.append((user, client.cookies[settings.SESSION_COOKIE_NAME].value))
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        return {'sessions': sessions, 'book_ids': book_ids}
+
+    def _configure(self, default, original, profile, database, read_split):
+        """
+        Переключает алиас default (словарь общий для всех потоков) на профиль и копию базы.
+        """
+        connections.close_all()
+        default.clear()
+        default.update(original)
+        default.update({'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False})
+        default.update(profile)
+        default['NAME'] = database
+
+        settings.DATABASES.pop(READ_ALIAS, None)
+        if read_split:
+            settings.DATABASES[READ_ALIAS] = {
+                **default,
+                'OPTIONS': {
+                    **default['OPTIONS'],
+                    'init_command': ';'.join([default['OPTIONS'].get('init_command', ''), 'PRAGMA query_only=ON']),
+                },
+            }
+
+    def _run(self, fixtures, options):
+        deadline = time.monotonic() + options['seconds']
+        retries_before = write_stats['retries']
+        results = {'read': [], 'write': [], 'locked': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(number, writer):
+            rng = random.Random(number)
+            user, session = fixtures['sessions'][number % len(fixtures['sessions'])]
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session
+            latencies, locked, errors = [], 0, 0
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        ok = (self._write if writer else self._read)(client, user, rng, fixtures['book_ids'])
+                    except OperationalError as error:
+                        ok = False
+                        locked += is_locked(error)
+                        errors += not is_locked(error)
+                    else:
+                        errors += not ok
+                    if ok:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                results['write' if writer else 'read'] += latencies
+                results['locked'] += locked
+                results['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=(n, True)) for n in range(options['writers'])]
+        threads += [
+            threading.Thread(target=worker, args=(options['writers'] + n, False))
+            for n in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal = cursor.fetchone()[0]
+        reads, writes = percentiles(results['read']), percentiles(results['write'])
+        return {
+            'journal': journal,
+            'reads': len(results['read']) / options['seconds'],
+            'read_p99': reads['p99'],
+            'writes': len(results['write']) / options['seconds'],
+            'write_p99': writes['p99'],
+            'retries': write_stats['retries'] - retries_before,
+            'locked': results['locked'],
+            'errors': results['errors'],
+        }
+
+    def _read(self, client, user, rng, book_ids):
+        path = rng.choice([
+            '/',
+            '/catalog/',
+            f'/catalog/book/?id={rng.choice(book_ids)}',
+            '/profil/',
+        ])
+        return client.get(path).status_code == 200
+
+    def _write(self, client, user, rng, book_ids):
+        # Чаще всего меняют статус, иногда входят заново (сессия и last_login)
+        if rng.random() < 0.2:
+            client.force_login(user)
+            return True
+        response = client.post(
+            f'/catalog/book/?id={rng.choice(book_ids)}',
+            {'reading_status': rng.choice(['reading', 'finished', 'planned'])},
+        )
+        return response.status_code == 302
@@ -0,0 +1,186 @@
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.template.backends.django import DjangoTemplates
+
+
+# Границы корзин гистограмм (секунды, штуки, байты)
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Гистограммы: имя метрики -> (описание, корзины)
+HISTOGRAMS = {
+    'napolku_request_seconds': ('Время обработки запроса', TIME_BUCKETS),
+    'napolku_db_seconds': ('Время запросов к БД за запрос', TIME_BUCKETS),
+    'napolku_db_queries': ('Число запросов к БД за запрос', QUERY_BUCKETS),
+    'napolku_template_seconds': ('Время отрисовки шаблонов за запрос', TIME_BUCKETS),
+    'napolku_response_bytes': ('Размер ответа', SIZE_BUCKETS),
+}
+
+# Счётчики: имя метрики -> описание
+COUNTERS = {
+    'napolku_requests_total': 'Число запросов',
+    'napolku_duplicate_queries_total': 'Повторы одного и того же SQL в рамках запроса',
+    'napolku_slow_requests_total': 'Запросы дольше SLOW_REQUEST_THRESHOLD',
+}
+
+# Время шаблонов и SQL-запросы текущего запроса (списки, чтобы их можно было
+# дополнять). ContextVar, а не threading.local: в асинхронных представлениях
+# запросы к БД выполняются в другом потоке, но с копией контекста
+current_template_time = ContextVar('current_template_time', default=None)
+current_queries = ContextVar('current_queries', default=None)
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus: накопительные счётчики по корзинам.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """
+    Метрики по представлениям в памяти процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {
+            name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for name, (_, buckets) in HISTOGRAMS.items()
+        }
+        self.counters = {name: Counter() for name in COUNTERS}
+
+    def record(self, view, status, observations, duplicates, slow):
+        """
+        Сохраняет замеры одного запроса. observations - {имя гистограммы: значение}.
+        """
+        with self._lock:
+            for name, value in observations.items():
+                self.histograms[name][view].observe(value)
+            self.counters['napolku_requests_total'][(view, status)] += 1
+            if duplicates:
+                self.counters['napolku_duplicate_queries_total'][(view,)] += duplicates
+            if slow:
+                self.counters['napolku_slow_requests_total'][(view,)] += 1
+
+    def render(self):
+        """
+        Текстовый формат Prometheus (exposition format 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histogram in sorted(self.histograms[name].items()):
+                    for bound, total in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{{view="{view}",le="{le}"}} {total}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+            for name, help_text in COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in sorted(self.counters[name].items()):
+                    label_text = f'view="{labels[0]}"'
+                    if name == 'napolku_requests_total':
+                        label_text += f',status="{labels[1]}"'
+                    lines.append(f'{name}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def duplicate_queries(queries):
+    """
+    Лишние повторы SQL-шаблонов (параметры в шаблон не входят, так что
+    N+1 по разным id тоже считается). Возвращает (число повторов, {sql: раз}).
+    """
+    counts = Counter(sql for sql, _ in queries)
+    repeated = {sql: count for sql, count in counts.items() if count > 1}
+    return sum(repeated.values()) - len(repeated), repeated
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обёртка курсора: время и текст SQL-запроса для метрик текущего запроса.
+    """
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append((sql, perf_counter() - started))
+
+
+def install_query_recorder(connection, **kwargs):
+    """
+    Подключает record_query к соединению (сигнал connection_created).
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class _TimedTemplate:
+    """
+    Шаблон, который добавляет время отрисовки к замерам текущего запроса.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = current_template_time.get()
+        if timings is None:
+            return self.template.render(context, request)
+        started = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.append(perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Обычный движок шаблонов Django с замером времени отрисовки.
+
+    Время считается только у шаблонов, которые отрисовывает представление:
+    {% include %} и {% extends %} входят во время внешнего шаблона.
+    """
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
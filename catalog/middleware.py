@@ -0,0 +1,95 @@
+import logging
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import (
+    current_queries, current_template_time, duplicate_queries,
+    install_query_recorder, registry,
+)
+
+
+slow_log = logging.getLogger('catalog.slow_requests')
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеряет каждый запрос: общее время, время и число запросов к БД,
+    повторы SQL, время шаблонов и размер ответа.
+
+    Метрики копятся по имени представления из urls.py и отдаются на /metrics/.
+    Запросы дольше settings.SLOW_REQUEST_THRESHOLD пишутся в журнал
+    catalog.slow_requests вместе со всеми SQL-запросами.
+    Работает и под WSGI, и под ASGI без переключения между потоками.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Соединение, открытое до подключения сигнала, тоже должно писать запросы
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+        queries, template_time = [], []
+        tokens = current_queries.set(queries), current_template_time.set(template_time)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(tokens[0])
+            current_template_time.reset(tokens[1])
+        self._record(request, response, perf_counter() - started, queries, template_time)
+        return response
+
+    async def __acall__(self, request):
+        queries, template_time = [], []
+        tokens = current_queries.set(queries), current_template_time.set(template_time)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(tokens[0])
+            current_template_time.reset(tokens[1])
+        self._record(request, response, perf_counter() - started, queries, template_time)
+        return response
+
+    def _record(self, request, response, elapsed, queries, template_time):
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unmatched'
+        duplicates, repeated = duplicate_queries(queries)
+        slow = elapsed >= settings.SLOW_REQUEST_THRESHOLD
+
+        observations = {
+            'napolku_request_seconds': elapsed,
+            'napolku_db_seconds': sum(duration for _, duration in queries),
+            'napolku_db_queries': len(queries),
+            'napolku_template_seconds': sum(template_time),
+        }
+        if not response.streaming:
+            observations['napolku_response_bytes'] = len(response.content)
+        registry.record(view, response.status_code, observations, duplicates, slow)
+
+        if slow:
+            self._log_slow(request, view, elapsed, observations, queries, repeated)
+
+    def _log_slow(self, request, view, elapsed, observations, queries, repeated):
+        lines = [
+            f'{request.method} {request.get_full_path()} ({view}): {elapsed * 1000:.1f} мс, '
+            f'БД {observations["napolku_db_seconds"] * 1000:.1f} мс в {len(queries)} запросах, '
+            f'шаблоны {observations["napolku_template_seconds"] * 1000:.1f} мс'
+        ]
+        for sql, count in repeated.items():
+            lines.append(f'  повтор x{count}: {sql}')
+        for sql, duration in queries:
+            lines.append(f'  {duration * 1000:8.2f} мс  {sql}')
+        slow_log.warning('\n'.join(lines))
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+from django.db import migrations
+
+from ._fts import INDEX_BOOKS_SQL, TABLE_SQL, TRIGGERS_SQL
+
+
+# SQL индекса общий с catalog.search (см. _fts.py)
+CREATE_SQL = [TABLE_SQL, *TRIGGERS_SQL, INDEX_BOOKS_SQL]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS catalog_book_fts_ai',
+    'DROP TRIGGER IF EXISTS catalog_book_fts_ad',
+    'DROP TRIGGER IF EXISTS catalog_book_fts_au',
+    'DROP TABLE IF EXISTS catalog_book_fts',
+]
+
+
+def create_fts(apps, schema_editor):
+    """Создаёт индекс FTS5 и триггеры синхронизации (только SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    """Удаляет индекс FTS5 и триггеры"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_book_title_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
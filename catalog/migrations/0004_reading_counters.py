@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+STATUSES = ['not_started', 'reading', 'finished', 'abandoned', 'planned']
+
+
+def fill_counters(apps, schema_editor):
+    """Считает счётчики по уже существующим данным"""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Book = apps.get_model('catalog', 'Book')
+    UserStatus = apps.get_model('catalog', 'UserStatus')
+    UserReadingStats = apps.get_model('catalog', 'UserReadingStats')
+    GlobalCounter = apps.get_model('catalog', 'GlobalCounter')
+
+    per_user = {
+        user_id: UserReadingStats(user_id=user_id)
+        for user_id in User.objects.values_list('id', flat=True)
+    }
+    totals = dict.fromkeys(STATUSES, 0)
+    rows = UserStatus.objects.values('user_id', 'reading_status').annotate(count=Count('id')).order_by()
+    for row in rows:
+        if row['reading_status'] not in totals:
+            continue
+        stats = per_user[row['user_id']]
+        setattr(stats, row['reading_status'], row['count'])
+        stats.total += row['count']
+        totals[row['reading_status']] += row['count']
+    UserReadingStats.objects.bulk_create(per_user.values(), batch_size=1000)
+
+    counters = [
+        GlobalCounter(name='books', value=Book.objects.count()),
+        GlobalCounter(name='users', value=len(per_user)),
+    ]
+    counters += [GlobalCounter(name=f'status:{status}', value=count) for status, count in totals.items()]
+    GlobalCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_book_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlobalCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Счётчик')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserReadingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0, verbose_name='Всего книг')),
+                ('not_started', models.IntegerField(default=0, verbose_name='Не начата')),
+                ('reading', models.IntegerField(default=0, verbose_name='Читаю')),
+                ('finished', models.IntegerField(default=0, verbose_name='Прочитана')),
+                ('abandoned', models.IntegerField(default=0, verbose_name='Брошена')),
+                ('planned', models.IntegerField(default=0, verbose_name='В планах')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reading_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
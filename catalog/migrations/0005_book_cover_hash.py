@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+from ._fts import RestoreFTSTriggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_reading_counters'),
+    ]
+
+    # SQLite пересоздаёт таблицу книг - триггеры FTS5 возвращаем (см. _fts.py)
+    operations = [
+        RestoreFTSTriggers(),
+        migrations.AddField(
+            model_name='book',
+            name='cover_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Хеш обложки'),
+        ),
+        RestoreFTSTriggers(),
+    ]
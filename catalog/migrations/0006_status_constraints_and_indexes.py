@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def remove_duplicate_statuses(apps, schema_editor):
+    """Оставляет по одному статусу на пару (пользователь, книга) - самый новый"""
+    UserStatus = apps.get_model('catalog', 'UserStatus')
+    UserReadingStats = apps.get_model('catalog', 'UserReadingStats')
+    GlobalCounter = apps.get_model('catalog', 'GlobalCounter')
+
+    duplicates = (
+        UserStatus.objects.values('user_id', 'book_id')
+        .annotate(count=Count('id'), keep_id=Max('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for group in duplicates.iterator():
+        extra = UserStatus.objects.filter(
+            user_id=group['user_id'], book_id=group['book_id'],
+        ).exclude(id=group['keep_id'])
+
+        # Счётчики статусов уменьшаем на удаляемые записи
+        for row in extra.values('reading_status').annotate(count=Count('id')).order_by():
+            status, count = row['reading_status'], row['count']
+            UserReadingStats.objects.filter(user_id=group['user_id']).update(
+                **{status: F(status) - count, 'total': F('total') - count}
+            )
+            GlobalCounter.objects.filter(name=f'status:{status}').update(value=F('value') - count)
+
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_book_cover_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre'], name='book_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author'], name='book_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publication_year'], name='book_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstatus',
+            index=models.Index(fields=['user', 'reading_status'], name='userstatus_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstatus',
+            index=models.Index(fields=['book', 'reading_status'], name='userstatus_book_status_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_statuses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userstatus',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='userstatus_user_book_uniq'),
+        ),
+    ]
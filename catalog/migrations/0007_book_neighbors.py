@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_status_constraints_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Похожесть')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='catalog.book')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='catalog.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score'], name='bookneighbor_book_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'neighbor'), name='bookneighbor_book_neighbor_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+from ._fts import RestoreFTSTriggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_book_neighbors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # SQLite пересоздаёт таблицу книг - триггеры FTS5 возвращаем (см. _fts.py)
+    operations = [
+        RestoreFTSTriggers(),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменена'),
+        ),
+        migrations.AddField(
+            model_name='userstatus',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменён'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at', 'id'], name='book_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstatus',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='userstatus_user_updated_idx'),
+        ),
+        RestoreFTSTriggers(),
+    ]
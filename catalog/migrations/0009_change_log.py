@@ -0,0 +1,97 @@
+# Generated by Django 6.0 on 2026-10-18 21:15
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+from ._fts import RestoreFTSTriggers
+
+
+def log_existing_rows(apps, schema_editor):
+    """
+    Записывает уже существующие книги и статусы в журнал как созданные,
+    чтобы чтение журнала с начала отдавало весь каталог.
+    """
+    ChangeLog = apps.get_model('catalog', 'ChangeLog')
+    for model_name, owner in (('book', None), ('userstatus', 'user_id')):
+        model = apps.get_model('catalog', model_name)
+        rows = model.objects.order_by('pk')
+        # Точного времени создания нет - берём время последнего изменения
+        rows.update(created_at=F('updated_at'))
+
+        fields = ('pk', owner) if owner else ('pk',)
+        batch = []
+        for row in rows.values_list(*fields).iterator(chunk_size=2000):
+            batch.append(ChangeLog(
+                model=model_name, object_id=row[0], action='create',
+                user_id=row[1] if owner else None,
+            ))
+            if len(batch) >= 2000:
+                ChangeLog.objects.bulk_create(batch)
+                batch = []
+        ChangeLog.objects.bulk_create(batch)
+
+        rows.update(version=Subquery(
+            ChangeLog.objects.filter(model=model_name, object_id=OuterRef('pk')).values('version')[:1]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_updated_at'),
+    ]
+
+    # SQLite пересоздаёт таблицу книг - триггеры FTS5 возвращаем (см. _fts.py)
+    operations = [
+        RestoreFTSTriggers(),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('version', models.BigAutoField(primary_key=True, serialize=False, verbose_name='Версия')),
+                ('model', models.CharField(max_length=20, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(null=True, verbose_name='id строки')),
+                ('action', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление')], max_length=10, verbose_name='Действие')),
+                ('user_id', models.BigIntegerField(blank=True, null=True, verbose_name='Пользователь')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['model', 'user_id', 'version'], name='changelog_model_user_idx'),
+                    models.Index(fields=['model', 'object_id', 'version'], name='changelog_object_idx'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Добавлена'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Версия'),
+        ),
+        migrations.AddField(
+            model_name='userstatus',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Создан'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='userstatus',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Версия'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['version'], name='book_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstatus',
+            index=models.Index(fields=['version'], name='userstatus_version_idx'),
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+        RestoreFTSTriggers(),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 6.0 on 2026-10-18 23:10
+
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+from ._fts import RestoreFTSTriggers
+
+
+def fill_facets(apps, schema_editor):
+    """Считает ячейки фильтров каталога по уже существующим книгам и статусам"""
+    Book = apps.get_model('catalog', 'Book')
+    UserStatus = apps.get_model('catalog', 'UserStatus')
+    BookFacet = apps.get_model('catalog', 'BookFacet')
+    UserFacet = apps.get_model('catalog', 'UserFacet')
+
+    BookFacet.objects.bulk_create(
+        BookFacet(genre=row['genre'], decade=row['decade'], count=row['count'])
+        for row in Book.objects.values('genre', 'decade').annotate(count=Count('id')).order_by()
+    )
+    rows = (
+        UserStatus.objects.values('user_id', 'reading_status', 'book__genre', 'book__decade')
+        .annotate(count=Count('id')).order_by()
+    )
+    UserFacet.objects.bulk_create(
+        (
+            UserFacet(
+                user_id=row['user_id'], reading_status=row['reading_status'],
+                genre=row['book__genre'], decade=row['book__decade'], count=row['count'],
+            )
+            for row in rows
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_tasks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # SQLite пересоздаёт таблицу книг - триггеры FTS5 возвращаем (см. _fts.py)
+    operations = [
+        RestoreFTSTriggers(),
+        migrations.CreateModel(
+            name='BookFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=50, verbose_name='Жанр')),
+                ('decade', models.IntegerField(verbose_name='Десятилетие')),
+                ('count', models.IntegerField(default=0, verbose_name='Книг')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reading_status', models.CharField(max_length=20, verbose_name='Статус чтения')),
+                ('genre', models.CharField(max_length=50, verbose_name='Жанр')),
+                ('decade', models.IntegerField(verbose_name='Десятилетие')),
+                ('count', models.IntegerField(default=0, verbose_name='Книг')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_genre_idx',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='decade',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Coalesce(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('publication_year'), '/', models.Value(10)), '*', models.Value(10)), models.Value(0)), output_field=models.IntegerField(), verbose_name='Десятилетие'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'title', 'id'], name='book_genre_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['decade', 'title', 'id'], name='book_decade_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'decade', 'title', 'id'], name='book_genre_decade_title_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookfacet',
+            constraint=models.UniqueConstraint(fields=('genre', 'decade'), name='bookfacet_genre_decade_uniq'),
+        ),
+        migrations.AddField(
+            model_name='userfacet',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='userfacet',
+            constraint=models.UniqueConstraint(fields=('user', 'reading_status', 'genre', 'decade'), name='userfacet_cell_uniq'),
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+        RestoreFTSTriggers(),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 23:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_facets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userstatus',
+            index=models.Index(fields=['reading_status', 'id'], name='userstatus_status_id_idx'),
+        ),
+    ]
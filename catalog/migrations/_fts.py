@@ -0,0 +1,67 @@
+"""
+Таблица и триггеры индекса FTS5 - единственное место, где записан их SQL:
+его используют миграции и catalog.search.rebuild_index (сам модуль
+не миграция: имена с "_" загрузчик миграций пропускает). Миграции уже
+применены с этим SQL, поэтому менять его можно только новой миграцией.
+
+Меняя поля таблицы, SQLite пересоздаёт её, и триггеры удаляются вместе
+со старой таблицей (строки индекса остаются: id книг сохраняются).
+Поэтому миграция, которая добавляет, меняет или удаляет поля Book,
+начинается и заканчивается операцией RestoreFTSTriggers(): последняя
+возвращает триггеры при применении, первая - при откате.
+"""
+from django.db import migrations
+
+
+# Значения колонок для FTS5: "ё" заменяем на "е", регистр FTS5 приводит сам
+FTS_VALUES = ', '.join(
+    f"replace(replace(coalesce(new.{column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+    for column in ('title', 'author', 'description')
+)
+
+TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_book_fts USING fts5("
+    "title, author, description, tokenize='unicode61 remove_diacritics 2')"
+)
+
+TRIGGERS_SQL = [
+    "CREATE TRIGGER IF NOT EXISTS catalog_book_fts_ai AFTER INSERT ON catalog_book BEGIN "
+    f"INSERT INTO catalog_book_fts(rowid, title, author, description) VALUES (new.id, {FTS_VALUES}); END",
+
+    "CREATE TRIGGER IF NOT EXISTS catalog_book_fts_ad AFTER DELETE ON catalog_book BEGIN "
+    "DELETE FROM catalog_book_fts WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS catalog_book_fts_au AFTER UPDATE OF title, author, description ON catalog_book BEGIN "
+    "DELETE FROM catalog_book_fts WHERE rowid = old.id; "
+    f"INSERT INTO catalog_book_fts(rowid, title, author, description) VALUES (new.id, {FTS_VALUES}); END",
+]
+
+# Индексирует все книги (в пустую таблицу FTS5)
+INDEX_BOOKS_SQL = (
+    "INSERT INTO catalog_book_fts(rowid, title, author, description) "
+    f"SELECT id, {FTS_VALUES.replace('new.', '')} FROM catalog_book"
+)
+
+
+class RestoreFTSTriggers(migrations.RunSQL):
+    """
+    Создаёт недостающие триггеры FTS5 в обе стороны миграции. Только SQLite:
+    на других СУБД индекса FTS5 нет.
+    """
+
+    def __init__(self):
+        super().__init__(TRIGGERS_SQL, TRIGGERS_SQL)
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {}
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return 'Restore FTS5 triggers on catalog_book'
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -22,6 +24,13 @@ class Book(models.Model):
         ('other', 'Другое'),
     ]
 
+    # Названия жанров по значению (get_genre_display без разбора choices на каждый вызов)
+    GENRE_LABELS = dict(GENRE_CHOICES)
+
+    # Допустимые годы издания
+    MIN_YEAR = 1000
+    MAX_YEAR = 2100
+
     # Название книги
     title = models.CharField(
         max_length=200,
@@ -42,8 +51,8 @@ class Book(models.Model):
         null=True,  # Может быть пустым в БД
         blank=True,  # Можно не указывать
         validators=[  # Проверка, что год между 1000 и 2100
-            MinValueValidator(1000),
-            MaxValueValidator(2100)
+            MinValueValidator(MIN_YEAR),
+            MaxValueValidator(MAX_YEAR)
         ]
     )
 
@@ -69,12 +78,82 @@ class Book(models.Model):
         null=True  # Может быть пустым в БД
     )
 
+    # Хеш содержимого обложки, по нему находятся уменьшенные копии
+    cover_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True,  # Ищем, используется ли хеш другими книгами
+        verbose_name='Хеш обложки'
+    )
+
+    # Время последнего изменения, из него считаются ETag и Last-Modified в API
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменена'
+    )
+
+    # Время добавления книги в каталог
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Добавлена'
+    )
+
+    # Версия последнего изменения - номер записи в журнале ChangeLog
+    version = models.BigIntegerField(
+        default=0,  # 0 - строка ещё не попала в журнал (bulk_create до record_untracked)
+        editable=False,
+        verbose_name='Версия'
+    )
+
+    # Десятилетие издания (1990 для 1994 года, 0 - год не указан) для фильтра каталога.
+    # Хранимая вычисляемая колонка: её считает база, в том числе при bulk_create
+    decade = models.GeneratedField(
+        expression=Coalesce(F('publication_year') / 10 * 10, Value(0)),
+        output_field=models.IntegerField(),
+        db_persist=True,
+        verbose_name='Десятилетие'
+    )
+
+    class Meta:
+        indexes = [
+            # Индекс для keyset-пагинации каталога по названию
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+            # Изменённые книги по порядку (выдача изменений в API)
+            models.Index(fields=['updated_at', 'id'], name='book_updated_idx'),
+            # Книги, изменённые после версии, и строки без версии
+            models.Index(fields=['version'], name='book_version_idx'),
+            # Индексы для фильтров каталога: страница фильтра - проход по индексу в порядке названий
+            models.Index(fields=['genre', 'title', 'id'], name='book_genre_title_idx'),
+            models.Index(fields=['decade', 'title', 'id'], name='book_decade_title_idx'),
+            models.Index(fields=['genre', 'decade', 'title', 'id'], name='book_genre_decade_title_idx'),
+            models.Index(fields=['author'], name='book_author_idx'),
+            models.Index(fields=['publication_year'], name='book_year_idx'),
+        ]
+
     def __str__(self):
         """
         Возвращает строковое представление книги.
         """
         return f'{self.title} ({self.author})'
 
+    def get_genre_display(self):
+        """
+        Название жанра книги.
+        """
+        return self.GENRE_LABELS.get(self.genre, self.genre)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Запоминает жанр и десятилетие, загруженные из БД, чтобы при
+        сохранении перенести книгу между ячейками фильтров каталога.
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'genre' in field_names and 'decade' in field_names:
+            instance._loaded_facet = (instance.genre, instance.decade)
+        return instance
+
 
 class UserStatus(models.Model):
     """
@@ -90,6 +169,9 @@ class UserStatus(models.Model):
         ('planned', 'В планах'),
     ]
 
+    # Названия статусов по значению
+    READING_STATUS_LABELS = dict(READING_STATUS)
+
     # Ссылка на пользователя
     user = models.ForeignKey(
         User,  # Стандартная модель пользователя из Django
@@ -112,8 +194,334 @@ class UserStatus(models.Model):
         verbose_name='Статус чтения'
     )
 
+    # Время последнего изменения статуса
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменён'
+    )
+
+    # Время, когда статус поставлен впервые
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создан'
+    )
+
+    # Версия последнего изменения - номер записи в журнале ChangeLog
+    version = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия'
+    )
+
+    class Meta:
+        constraints = [
+            # У пользователя может быть только один статус для книги
+            models.UniqueConstraint(fields=['user', 'book'], name='userstatus_user_book_uniq'),
+        ]
+        indexes = [
+            # Книги пользователя по статусу (профиль, главная)
+            models.Index(fields=['user', 'reading_status'], name='userstatus_user_status_idx'),
+            # Читатели книги по статусу
+            models.Index(fields=['book', 'reading_status'], name='userstatus_book_status_idx'),
+            # Изменённые статусы пользователя по порядку (выдача изменений в API)
+            models.Index(fields=['user', 'updated_at', 'id'], name='userstatus_user_updated_idx'),
+            # Статусы, изменённые после версии, и строки без версии
+            models.Index(fields=['version'], name='userstatus_version_idx'),
+            # Все статусы с одним значением по порядку id (фильтр списка в админке)
+            models.Index(fields=['reading_status', 'id'], name='userstatus_status_id_idx'),
+        ]
+
     def __str__(self):
         """
         Возвращает строковое представление информации о статусе чтения.
         """
         return f'{self.user.username} - {self.book.title}: {self.reading_status}'
+
+    def get_reading_status_display(self):
+        """
+        Название статуса чтения.
+        """
+        return self.READING_STATUS_LABELS.get(self.reading_status, self.reading_status)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Запоминает статус, загруженный из БД, чтобы при сохранении
+        понять, как изменились счётчики.
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'reading_status' in field_names:
+            instance._loaded_status = instance.reading_status
+        return instance
+
+
+class UserReadingStats(models.Model):
+    """
+    Класс со счётчиками книг пользователя по статусам чтения.
+    Обновляется вместе с UserStatus, чтобы не считать COUNT на каждый запрос.
+    """
+
+    # Пользователь, к которому относятся счётчики
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='reading_stats'  # Позволяет получить счётчики пользователя
+    )
+
+    # Всего книг со статусом у пользователя
+    total = models.IntegerField(default=0, verbose_name='Всего книг')
+
+    # Счётчики по каждому статусу из UserStatus.READING_STATUS
+    not_started = models.IntegerField(default=0, verbose_name='Не начата')
+    reading = models.IntegerField(default=0, verbose_name='Читаю')
+    finished = models.IntegerField(default=0, verbose_name='Прочитана')
+    abandoned = models.IntegerField(default=0, verbose_name='Брошена')
+    planned = models.IntegerField(default=0, verbose_name='В планах')
+
+    def __str__(self):
+        """
+        Возвращает строковое представление счётчиков пользователя.
+        """
+        return f'Статистика пользователя {self.user_id}: {self.total}'
+
+
+class GlobalCounter(models.Model):
+    """
+    Класс для общих счётчиков каталога: книги, пользователи, статусы.
+    """
+
+    # Имя счётчика: 'books', 'users' или 'status:<статус>'
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Счётчик'
+    )
+
+    # Текущее значение
+    value = models.BigIntegerField(default=0, verbose_name='Значение')
+
+    def __str__(self):
+        """
+        Возвращает строковое представление счётчика.
+        """
+        return f'{self.name}: {self.value}'
+
+
+class BookNeighbor(models.Model):
+    """
+    Класс для похожей книги: заранее посчитанные ближайшие соседи книги
+    по статусам чтения ("Читатели также выбирают").
+    Заполняется catalog.recommendations, на странице книги читается одним запросом.
+    """
+
+    # Книга, для которой посчитаны соседи
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='neighbors'  # Позволяет получить соседей книги
+    )
+
+    # Похожая книга
+    neighbor = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='similar_to'  # Позволяет найти книги, которым эта книга похожа
+    )
+
+    # Похожесть (косинус между векторами книг по читателям), больше - ближе
+    score = models.FloatField(verbose_name='Похожесть')
+
+    class Meta:
+        constraints = [
+            # Каждая пара книг хранится один раз
+            models.UniqueConstraint(fields=['book', 'neighbor'], name='bookneighbor_book_neighbor_uniq'),
+        ]
+        indexes = [
+            # Соседи книги по убыванию похожести - рекомендации одним проходом по индексу
+            models.Index(fields=['book', '-score'], name='bookneighbor_book_score_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Возвращает строковое представление пары похожих книг.
+        """
+        return f'{self.book_id} -> {self.neighbor_id}: {self.score:.3f}'
+
+
+class BookFacet(models.Model):
+    """
+    Класс для числа книг каталога в ячейке жанр x десятилетие.
+    Из этих ячеек считаются количества рядом с фильтрами каталога (catalog.facets).
+    """
+
+    # Жанр книги (значение из Book.GENRE_CHOICES)
+    genre = models.CharField(max_length=50, verbose_name='Жанр')
+
+    # Десятилетие издания, как Book.decade
+    decade = models.IntegerField(verbose_name='Десятилетие')
+
+    # Число книг в ячейке
+    count = models.IntegerField(default=0, verbose_name='Книг')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['genre', 'decade'], name='bookfacet_genre_decade_uniq'),
+        ]
+
+    def __str__(self):
+        """
+        Возвращает строковое представление ячейки.
+        """
+        return f'{self.genre} {self.decade}: {self.count}'
+
+
+class UserFacet(models.Model):
+    """
+    Класс для числа книг пользователя в ячейке статус x жанр x десятилетие
+    (фильтр "статус среди моих книг" и количества при нём).
+    """
+
+    # Пользователь, к которому относится ячейка
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='facets'  # Позволяет получить ячейки пользователя
+    )
+
+    # Статус чтения (значение из UserStatus.READING_STATUS)
+    reading_status = models.CharField(max_length=20, verbose_name='Статус чтения')
+
+    # Жанр книги
+    genre = models.CharField(max_length=50, verbose_name='Жанр')
+
+    # Десятилетие издания книги
+    decade = models.IntegerField(verbose_name='Десятилетие')
+
+    # Число книг в ячейке
+    count = models.IntegerField(default=0, verbose_name='Книг')
+
+    class Meta:
+        constraints = [
+            # Он же индекс для выборки ячеек пользователя
+            models.UniqueConstraint(
+                fields=['user', 'reading_status', 'genre', 'decade'], name='userfacet_cell_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Возвращает строковое представление ячейки.
+        """
+        return f'{self.user_id} {self.reading_status} {self.genre} {self.decade}: {self.count}'
+
+
+class ChangeLog(models.Model):
+    """
+    Класс для журнала изменений книг и статусов чтения.
+
+    Запись добавляется в той же транзакции, что и изменение строки
+    (см. catalog.changes), её номер - версия строки. Записи в SQLite идут
+    по одной, поэтому номера растут в порядке фиксации транзакций и
+    потребителю достаточно помнить последний прочитанный номер.
+    """
+
+    ACTIONS = [
+        ('create', 'Создание'),
+        ('update', 'Изменение'),
+        ('delete', 'Удаление'),
+    ]
+
+    # Номер изменения, он же версия строки (AUTOINCREMENT: номера не повторяются и после очистки)
+    version = models.BigAutoField(primary_key=True, verbose_name='Версия')
+
+    # Модель изменённой строки: 'book' или 'userstatus'
+    model = models.CharField(max_length=20, verbose_name='Модель')
+
+    # id изменённой строки (пусто, пока создаваемая строка не получила id)
+    object_id = models.BigIntegerField(null=True, verbose_name='id строки')
+
+    # Что произошло со строкой
+    action = models.CharField(max_length=10, choices=ACTIONS, verbose_name='Действие')
+
+    # Владелец статуса чтения, чтобы клиент читал только свои изменения
+    user_id = models.BigIntegerField(null=True, blank=True, verbose_name='Пользователь')
+
+    # Время изменения
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время')
+
+    class Meta:
+        indexes = [
+            # Изменения одной модели (и одного пользователя) после версии
+            models.Index(fields=['model', 'user_id', 'version'], name='changelog_model_user_idx'),
+            # Все записи о строке - для сжатия журнала
+            models.Index(fields=['model', 'object_id', 'version'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Возвращает строковое представление записи журнала.
+        """
+        return f'{self.version}: {self.action} {self.model} {self.object_id}'
+
+
+class Task(models.Model):
+    """
+    Класс для фоновой задачи (см. catalog.tasks).
+
+    Задача добавляется в той же транзакции, что и изменение, которое её
+    вызвало, и выполняется после коммита потоками веб-процесса или
+    командой run_tasks. Выполненные задачи удаляются, упавшие после
+    всех повторов остаются со статусом failed.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATES = [
+        (PENDING, 'Ждёт'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    ]
+
+    # Имя зарегистрированной функции, например 'renditions.build'
+    name = models.CharField(max_length=100, verbose_name='Задача')
+
+    # Аргументы функции
+    args = models.JSONField(default=list, blank=True, verbose_name='Аргументы')
+
+    # Ключ идемпотентности: ждущая задача с таким ключом может быть только одна
+    key = models.CharField(max_length=200, null=True, blank=True, verbose_name='Ключ')
+
+    # Состояние задачи
+    state = models.CharField(max_length=10, choices=STATES, default=PENDING, verbose_name='Состояние')
+
+    # Когда выполнять (ждущая) или до какого времени задача занята исполнителем (выполняемая)
+    run_at = models.DateTimeField(verbose_name='Выполнить в')
+
+    # Сколько раз задачу уже брали в работу
+    attempts = models.IntegerField(default=0, verbose_name='Попыток')
+
+    # Текст последней ошибки
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    # Время постановки в очередь
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+
+    class Meta:
+        constraints = [
+            # Повторная постановка той же задачи, пока она ждёт, ничего не добавляет
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(state='pending'), name='task_pending_key_uniq',
+            ),
+        ]
+        indexes = [
+            # Следующая задача к выполнению
+            models.Index(fields=['state', 'run_at'], name='task_state_run_at_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Возвращает строковое представление задачи.
+        """
+        return f'{self.name}{tuple(self.args)}: {self.state}'
@@ -0,0 +1,130 @@
+import base64
+import json
+
+from django.db.models import Q
+
+from .loaders import INTEGER_RANGE
+
+
+# Сколько книг стоит на одной полке
+SHELF_SIZE = 3
+
+# Сколько полок отдаётся за один запрос
+SHELVES_PER_PAGE = 3
+
+# Поля, которые нужны для полок каталога (описание не загружаем)
+LIST_FIELDS = ('id', 'title', 'author', 'publication_year', 'cover_image', 'cover_hash')
+
+# Доступные сортировки: имя -> поля ключа (последнее поле всегда id)
+ORDERINGS = {
+    'title': ('title', 'id'),
+    'id': ('id',),
+}
+
+# Типы значений полей ключа в курсоре (bool тоже int для isinstance, поэтому тип сравнивается точно)
+KEY_TYPES = {
+    'title': str,
+    'id': int,
+}
+
+
+class InvalidCursor(ValueError):
+    """
+    Курсор пагинации повреждён или не подходит к сортировке.
+    """
+
+
+def encode_cursor(book, ordering='title'):
+    """
+    Кодирует позицию последней книги страницы в курсор для URL.
+    """
+    values = [getattr(book, field) for field in ORDERINGS[ordering]]
+    raw = json.dumps([ordering, values], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, ordering='title'):
+    """
+    Раскодирует курсор обратно в значения ключа сортировки.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        name, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Некорректный курсор')
+
+    if name != ordering or not isinstance(values, list) or len(values) != len(ORDERINGS[ordering]):
+        raise InvalidCursor('Курсор не подходит к сортировке')
+    for field, value in zip(ORDERINGS[ordering], values):
+        if type(value) is not KEY_TYPES[field] or (type(value) is int and value not in INTEGER_RANGE):
+            raise InvalidCursor('Некорректный курсор')
+    return values
+
+
+def _after(fields, values):
+    """
+    Условие "строго после ключа" для keyset-пагинации:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f'{field}__gt': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field: prev_value})
+        condition |= step
+    return condition
+
+
+def _page_queryset(queryset, cursor, ordering, size, fields=LIST_FIELDS):
+    if ordering not in ORDERINGS:
+        raise InvalidCursor('Неизвестная сортировка')
+
+    key = ORDERINGS[ordering]
+    books = queryset.only(*fields).order_by(*key)
+    if cursor:
+        books = books.filter(_after(key, decode_cursor(cursor, ordering)))
+
+    # Берём на одну книгу больше, чтобы узнать, есть ли следующая страница
+    return books[:size + 1]
+
+
+def _cut_page(books, ordering, size):
+    next_cursor = None
+    if len(books) > size:
+        books = books[:size]
+        next_cursor = encode_cursor(books[-1], ordering)
+    return books, next_cursor
+
+
+def get_page(queryset, cursor=None, ordering='title', size=SHELF_SIZE * SHELVES_PER_PAGE, fields=LIST_FIELDS):
+    """
+    Возвращает страницу книг после курсора и курсор следующей страницы.
+    fields - загружаемые поля книги.
+
+    Вместо OFFSET используется условие по ключу сортировки, поэтому
+    глубокие страницы выбираются так же быстро, как первая.
+    """
+    books = list(_page_queryset(queryset, cursor, ordering, size, fields))
+    return _cut_page(books, ordering, size)
+
+
+async def aget_page(queryset, cursor=None, ordering='title', size=SHELF_SIZE * SHELVES_PER_PAGE):
+    """
+    Асинхронный вариант get_page.
+    """
+    books = [book async for book in _page_queryset(queryset, cursor, ordering, size)]
+    return _cut_page(books, ordering, size)
+
+
+def split_into_shelves(books, shelf_size=SHELF_SIZE):
+    """
+    Раскладывает книги по полкам и считает пустые места на каждой.
+    """
+    shelves = []
+    for start in range(0, len(books), shelf_size):
+        row = books[start:start + shelf_size]
+        shelves.append({
+            'books': row,
+            'empty_slots': range(shelf_size - len(row)),
+        })
+    return shelves
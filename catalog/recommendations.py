@@ -0,0 +1,338 @@
+"""
+Рекомендации "Читатели также выбирают" по статусам чтения.
+
+Книга - это вектор по пользователям с весами статусов из STATUS_WEIGHTS,
+похожесть двух книг - косинус между их векторами. Для каждой книги в
+BookNeighbor хранятся NEIGHBORS самых похожих, поэтому страница книги
+получает рекомендации одним запросом по индексу.
+
+Полный пересчёт (python manage.py build_recommendations) перемножает
+разреженные матрицы numpy/scipy блоками книг; без них считает по одной
+книге через SQL. После смены статуса пересчитывается только эта книга:
+от её вектора зависят лишь пары с её участием.
+"""
+import heapq
+import math
+from array import array
+from functools import cache
+
+from django.db import connection
+from django.db.models import Count, Min
+
+from .cache import RECOMMENDATIONS, invalidate, recommendations_tag
+from . import tasks
+from .db import serialized_write
+from .models import Book, BookNeighbor, UserStatus
+
+
+# Веса статусов: прочитанная книга - самый сильный сигнал, брошенная - отрицательный.
+# "Не начата" не учитывается: такой статус ставится всем, кто добавил книгу
+STATUS_WEIGHTS = {
+    'finished': 1.0,
+    'reading': 0.7,
+    'planned': 0.4,
+    'abandoned': -0.5,
+}
+
+# Сколько соседей хранится для каждой книги
+NEIGHBORS = 20
+
+# Примерный предел пар (книга, книга) в одном блоке полного пересчёта:
+# ограничивает память под произведение матриц
+PAIRS_PER_BLOCK = 20_000_000
+
+BATCH_SIZE = 2000
+
+
+def recommended_ids(book_id, limit):
+    """
+    id самых похожих книг по убыванию похожести - один запрос по индексу (book, -score).
+    Сами книги страница берёт через catalog.loaders, вместе с основной.
+    """
+    return BookNeighbor.objects.filter(book_id=book_id).order_by('-score').values_list('neighbor_id', flat=True)[:limit]
+
+
+@cache
+def matrix_libs():
+    """
+    Модули (numpy, scipy.sparse) или None, если они не установлены.
+
+    Импортируются только для полного пересчёта: веб-процессу они не нужны,
+    а их импорт - заметная часть запуска процесса.
+    """
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError:
+        return None
+    return numpy, sparse
+
+
+def _weight_sql(column):
+    cases = ' '.join(f"WHEN '{status}' THEN {weight}" for status, weight in STATUS_WEIGHTS.items())
+    return f'CASE {column} {cases} ELSE 0 END'
+
+
+def _status_filter(column):
+    return f"{column} IN ({', '.join(repr(status) for status in STATUS_WEIGHTS)})"
+
+
+def _norms(book_ids):
+    """
+    Длины векторов книг. Считаются по индексу (book, reading_status) без чтения таблицы.
+    """
+    table = UserStatus._meta.db_table
+    norms = {}
+    book_ids = list(book_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), 500):
+            chunk = book_ids[start:start + 500]
+            cursor.execute(
+                f'SELECT book_id, SUM(({_weight_sql("reading_status")}) * ({_weight_sql("reading_status")})) '
+                f'FROM {table} WHERE book_id IN ({", ".join(["%s"] * len(chunk))}) '
+                f'AND {_status_filter("reading_status")} GROUP BY book_id',
+                chunk,
+            )
+            norms.update((book_id, math.sqrt(value)) for book_id, value in cursor.fetchall())
+    return norms
+
+
+def book_similarities(book_id):
+    """
+    Положительные похожести книги на все книги с общими читателями: {id: косинус}.
+    """
+    table = UserStatus._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT other.book_id, SUM(({_weight_sql("mine.reading_status")}) * ({_weight_sql("other.reading_status")})) '
+            f'FROM {table} AS mine JOIN {table} AS other ON other.user_id = mine.user_id '
+            f'WHERE mine.book_id = %s AND other.book_id != mine.book_id '
+            f'AND {_status_filter("mine.reading_status")} AND {_status_filter("other.reading_status")} '
+            f'GROUP BY other.book_id',
+            [book_id],
+        )
+        dots = {other: dot for other, dot in cursor.fetchall() if dot > 0}
+    if not dots:
+        return {}
+    norms = _norms([book_id, *dots])
+    return {other: dot / (norms[book_id] * norms[other]) for other, dot in dots.items()}
+
+
+def _top(similarities, neighbors):
+    return heapq.nlargest(neighbors, similarities.items(), key=lambda item: item[1])
+
+
+@serialized_write
+def _store_book(book_id, similarities, top):
+    """
+    Записывает соседей книги и обновляет её место в списках других книг.
+    Возвращает (книги с изменёнными списками, книги, чьи списки стали короче).
+    """
+    if not Book.objects.filter(id=book_id).exists():
+        return set(), set()
+
+    BookNeighbor.objects.filter(book_id=book_id).delete()
+    BookNeighbor.objects.bulk_create(
+        BookNeighbor(book_id=book_id, neighbor_id=neighbor_id, score=score) for neighbor_id, score in top
+    )
+    changed, shrunk = {book_id}, set()
+
+    # Книга в чужих списках: похожесть поменялась или пропала
+    listed = list(BookNeighbor.objects.filter(neighbor_id=book_id))
+    updated = []
+    for row in listed:
+        score = similarities.get(row.book_id)
+        if score is None:
+            row.delete()
+            shrunk.add(row.book_id)
+        elif score != row.score:
+            row.score = score
+            updated.append(row)
+    BookNeighbor.objects.bulk_update(updated, ['score'], batch_size=BATCH_SIZE)
+    changed.update(row.book_id for row in listed)
+
+    # Соседи книги, в чьих списках её ещё нет: попадает, если лучше самого слабого соседа
+    listed_in = {row.book_id for row in listed}
+    candidates = [(neighbor_id, score) for neighbor_id, score in top if neighbor_id not in listed_in]
+    lists = {
+        row['book_id']: row
+        for row in BookNeighbor.objects.filter(book_id__in=[neighbor_id for neighbor_id, _ in candidates])
+        .values('book_id').annotate(count=Count('id'), lowest=Min('score'))
+    }
+    for neighbor_id, score in candidates:
+        current = lists.get(neighbor_id)
+        if current and current['count'] >= NEIGHBORS:
+            if score <= current['lowest']:
+                continue
+            weakest = BookNeighbor.objects.filter(book_id=neighbor_id).order_by('score').first()
+            weakest.delete()
+        BookNeighbor.objects.create(book_id=neighbor_id, neighbor_id=book_id, score=score)
+        changed.add(neighbor_id)
+    return changed, shrunk
+
+
+# По одной: пересчёты меняют списки соседей других книг и не должны пересекаться
+@tasks.register('recommendations.refresh', serial=True)
+def refresh_book(book_id, propagate=True):
+    """
+    Пересчитывает соседей книги после смены её статусов.
+
+    Книги, из чьих списков она выпала, пересчитываются целиком (propagate),
+    иначе их списки останутся короче NEIGHBORS до полного пересчёта.
+    """
+    similarities = book_similarities(book_id)
+    changed, shrunk = _store_book(book_id, similarities, _top(similarities, NEIGHBORS))
+    if changed:
+        invalidate(*(recommendations_tag(changed_id) for changed_id in changed))
+    if propagate:
+        for other_id in shrunk:
+            refresh_book(other_id, propagate=False)
+
+
+def schedule_refresh(book_id):
+    """
+    Ставит пересчёт соседей книги в очередь фоновых задач (в текущей транзакции).
+    Повторные смены статусов, пока пересчёт ждёт в очереди, склеиваются.
+    """
+    tasks.enqueue('recommendations.refresh', book_id, key=f'recommendations:{book_id}')
+
+
+def schedule_refresh_many(book_ids):
+    """
+    schedule_refresh для многих книг одним INSERT (массовые изменения статусов).
+    """
+    tasks.enqueue_many(
+        'recommendations.refresh', (((book_id,), f'recommendations:{book_id}') for book_id in book_ids),
+    )
+
+
+def _load_matrix():
+    """
+    Матрица пользователи x книги с весами статусов (scipy CSR) и id книг по столбцам.
+    """
+    np, sparse = matrix_libs()
+    users, books, weights = array('q'), array('q'), array('f')
+    table = UserStatus._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT user_id, book_id, {_weight_sql("reading_status")} FROM {table} '
+            f'WHERE {_status_filter("reading_status")}'
+        )
+        while rows := cursor.fetchmany(100_000):
+            for user_id, book_id, weight in rows:
+                users.append(user_id)
+                books.append(book_id)
+                weights.append(weight)
+
+    book_ids, columns = np.unique(np.frombuffer(books, dtype=np.int64), return_inverse=True)
+    user_ids, rows = np.unique(np.frombuffer(users, dtype=np.int64), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.frombuffer(weights, dtype=np.float32), (rows, columns)),
+        shape=(len(user_ids), len(book_ids)),
+    )
+    return matrix, book_ids
+
+
+def top_neighbors(matrix, neighbors=NEIGHBORS, pairs_per_block=PAIRS_PER_BLOCK):
+    """
+    Ближайшие соседи каждого столбца матрицы пользователи x книги.
+
+    Выдаёт блоки [(номер книги, номера соседей, похожести), ...]. Похожести -
+    косинусы столбцов: произведение нормированной матрицы на себя, которое
+    считается по блокам книг, чтобы в памяти было не больше pairs_per_block пар.
+    """
+    np, sparse = matrix_libs()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsr().astype(np.float32)
+    items = normalized.T.tocsr()
+
+    # Верхняя оценка пар для каждой книги: сумма числа книг у её читателей
+    user_books = np.diff(normalized.indptr).astype(np.int64)
+    reach = items.copy()
+    reach.data = np.ones_like(reach.data)
+    pairs = np.cumsum(reach @ user_books)
+
+    start = 0
+    while start < items.shape[0]:
+        already = pairs[start - 1] if start else 0
+        end = max(int(np.searchsorted(pairs, already + pairs_per_block, side='right')), start + 1)
+        product = (items[start:end] @ normalized).tocsr()
+        block = []
+        for row in range(end - start):
+            begin, finish = product.indptr[row], product.indptr[row + 1]
+            columns, scores = product.indices[begin:finish], product.data[begin:finish]
+            keep = (scores > 0) & (columns != start + row)
+            columns, scores = columns[keep], scores[keep]
+            if len(scores) > neighbors:
+                best = np.argpartition(-scores, neighbors)[:neighbors]
+                columns, scores = columns[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            block.append((start + row, columns[order], scores[order]))
+        yield block
+        start = end
+
+
+@serialized_write
+def _replace_range(first_id, last_id, lists):
+    """
+    Заменяет соседей всех книг с id в [first_id, last_id] (last_id=None - до конца).
+    """
+    stale = BookNeighbor.objects.filter(book_id__gte=first_id)
+    if last_id is not None:
+        stale = stale.filter(book_id__lte=last_id)
+    stale.delete()
+    BookNeighbor.objects.bulk_create(
+        (
+            BookNeighbor(book_id=book_id, neighbor_id=neighbor_id, score=score)
+            for book_id, top in lists
+            for neighbor_id, score in top
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _vectorized_lists(neighbors, pairs_per_block):
+    matrix, book_ids = _load_matrix()
+    for block in top_neighbors(matrix, neighbors, pairs_per_block):
+        yield [
+            (int(book_ids[row]), list(zip(book_ids[columns].tolist(), scores.tolist())))
+            for row, columns, scores in block
+        ]
+
+
+def _sql_lists(neighbors):
+    block = []
+    for book_id in Book.objects.order_by('id').values_list('id', flat=True).iterator():
+        block.append((book_id, _top(book_similarities(book_id), neighbors)))
+        if len(block) == 100:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def rebuild(neighbors=NEIGHBORS, pairs_per_block=PAIRS_PER_BLOCK):
+    """
+    Пересчитывает соседей всех книг. Возвращает (число книг, записанных пар).
+
+    Старые списки заменяются блоками по диапазонам id, так что страницы книг
+    всё время показывают либо старые, либо новые рекомендации.
+    """
+    if matrix_libs():
+        blocks = _vectorized_lists(neighbors, pairs_per_block)
+    else:
+        blocks = _sql_lists(neighbors)
+
+    books = pairs = 0
+    first_id = 0
+    for lists in blocks:
+        last_id = lists[-1][0]
+        _replace_range(first_id, last_id, lists)
+        books += len(lists)
+        pairs += sum(len(top) for _, top in lists)
+        first_id = last_id + 1
+    # Книги без статусов после последнего блока
+    _replace_range(first_id, None, [])
+    invalidate(RECOMMENDATIONS)
+    return books, pairs
@@ -0,0 +1,159 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from . import tasks
+from .cache import CATALOG, book_tag, invalidate
+from .changes import stamp_update
+from .models import Book
+
+
+# Размеры уменьшенных обложек (в два раза больше размера на странице для чётких экранов)
+SIZES = {
+    'small': (120, 180),   # book-cover-small в профиле, 60x90
+    'shelf': (300, 400),   # обложка на полке каталога, 150x200
+    'detail': (500, 700),  # карточка книги, 250x350
+}
+
+# Папка с уменьшенными обложками внутри MEDIA_ROOT
+RENDITIONS_DIR = 'renditions'
+
+# WebP, если Pillow собран с его поддержкой, иначе JPEG
+if features.check('webp'):
+    FORMAT, EXTENSION = 'WEBP', 'webp'
+else:
+    FORMAT, EXTENSION = 'JPEG', 'jpg'
+
+QUALITY = 80
+
+
+def rendition_name(cover_hash, size):
+    """
+    Путь к уменьшенной обложке в хранилище по хешу содержимого оригинала.
+    """
+    return f'{RENDITIONS_DIR}/{cover_hash[:2]}/{cover_hash}-{size}.{EXTENSION}'
+
+
+def cover_url(book, size):
+    """
+    URL обложки нужного размера; пока уменьшенные копии не готовы - оригинал.
+    """
+    if book.cover_hash:
+        return default_storage.url(rendition_name(book.cover_hash, size))
+    if book.cover_image:
+        return book.cover_image.url
+    return ''
+
+
+def hash_file(file):
+    """
+    SHA-256 содержимого файла.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _render(image, size):
+    """
+    Обрезает и уменьшает картинку до точного размера (как object-fit: cover).
+    """
+    result = ImageOps.fit(image, SIZES[size], Image.LANCZOS)
+    buffer = BytesIO()
+    result.save(buffer, FORMAT, quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+@tasks.register('renditions.build')
+def build_renditions(book_id):
+    """
+    Нарезает уменьшенные обложки книги и записывает хеш в Book.cover_hash.
+
+    Одинаковые картинки нарезаются один раз: имена файлов зависят
+    только от содержимого оригинала.
+    """
+    book = Book.objects.only('id', 'cover_image', 'cover_hash').filter(id=book_id).first()
+    if book is None or not book.cover_image:
+        return None
+
+    with book.cover_image.open('rb') as file:
+        cover_hash = hash_file(file)
+        missing = [
+            size for size in SIZES
+            if not default_storage.exists(rendition_name(cover_hash, size))
+        ]
+        if missing:
+            file.seek(0)
+            with Image.open(file) as image:
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                for size in missing:
+                    content = ContentFile(_render(image, size))
+                    default_storage.save(rendition_name(cover_hash, size), content)
+
+    old_hash = book.cover_hash
+    # Обложку могли заменить, пока мы работали - тогда хеш не записываем
+    updated = stamp_update(
+        Book.objects.filter(cover_image=book.cover_image.name), book.id,
+        cover_hash=cover_hash,
+        # update() не трогает auto_now, а адрес обложки в API поменялся
+        updated_at=timezone.now(),
+    )
+    if updated:
+        # update() не вызывает сигналы, поэтому кэш страниц сбрасываем сами
+        invalidate(CATALOG, book_tag(book.id))
+    if old_hash and old_hash != cover_hash:
+        delete_renditions(old_hash)
+    return cover_hash
+
+
+@tasks.register('renditions.cleanup')
+def delete_renditions(cover_hash):
+    """
+    Удаляет уменьшенные обложки, если этот хеш больше ни у кого не используется.
+    """
+    if not cover_hash or Book.objects.filter(cover_hash=cover_hash).exists():
+        return
+    for size in SIZES:
+        name = rendition_name(cover_hash, size)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+@tasks.register('covers.delete')
+def delete_cover(name):
+    """
+    Удаляет файл оригинала обложки, если на него больше не ссылается ни одна книга.
+    """
+    if not name or Book.objects.filter(cover_image=name).exists():
+        return
+    if default_storage.exists(name):
+        default_storage.delete(name)
+
+
+def schedule_renditions(book_id):
+    """
+    Ставит нарезку обложек в очередь фоновых задач (в текущей транзакции).
+    """
+    tasks.enqueue('renditions.build', book_id, key=f'renditions:{book_id}')
+
+
+def schedule_cleanup(cover_hash):
+    """
+    Ставит удаление устаревших уменьшенных обложек в очередь фоновых задач.
+    """
+    if cover_hash:
+        tasks.enqueue('renditions.cleanup', cover_hash, key=f'renditions-cleanup:{cover_hash}')
+
+
+def schedule_cover_delete(name):
+    """
+    Ставит удаление файла старой обложки в очередь фоновых задач.
+    """
+    if name:
+        tasks.enqueue('covers.delete', name, key=f'covers-delete:{name}')
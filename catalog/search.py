@@ -0,0 +1,243 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.db import connection
+
+from .migrations._fts import INDEX_BOOKS_SQL, TABLE_SQL, TRIGGERS_SQL
+from .models import Book
+from .pagination import LIST_FIELDS
+
+
+# Имя виртуальной таблицы FTS5 (создаётся миграцией только на SQLite)
+FTS_TABLE = 'catalog_book_fts'
+
+# Веса полей при ранжировании: название важнее автора, автор важнее описания
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'author': 5.0,
+    'description': 1.0,
+}
+
+# Сколько результатов отдаём по умолчанию
+SEARCH_LIMIT = 48
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """
+    Приводит текст к виду для индекса: нижний регистр, "ё" -> "е".
+    """
+    return (text or '').lower().replace('ё', 'е')
+
+
+def tokenize(text):
+    """
+    Разбивает текст на слова (кириллица и латиница).
+    """
+    return TOKEN_RE.findall(normalize(text))
+
+
+def uses_fts():
+    """
+    Используется ли полнотекстовый индекс SQLite FTS5.
+    """
+    return connection.vendor == 'sqlite'
+
+
+def _fts_query(tokens):
+    """
+    Строит запрос FTS5: все слова обязательны и ищутся по префиксу
+    ("толст" находит "Толстой").
+    """
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _fts_search(tokens, genre, year, limit):
+    """
+    Возвращает id книг из FTS5, отсортированные по релевантности (bm25).
+    """
+    weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+    sql = [
+        f'SELECT f.rowid FROM {FTS_TABLE} f',
+        f'JOIN {Book._meta.db_table} b ON b.id = f.rowid',
+        f'WHERE {FTS_TABLE} MATCH %s',
+    ]
+    params = [_fts_query(tokens)]
+    if genre:
+        sql.append('AND b.genre = %s')
+        params.append(genre)
+    if year:
+        sql.append('AND b.publication_year = %s')
+        params.append(year)
+    sql.append(f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s')
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PythonIndex:
+    """
+    Инвертированный индекс в памяти процесса для баз без FTS5.
+
+    Хранит для каждого слова книги и вес вхождения, плюс отсортированный
+    словарь слов для поиска по префиксу.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # слово -> {id книги: вес}
+        self.documents = {}  # id книги -> (слова, жанр, год)
+        self.vocabulary = []  # отсортированный список слов
+        self.ready = False
+        self.lock = threading.RLock()
+
+    def _add(self, book_id, title, author, description, genre, year, sort_vocabulary=True):
+        weights = defaultdict(float)
+        for field, text in (('title', title), ('author', author), ('description', description)):
+            for token in tokenize(text):
+                weights[token] += FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            if sort_vocabulary and token not in self.postings:
+                insort(self.vocabulary, token)
+            self.postings[token][book_id] = weight
+        self.documents[book_id] = (set(weights), genre, year)
+
+    def _remove(self, book_id):
+        document = self.documents.pop(book_id, None)
+        if document is None:
+            return
+        for token in document[0]:
+            self.postings[token].pop(book_id, None)
+            if not self.postings[token]:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    def rebuild(self):
+        """
+        Полностью перестраивает индекс по таблице книг.
+        """
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+            rows = Book.objects.values_list(
+                'id', 'title', 'author', 'description', 'genre', 'publication_year'
+            )
+            for row in rows.iterator(chunk_size=2000):
+                self._add(*row, sort_vocabulary=False)
+            self.vocabulary = sorted(self.postings)
+            self.ready = True
+
+    def update(self, book):
+        """
+        Обновляет одну книгу в индексе.
+        """
+        with self.lock:
+            if not self.ready:
+                return
+            self._remove(book.id)
+            self._add(book.id, book.title, book.author, book.description,
+                      book.genre, book.publication_year)
+
+    def remove(self, book_id):
+        """
+        Убирает книгу из индекса.
+        """
+        with self.lock:
+            if self.ready:
+                self._remove(book_id)
+
+    def _prefix_matches(self, prefix):
+        """
+        Все книги со словами, начинающимися с prefix, и их лучший вес.
+        """
+        matches = {}
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            for book_id, weight in self.postings[self.vocabulary[position]].items():
+                matches[book_id] = max(weight, matches.get(book_id, 0))
+            position += 1
+        return matches
+
+    def search(self, tokens, genre, year, limit):
+        """
+        Возвращает id книг, содержащих все слова запроса, по убыванию веса.
+        """
+        with self.lock:
+            if not self.ready:
+                self.rebuild()
+
+            scores = None
+            for token in tokens:
+                matches = self._prefix_matches(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        book_id: scores[book_id] + weight
+                        for book_id, weight in matches.items()
+                        if book_id in scores
+                    }
+                if not scores:
+                    return []
+
+            results = []
+            for book_id, score in scores.items():
+                _, book_genre, book_year = self.documents[book_id]
+                if genre and book_genre != genre:
+                    continue
+                if year and str(book_year) != str(year):
+                    continue
+                results.append((-score, book_id))
+            results.sort()
+            return [book_id for _, book_id in results[:limit]]
+
+
+python_index = PythonIndex()
+
+
+def search_ids(query, genre=None, year=None, limit=SEARCH_LIMIT):
+    """
+    id книг, подходящих под запрос, в порядке релевантности.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if uses_fts():
+        return _fts_search(tokens, genre, year, limit)
+    return python_index.search(tokens, genre, year, limit)
+
+
+def search_books(query, genre=None, year=None, limit=SEARCH_LIMIT):
+    """
+    Ищет книги по названию, автору и описанию.
+
+    Возвращает список книг (без описания) в порядке релевантности.
+    """
+    ids = search_ids(query, genre, year, limit)
+    if not ids:
+        return []
+
+    books = Book.objects.only(*LIST_FIELDS).in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books]
+
+
+def rebuild_index():
+    """
+    Перестраивает поисковый индекс целиком. Возвращает число книг в индексе.
+    """
+    if uses_fts():
+        # Тот же SQL, что в миграциях: таблица и триггеры создаются, если их нет
+        with connection.cursor() as cursor:
+            for sql in [TABLE_SQL, *TRIGGERS_SQL]:
+                cursor.execute(sql)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(INDEX_BOOKS_SQL)
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    python_index.rebuild()
+    return len(python_index.documents)
@@ -0,0 +1,165 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, changes, facets, recommendations, stats
+from .auth import forget_user
+from .renditions import schedule_cleanup, schedule_cover_delete
+from .models import Book, BookNeighbor, UserReadingStats, UserStatus
+from .search import python_index, uses_fts
+
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=UserStatus)
+def assign_change_version(sender, instance, **kwargs):
+    """Добавляет изменение в журнал и ставит его номер версией строки"""
+    changes.assign_version(instance)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=UserStatus)
+def record_saved_change(sender, instance, created, update_fields=None, **kwargs):
+    """Дописывает в журнал id созданной строки"""
+    changes.record_saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=UserStatus)
+def record_deleted_change(sender, instance, **kwargs):
+    """Добавляет в журнал удаление строки"""
+    changes.record_deleted(instance)
+
+
+@receiver(post_save, sender=Book)
+def update_search_index(sender, instance, **kwargs):
+    """Обновляет запасной поисковый индекс после сохранения книги"""
+    # На SQLite индекс FTS5 обновляют триггеры в базе
+    if not uses_fts():
+        python_index.update(instance)
+
+
+@receiver(post_delete, sender=Book)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Убирает удалённую книгу из запасного поискового индекса"""
+    if not uses_fts():
+        python_index.remove(instance.id)
+
+
+@receiver(post_save, sender=Book)
+def count_created_book(sender, instance, created, **kwargs):
+    """Увеличивает счётчик книг"""
+    if created:
+        stats.bump_counter(stats.BOOKS, 1)
+
+
+@receiver(post_save, sender=Book)
+def update_book_facets(sender, instance, created, **kwargs):
+    """Переносит книгу между ячейками фильтров каталога"""
+    facets.book_saved(instance, created)
+
+
+@receiver(pre_delete, sender=Book)
+def remove_book_facets(sender, instance, **kwargs):
+    """Убирает книгу и её статусы из ячеек фильтров (пока статусы ещё не удалены)"""
+    facets.book_deleted(instance)
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    """Уменьшает счётчик книг"""
+    stats.bump_counter(stats.BOOKS, -1)
+
+
+@receiver(post_delete, sender=Book)
+def remove_cover_renditions(sender, instance, **kwargs):
+    """Ставит в очередь удаление обложки и уменьшенных копий удалённой книги"""
+    schedule_cleanup(instance.cover_hash)
+    schedule_cover_delete(instance.cover_image.name)
+
+
+@receiver(pre_delete, sender=Book)
+def refresh_similar_books(sender, instance, **kwargs):
+    """Пересчитывает соседей книг, в чьих списках была удаляемая книга"""
+    for book_id in BookNeighbor.objects.filter(neighbor=instance).values_list('book_id', flat=True):
+        recommendations.schedule_refresh(book_id)
+
+
+@receiver(post_save, sender=Book)
+def invalidate_saved_book(sender, instance, created, **kwargs):
+    """Сбрасывает кэш каталога и страницы книги"""
+    tags = [cache.CATALOG, cache.book_tag(instance.id)]
+    if created:
+        tags.append(cache.COUNTERS)
+    cache.invalidate(*tags)
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_deleted_book(sender, instance, **kwargs):
+    """Сбрасывает кэш каталога, страницы книги и счётчиков"""
+    cache.invalidate(cache.CATALOG, cache.book_tag(instance.id), cache.COUNTERS)
+
+
+@receiver(post_save, sender=User)
+def count_created_user(sender, instance, created, **kwargs):
+    """Заводит счётчики нового пользователя"""
+    if created:
+        UserReadingStats.objects.get_or_create(user=instance)
+        stats.bump_counter(stats.USERS, 1)
+        cache.invalidate(cache.COUNTERS)
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    """Уменьшает счётчик пользователей"""
+    stats.bump_counter(stats.USERS, -1)
+    cache.invalidate(cache.COUNTERS)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Сбрасывает пользователя в кэше входа (пароль, активность, last_login)"""
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=UserStatus)
+def count_saved_status(sender, instance, created, **kwargs):
+    """Переносит книгу между счётчиками статусов при создании или изменении"""
+    if created:
+        stats.status_changed(instance.user_id, None, instance.reading_status)
+        facets.status_changed(instance, None, instance.reading_status)
+    elif hasattr(instance, '_loaded_status'):
+        stats.status_changed(instance.user_id, instance._loaded_status, instance.reading_status)
+        facets.status_changed(instance, instance._loaded_status, instance.reading_status)
+    # Иначе прежний статус неизвестен - счётчики поправит reconcile_stats
+    old_status = getattr(instance, '_loaded_status', None)
+    weights = recommendations.STATUS_WEIGHTS
+    if weights.get(old_status) != weights.get(instance.reading_status):
+        recommendations.schedule_refresh(instance.book_id)
+    instance._loaded_status = instance.reading_status
+    cache.invalidate(
+        cache.COUNTERS,
+        cache.status_tag(instance.user_id, instance.book_id),
+        cache.shelf_tag(instance.user_id),
+    )
+
+
+@receiver(post_delete, sender=UserStatus)
+def count_deleted_status(sender, instance, origin=None, **kwargs):
+    """Убирает книгу из счётчиков (в том числе при каскадном удалении книги)"""
+    old_status = getattr(instance, '_loaded_status', instance.reading_status)
+    # При удалении пользователя его счётчики удаляются каскадом вместе с ним
+    user_deleted = isinstance(origin, User) or getattr(origin, 'model', None) is User
+    stats.status_changed(instance.user_id, old_status, None, update_user=not user_deleted)
+    # Соседи удалённой книги удаляются каскадом, пересчитывать нечего
+    book_deleted = isinstance(origin, Book) or getattr(origin, 'model', None) is Book
+    # Ячейки фильтров удалённого пользователя удаляются каскадом, книги - убраны в pre_delete
+    if not user_deleted and not book_deleted:
+        facets.status_changed(instance, old_status, None)
+    if not book_deleted and old_status in recommendations.STATUS_WEIGHTS:
+        recommendations.schedule_refresh(instance.book_id)
+    cache.invalidate(
+        cache.COUNTERS,
+        cache.status_tag(instance.user_id, instance.book_id),
+        cache.shelf_tag(instance.user_id),
+    )
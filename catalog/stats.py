@@ -0,0 +1,156 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Book, GlobalCounter, UserReadingStats, UserStatus
+
+
+# Имена общих счётчиков
+BOOKS = 'books'
+USERS = 'users'
+
+# Горизонт журнала изменений (catalog.changes), это не счётчик и reconcile его не трогает
+CHANGES_HORIZON = 'changes:horizon'
+
+
+def status_counter(reading_status):
+    """
+    Имя общего счётчика для статуса чтения.
+    """
+    return f'status:{reading_status}'
+
+
+def bump_counter(name, delta):
+    """
+    Изменяет общий счётчик на delta одним UPDATE.
+    """
+    if not delta:
+        return
+    updated = GlobalCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if not updated:
+        GlobalCounter.objects.get_or_create(name=name)
+        GlobalCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def status_changed(user_id, old_status, new_status, update_user=True):
+    """
+    Переносит книгу пользователя из счётчика old_status в new_status.
+
+    None вместо статуса означает, что записи UserStatus не было
+    (создание) или больше нет (удаление). update_user=False меняет
+    только общие счётчики. Статусы не из UserStatus.READING_STATUS
+    (записанные в обход формы) не считаются, как и в reconcile().
+    """
+    if old_status not in UserStatus.READING_STATUS_LABELS:
+        old_status = None
+    if new_status not in UserStatus.READING_STATUS_LABELS:
+        new_status = None
+    if old_status == new_status:
+        return
+
+    changes = {}
+    if old_status:
+        changes[old_status] = F(old_status) - 1
+    if new_status:
+        changes[new_status] = F(new_status) + 1
+    total_delta = (1 if new_status else 0) - (1 if old_status else 0)
+    if total_delta:
+        changes['total'] = F('total') + total_delta
+
+    with transaction.atomic():
+        if update_user:
+            updated = UserReadingStats.objects.filter(user_id=user_id).update(**changes)
+            if not updated:
+                UserReadingStats.objects.get_or_create(user_id=user_id)
+                UserReadingStats.objects.filter(user_id=user_id).update(**changes)
+
+        if old_status:
+            bump_counter(status_counter(old_status), -1)
+        if new_status:
+            bump_counter(status_counter(new_status), 1)
+
+
+def recount_users(user_ids):
+    """
+    Пересчитывает счётчики пользователей user_ids одним UPDATE с подзапросами
+    по индексу (user, reading_status). Для массовых изменений мимо сигналов.
+    """
+    def count(**filters):
+        rows = (
+            UserStatus.objects.filter(user_id=OuterRef('user_id'), **filters)
+            .order_by().values('user_id').annotate(count=Count('id')).values('count')
+        )
+        return Coalesce(Subquery(rows), Value(0))
+
+    return UserReadingStats.objects.filter(user_id__in=user_ids).update(
+        total=count(),
+        **{value: count(reading_status=value) for value, _ in UserStatus.READING_STATUS},
+    )
+
+
+def _counters_from(rows):
+    counters = dict(rows)
+    return {
+        'books': counters.get(BOOKS, 0),
+        'users': counters.get(USERS, 0),
+        'statuses': {
+            value: counters.get(status_counter(value), 0)
+            for value, _ in UserStatus.READING_STATUS
+        },
+    }
+
+
+def get_counters():
+    """
+    Возвращает все общие счётчики одним запросом.
+    """
+    return _counters_from(GlobalCounter.objects.values_list('name', 'value'))
+
+
+async def aget_counters():
+    """
+    Асинхронный вариант get_counters.
+    """
+    return _counters_from([row async for row in GlobalCounter.objects.values_list('name', 'value')])
+
+
+@transaction.atomic
+def reconcile():
+    """
+    Пересчитывает все счётчики с нуля по таблицам UserStatus, Book и User.
+    """
+    statuses = [value for value, _ in UserStatus.READING_STATUS]
+
+    # Счётчики пользователей: один GROUP BY по всем статусам
+    per_user = {
+        user_id: UserReadingStats(user_id=user_id)
+        for user_id in User.objects.values_list('id', flat=True)
+    }
+    rows = UserStatus.objects.values('user_id', 'reading_status').annotate(count=Count('id'))
+    for row in rows:
+        stats = per_user.get(row['user_id'])
+        if stats is None or row['reading_status'] not in statuses:
+            continue
+        setattr(stats, row['reading_status'], row['count'])
+        stats.total += row['count']
+
+    UserReadingStats.objects.all().delete()
+    UserReadingStats.objects.bulk_create(per_user.values(), batch_size=1000)
+
+    # Общие счётчики
+    totals = dict(
+        UserStatus.objects.values_list('reading_status').annotate(count=Count('id')).order_by()
+    )
+    values = {
+        BOOKS: Book.objects.count(),
+        USERS: len(per_user),
+    }
+    for value in statuses:
+        values[status_counter(value)] = totals.get(value, 0)
+
+    GlobalCounter.objects.exclude(name=CHANGES_HORIZON).delete()
+    GlobalCounter.objects.bulk_create(
+        GlobalCounter(name=name, value=value) for name, value in values.items()
+    )
+    return len(per_user)
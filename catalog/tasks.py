@@ -0,0 +1,264 @@
+"""
+Фоновые задачи на таблице Task, без внешнего брокера.
+
+Побочная работа после сохранения (нарезка обложек, удаление файлов,
+пересчёт рекомендаций) не выполняется в запросе: enqueue() добавляет
+строку Task в ту же транзакцию, что и изменение, и запрос отвечает сразу
+после коммита. Задача не теряется, если процесс упадёт, и не выполнится,
+если транзакция откатится.
+
+Выполняют задачи потоки веб-процесса (settings.TASKS_IN_PROCESS, их будит
+коммит, а задачи, оставшиеся от прошлого запуска, - resume() при подготовке
+процесса) или отдельные процессы python manage.py run_tasks. Упавшая
+задача повторяется с растущей паузой, задача с ключом не дублируется,
+пока ждёт в очереди.
+"""
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .db import serialized_write
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные задачи: имя -> (функция, попыток, по одной за раз)
+_registry = {}
+
+# Потоки веб-процесса, выполняющие задачи после коммита
+_executor = ThreadPoolExecutor(max_workers=settings.TASKS_WORKERS, thread_name_prefix='tasks')
+
+# Сколько проходов по очереди ждут свободного потока: больше TASKS_WORKERS не нужно,
+# ещё не начатый проход и так увидит все закоммиченные задачи
+_queued = 0
+_queued_lock = threading.Lock()
+
+
+def register(name, max_attempts=None, serial=False):
+    """
+    Регистрирует функцию как задачу с именем name.
+
+    serial=True - задачи с этим именем выполняются по одной во всех
+    исполнителях (пересчёты, которые меняют общие данные).
+    """
+    def decorator(func):
+        _registry[name] = (func, max_attempts or settings.TASKS_MAX_ATTEMPTS, serial)
+        return func
+
+    return decorator
+
+
+def enqueue(name, *args, key=None, delay=0):
+    """
+    Ставит задачу в очередь в текущей транзакции.
+
+    Если ждущая задача с тем же key уже есть, новая не добавляется.
+    Аргументы должны сериализоваться в JSON. Возвращает Task или None.
+    """
+    if name not in _registry:
+        raise ValueError(f'Неизвестная задача: {name}')
+    if key and Task.objects.filter(key=key, state=Task.PENDING).exists():
+        return None
+    try:
+        with transaction.atomic():
+            task = Task.objects.create(
+                name=name, args=list(args), key=key,
+                run_at=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        # Такую же задачу только что поставил другой запрос
+        return None
+    if settings.TASKS_IN_PROCESS:
+        transaction.on_commit(lambda: wake(delay))
+    return task
+
+
+def enqueue_many(name, calls, delay=0):
+    """
+    Ставит в очередь много задач name: calls - пары (аргументы, key).
+    Одна проверка ждущих ключей и один INSERT на пачку вместо enqueue на
+    каждую задачу (массовые операции). Возвращает число добавленных задач.
+    """
+    if name not in _registry:
+        raise ValueError(f'Неизвестная задача: {name}')
+    calls = list(calls)
+    keys = {key for _, key in calls if key}
+    # Ждущие задачи и повторы ключа в calls не дублируем
+    skip = set(Task.objects.filter(key__in=keys, state=Task.PENDING).values_list('key', flat=True))
+    run_at = timezone.now() + timedelta(seconds=delay)
+    new = []
+    for args, key in calls:
+        if key in skip:
+            continue
+        if key:
+            skip.add(key)
+        new.append(Task(name=name, args=list(args), key=key, run_at=run_at))
+    # Такую же задачу мог только что поставить другой запрос - её пропустит индекс ключа
+    Task.objects.bulk_create(new, batch_size=500, ignore_conflicts=True)
+    if new and settings.TASKS_IN_PROCESS:
+        transaction.on_commit(lambda: wake(delay))
+    return len(new)
+
+
+def _due(now):
+    return Task.objects.filter(state__in=[Task.PENDING, Task.RUNNING], run_at__lte=now)
+
+
+def claim(finished=()):
+    """
+    Берёт в работу пачку задач (до TASKS_BATCH), срок которых наступил,
+    и в той же транзакции удаляет выполненные задачи finished.
+
+    Пока задача выполняется, в run_at лежит срок аренды (TASKS_TIMEOUT):
+    если исполнитель упал, после него задачу возьмёт другой.
+    """
+    # Пустую очередь видно чтением, без блокировки записи
+    if not _due(timezone.now()).exists():
+        if finished:
+            serialized_write(Task.objects.filter(pk__in=finished).delete)()
+        return []
+    return _claim(finished)
+
+
+@serialized_write
+def _claim(finished):
+    if finished:
+        Task.objects.filter(pk__in=finished).delete()
+    now = timezone.now()
+    serial = {name for name, (_, _, is_serial) in _registry.items() if is_serial}
+    busy = Task.objects.filter(state=Task.RUNNING, run_at__gt=now, name__in=serial).values('name')
+    batch = []
+    taken = set()
+    for task in _due(now).exclude(name__in=busy).order_by('run_at', 'id')[:settings.TASKS_BATCH]:
+        # Из задач "по одной" в пачку попадает только первая
+        if task.name in serial:
+            if task.name in taken:
+                continue
+            taken.add(task.name)
+        task.attempts += 1
+        batch.append(task)
+    if batch:
+        Task.objects.filter(pk__in=[task.pk for task in batch]).update(
+            state=Task.RUNNING,
+            run_at=now + timedelta(seconds=settings.TASKS_TIMEOUT),
+            attempts=F('attempts') + 1,
+        )
+    return batch
+
+
+@serialized_write
+def _retry(task, error):
+    """
+    Возвращает упавшую задачу в очередь с паузой или помечает как failed.
+    """
+    _, max_attempts, _ = _registry.get(task.name, (None, 0, False))
+    if task.attempts >= max_attempts:
+        Task.objects.filter(pk=task.pk).update(state=Task.FAILED, last_error=error)
+        return None
+    # Пока задача выполнялась, такую же уже поставили заново - хватит её
+    if task.key and Task.objects.filter(key=task.key, state=Task.PENDING).exists():
+        Task.objects.filter(pk=task.pk).delete()
+        return None
+    delay = settings.TASKS_RETRY_BACKOFF * 2 ** (task.attempts - 1)
+    delay += random.uniform(0, delay)
+    Task.objects.filter(pk=task.pk).update(
+        state=Task.PENDING, run_at=timezone.now() + timedelta(seconds=delay), last_error=error,
+    )
+    return delay
+
+
+def run(task):
+    """
+    Выполняет взятую задачу, при ошибке ставит повтор.
+    Возвращает True, если задача выполнена (удалит её следующий claim).
+    """
+    entry = _registry.get(task.name)
+    try:
+        if entry is None:
+            raise LookupError(f'Задача {task.name} не зарегистрирована')
+        entry[0](*task.args)
+    except Exception as error:
+        logger.exception('Задача %s%s не выполнена (попытка %s)', task.name, tuple(task.args), task.attempts)
+        delay = _retry(task, f'{type(error).__name__}: {error}')
+        if delay is not None and settings.TASKS_IN_PROCESS:
+            wake(delay)
+        return False
+    return True
+
+
+def run_pending():
+    """
+    Выполняет задачи, пока в очереди есть готовые. Возвращает число взятых задач.
+    """
+    count = 0
+    finished = []
+    while True:
+        batch = claim(finished)
+        if not batch:
+            return count
+        finished = [task.pk for task in batch if run(task)]
+        count += len(batch)
+
+
+def _drain():
+    global _queued
+    with _queued_lock:
+        _queued -= 1
+    close_old_connections()
+    try:
+        run_pending()
+    except Exception:
+        logger.exception('Ошибка исполнителя фоновых задач')
+    finally:
+        close_old_connections()
+
+
+def wake(delay=0):
+    """
+    Будит потоки веб-процесса: сразу или через delay секунд (повтор, отложенная задача).
+    """
+    if delay > 0:
+        timer = threading.Timer(delay, wake)
+        timer.daemon = True
+        timer.start()
+        return
+
+    global _queued
+    with _queued_lock:
+        if _queued >= settings.TASKS_WORKERS:
+            return
+        _queued += 1
+    _executor.submit(_drain)
+
+
+def resume():
+    """
+    Будит потоки веб-процесса после запуска (шаг catalog.warmup).
+
+    Задачи, которые остались в очереди, когда процесс перезапустили, иначе
+    ждали бы следующего enqueue: готовые выполняются сразу, до ближайшей
+    отложенной ставится таймер. Возвращает число ждущих задач.
+    """
+    if not settings.TASKS_IN_PROCESS:
+        return 0
+    waiting = Task.objects.filter(state__in=[Task.PENDING, Task.RUNNING]).aggregate(
+        count=Count('id'), next_run=Min('run_at'),
+    )
+    if waiting['count']:
+        wake(max((waiting['next_run'] - timezone.now()).total_seconds(), 0))
+    return waiting['count']
+
+
+def shutdown():
+    """
+    Дожидается проходов по очереди в потоках веб-процесса (перед удалением базы в командах).
+    """
+    _executor.shutdown(wait=True)
@@ -0,0 +1,12 @@
+from django import template
+
+from catalog.renditions import cover_url as rendition_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def cover_url(book, size):
+    """URL обложки книги нужного размера: small, shelf или detail"""
+    return rendition_url(book, size)
@@ -0,0 +1,63 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.utils.safestring import mark_safe
+
+from catalog.cache import book_tag, tag_versions
+
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/book_card.html'
+
+
+def card_key(book_id, version):
+    return f'card:{book_id}:{version}'
+
+
+def render_cards(books):
+    """
+    HTML карточек книг для полок: {id книги: html}.
+
+    Карточка кэшируется по id книги и версии её тега, правка книги или
+    обложки меняет версию. Версии и готовые карточки берутся из кэша
+    двумя запросами на всю страницу, шаблон отрисовывается только
+    для изменившихся книг.
+    """
+    if not books:
+        return {}
+    versions = tag_versions([book_tag(book.id) for book in books])
+    keys = {book.id: card_key(book.id, version) for book, version in zip(books, versions)}
+    cached = cache.get_many(list(keys.values()))
+
+    cards = {}
+    rendered = {}
+    card_template = None
+    for book in books:
+        html = cached.get(keys[book.id])
+        if html is None:
+            if card_template is None:
+                card_template = Engine.get_default().get_template(CARD_TEMPLATE)
+            html = card_template.render(Context({'book': book}))
+            rendered[keys[book.id]] = html
+        cards[book.id] = mark_safe(html)
+
+    if rendered:
+        cache.set_many(rendered, settings.FRAGMENT_CACHE_TIMEOUT)
+    return cards
+
+
+@register.inclusion_tag('includes/shelves.html')
+def render_shelves(shelves):
+    """Полки каталога из split_into_shelves с карточками из кэша"""
+    cards = render_cards([book for shelf in shelves for book in shelf['books']])
+    return {
+        'shelves': [
+            {
+                'cards': [cards[book.id] for book in shelf['books']],
+                'empty_slots': shelf['empty_slots'],
+            }
+            for shelf in shelves
+        ],
+    }
@@ -0,0 +1,1104 @@
+import asyncio
+import base64
+import contextlib
+import gzip
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_views, bulk, facets, loaders, recommendations, stats, tasks, urls, views, warmup
+from .auth import user_key
+from .cache import book_tag, invalidate, tag_versions
+from .changes import DELETE, UPDATE
+from .loaders import BookCache, Loader, get_books
+from .management.commands import audit_imports
+from .metrics import duplicate_queries, registry
+from .models import (
+    Book, BookFacet, BookNeighbor, ChangeLog, GlobalCounter, Task, UserFacet, UserReadingStats, UserStatus,
+)
+from .stats import CHANGES_HORIZON, status_changed
+
+
+# Задачи выполняются только явно, статика - без собранного манифеста,
+# пароли - быстрым хешем
+TEST_SETTINGS = override_settings(
+    TASKS_IN_PROCESS=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+
+
+def counters_snapshot():
+    """
+    Счётчики и ячейки фильтров без нулевых значений - для сравнения с пересчётом.
+    """
+    statuses = [value for value, _ in UserStatus.READING_STATUS]
+    return {
+        'users': sorted(UserReadingStats.objects.values_list('user_id', 'total', *statuses)),
+        'global': dict(
+            GlobalCounter.objects.exclude(name=CHANGES_HORIZON).exclude(value=0).values_list('name', 'value')
+        ),
+        'books': sorted(BookFacet.objects.exclude(count=0).values_list('genre', 'decade', 'count')),
+        'user_books': sorted(
+            UserFacet.objects.exclude(count=0).values_list('user_id', 'reading_status', 'genre', 'decade', 'count')
+        ),
+    }
+
+
+def recounted_snapshot():
+    """
+    Те же данные после полного пересчёта (reconcile_stats, rebuild_facets).
+    """
+    stats.reconcile()
+    facets.rebuild()
+    return counters_snapshot()
+
+
+@TEST_SETTINGS
+class ProfilePageTests(TestCase):
+    """Число запросов страницы профиля не зависит от числа книг на полках"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret-password')
+
+    def add_statuses(self, count):
+        books = Book.objects.bulk_create(
+            Book(title=f'Книга {number}', author=f'Автор {number}', description='')
+            for number in range(count)
+        )
+        statuses = [value for value, _ in UserStatus.READING_STATUS]
+        UserStatus.objects.bulk_create(
+            UserStatus(user=self.user, book=book, reading_status=statuses[number % len(statuses)])
+            for number, book in enumerate(books)
+        )
+
+    def test_query_count_is_constant(self):
+        for count in (3, 60):
+            with self.subTest(statuses=count):
+                UserStatus.objects.filter(user=self.user).delete()
+                self.add_statuses(count)
+                # Пустые кэши: пользователь читается из базы, сессия - из кэша
+                for cache in caches.all():
+                    cache.clear()
+                self.client.force_login(self.user)
+                # Пользователь и статусы вместе с книгами
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse('profil'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['total_books'], count)
+
+
+@TEST_SETTINGS
+class ReadingStatusTests(TestCase):
+    """Смена статуса со страницы книги"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret-password')
+        self.book = Book.objects.create(title='Книга', author='Автор', description='')
+        self.client.force_login(self.user)
+
+    def post_status(self, reading_status):
+        return self.client.post(f'{reverse("book_detail")}?id={self.book.id}', {'reading_status': reading_status})
+
+    def test_unknown_status_is_rejected(self):
+        response = self.post_status('bogus')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserStatus.objects.filter(user=self.user).exists())
+
+    def test_known_status_is_saved(self):
+        response = self.post_status('reading')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(UserStatus.objects.get(user=self.user, book=self.book).reading_status, 'reading')
+        self.assertEqual(UserReadingStats.objects.get(user=self.user).reading, 1)
+
+    def test_counters_skip_unknown_status(self):
+        status_changed(self.user.id, None, 'bogus')
+        status_changed(self.user.id, 'bogus', 'finished')
+        stats = UserReadingStats.objects.get(user=self.user)
+        self.assertEqual((stats.total, stats.finished), (1, 1))
+
+
+@TEST_SETTINGS
+class SignInTests(TestCase):
+    """Кэш пользователей сессии и ограничение попыток входа"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('reader', password='secret-password')
+
+    def test_cached_user_has_no_password_hash(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('profil'))
+        entry = caches[settings.SESSION_CACHE_ALIAS].get(user_key(self.user.id))
+        self.assertNotIn(self.user.password, repr(entry))
+
+        # Из кэша: без запроса пользователя, сессия проверяется
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profil'))
+        self.assertEqual(response.context['user'], self.user)
+        # Пароль дочитывается из базы
+        with self.assertNumQueries(1):
+            self.assertTrue(response.context['user'].check_password('secret-password'))
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('profil'))
+        self.user.set_password('another-password')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('profil')).status_code, 302)
+
+    def login(self, username, password):
+        return self.client.post(reverse('login'), {'username': username, 'password': password})
+
+    def test_typos_of_one_user_do_not_block_the_address(self):
+        for _ in range(settings.LOGIN_ATTEMPTS_PER_USER):
+            self.login('someone', 'wrong')
+        self.assertEqual(self.login('someone', 'wrong').status_code, 429)
+        User.objects.create_user('neighbour', password='secret-password')
+        self.assertEqual(self.login('neighbour', 'secret-password').status_code, 302)
+
+    def test_many_usernames_block_the_address(self):
+        for number in range(settings.LOGIN_ATTEMPTS_PER_IP):
+            self.login(f'guess{number}', 'wrong')
+        self.assertEqual(self.login('reader', 'secret-password').status_code, 429)
+
+
+@TEST_SETTINGS
+class ShelvesCursorTests(TestCase):
+    """Подгрузка полок каталога по курсору"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        Book.objects.bulk_create(
+            Book(title=f'Книга {number:02}', author='Автор', description='') for number in range(12)
+        )
+
+    def shelves(self, **params):
+        return self.client.get(reverse('catalog_shelves'), params)
+
+    def test_pages_follow_each_other(self):
+        first = self.shelves().json()
+        second = self.shelves(cursor=first['next']).json()
+        titles = [book['title'] for page in (first, second) for shelf in page['shelves'] for book in shelf]
+        self.assertEqual(titles, [f'Книга {number:02}' for number in range(12)])
+        self.assertIsNone(second['next'])
+
+    def test_tampered_cursor_is_rejected(self):
+        tampered = [
+            ['title', ['x', 'abc']],
+            ['title', [1, 1]],
+            ['title', ['x', True]],
+            ['title', ['x', 2 ** 70]],
+            ['id', [None]],
+            ['id', ['1']],
+        ]
+        for value in tampered:
+            cursor = base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+            with self.subTest(cursor=value):
+                self.assertEqual(self.shelves(cursor=cursor, order=value[0]).status_code, 400)
+        self.assertEqual(self.shelves(cursor='не base64').status_code, 400)
+
+
+@TEST_SETTINGS
+class SearchYearTests(TestCase):
+    """Год в поиске учитывается, только если он в допустимых пределах"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        Book.objects.create(title='Старая книга', author='Автор', description='', publication_year=1999)
+        Book.objects.create(title='Новая книга', author='Автор', description='', publication_year=2024)
+
+    def search(self, year):
+        return self.client.get(reverse('book_search'), {'q': 'книга', 'year': year})
+
+    def test_year_filters_results(self):
+        response = self.search('2024')
+        self.assertContains(response, 'Новая книга')
+        self.assertNotContains(response, 'Старая книга')
+
+    def test_out_of_range_year_is_ignored(self):
+        for year in ('999', '2101', '9' * 30, '9' * 5000, '²⁰²⁴'):
+            with self.subTest(year=year[:10]):
+                response = self.search(year)
+                self.assertContains(response, 'Новая книга')
+                self.assertContains(response, 'Старая книга')
+
+
+@TEST_SETTINGS
+class ApiValidatorTests(TestCase):
+    """ETag ответов API по версиям строк"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('reader', password='secret-password')
+        self.book = Book.objects.create(title='Книга', author='Автор', description='')
+        self.client.force_login(self.user)
+
+    def test_etag_follows_row_version(self):
+        url = reverse('api_book', args=[self.book.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.book.title = 'Новое название'
+        self.book.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_shelves_do_not_load_versions_per_row(self):
+        books = Book.objects.bulk_create(
+            Book(title=f'Книга {number}', author='Автор', description='') for number in range(20)
+        )
+        UserStatus.objects.bulk_create(
+            UserStatus(user=self.user, book=book, reading_status='reading') for book in books
+        )
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(self.user)
+        # Пользователь и статусы вместе с книгами
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_shelves'))
+        self.assertEqual(response.json()['counts']['reading'], 20)
+
+
+@TEST_SETTINGS
+class ApiBookIdTests(TestCase):
+    """id книг в API, которых не может быть в базе"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('reader', password='secret-password')
+        self.book = Book.objects.create(title='Книга', author='Автор', description='')
+        self.client.force_login(self.user)
+
+    def post_statuses(self, statuses):
+        return self.client.post(
+            reverse('api_statuses'), json.dumps({'statuses': statuses}), content_type='application/json',
+        )
+
+    def test_huge_book_id_is_not_found(self):
+        response = self.client.get(reverse('api_book', args=[2 ** 70]))
+        self.assertEqual(response.status_code, 404)
+        page = self.client.get(reverse('book_detail'), {'id': 2 ** 70})
+        self.assertRedirects(page, reverse('catalog'), fetch_redirect_response=False)
+
+    def test_bad_book_ids_are_rejected(self):
+        for value in (True, 2 ** 63, -2 ** 63 - 1, '1', 1.0):
+            with self.subTest(book=value):
+                response = self.post_statuses([{'book': value, 'status': 'finished'}])
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserStatus.objects.exists())
+
+        response = self.post_statuses([{'book': self.book.id, 'status': 'finished'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['statuses'][0]['book'], self.book.id)
+
+
+@TEST_SETTINGS
+class BookPageCacheTests(TestCase):
+    """Кэш страницы книги по числовому id"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.book = Book.objects.create(title='Старое название', author='Автор', description='')
+
+    def test_id_spellings_share_the_page_and_its_invalidation(self):
+        url = reverse('book_detail')
+        self.assertContains(self.client.get(f'{url}?id={self.book.id}'), 'Старое название')
+        # Другая запись того же id - страница из кэша
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(f'{url}?id=00{self.book.id}'), 'Старое название')
+
+        self.book.title = 'Новое название'
+        self.book.save()
+        self.assertContains(self.client.get(f'{url}?id=00{self.book.id}'), 'Новое название')
+
+    def test_bad_id_redirects(self):
+        response = self.client.get(f'{reverse("book_detail")}?id=abc')
+        self.assertRedirects(response, reverse('catalog'), fetch_redirect_response=False)
+
+
+class BulkTestCase(TestCase):
+    """Книги разных жанров и десятилетий со статусами нескольких пользователей"""
+
+    def setUp(self):
+        users = [User.objects.create_user(f'reader{number}') for number in range(3)]
+        genres = ['fiction', 'fantasy', 'history']
+        self.books = [
+            Book.objects.create(
+                title=f'Книга {number}', author='Автор', description='',
+                genre=genres[number % 3], publication_year=1950 + number * 7,
+            )
+            for number in range(9)
+        ]
+        statuses = [value for value, _ in UserStatus.READING_STATUS]
+        for number, book in enumerate(self.books):
+            for user in users[:number % 3 + 1]:
+                UserStatus.objects.create(user=user, book=book, reading_status=statuses[(number + user.id) % 5])
+
+
+@TEST_SETTINGS
+class BulkDeleteTests(BulkTestCase):
+    """Массовое удаление мимо сигналов делает ту же работу, что и сигналы"""
+
+    def test_delete_books_keeps_counters_and_log(self):
+        removed = self.books[:4]
+        status_ids = list(UserStatus.objects.filter(book__in=removed).values_list('id', flat=True))
+        self.assertEqual(bulk.delete_books(Book.objects.filter(id__in=[book.id for book in removed])), 4)
+
+        self.assertFalse(UserStatus.objects.filter(id__in=status_ids).exists())
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+        deleted = set(ChangeLog.objects.filter(action=DELETE).values_list('model', 'object_id'))
+        self.assertEqual(
+            deleted,
+            {('book', book.id) for book in removed} | {('userstatus', pk) for pk in status_ids},
+        )
+
+    def test_delete_statuses_keeps_counters(self):
+        self.assertTrue(bulk.delete_statuses(UserStatus.objects.filter(reading_status__in=['reading', 'finished'])))
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+
+
+@TEST_SETTINGS
+class BulkUpdateTests(BulkTestCase):
+    """Массовая смена жанра и статуса (действия админки) делает ту же работу, что и сигналы"""
+
+    def logged(self, model):
+        return set(ChangeLog.objects.filter(model=model, action=UPDATE).values_list('object_id', flat=True))
+
+    def test_set_genre_keeps_facets_and_log(self):
+        fiction = [book.id for book in self.books if book.genre == 'fiction']
+        tags = [book_tag(pk) for pk in fiction]
+        before = tag_versions(tags)
+        versions = dict(Book.objects.values_list('id', 'version'))
+
+        # Фильтр по меняемому полю, как в админке с фильтром по жанру, и пачки меньше выборки
+        with mock.patch.object(bulk, 'CHUNK_SIZE', 2):
+            self.assertEqual(bulk.set_genre(Book.objects.filter(genre='fiction'), 'history'), len(fiction))
+
+        self.assertFalse(Book.objects.filter(genre='fiction').exists())
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+        self.assertEqual(self.logged('book'), set(fiction))
+        for pk, version in Book.objects.filter(id__in=fiction).values_list('id', 'version'):
+            self.assertGreater(version, versions[pk])
+        # Страницы изменённых книг сброшены
+        self.assertTrue(all(old != new for old, new in zip(before, tag_versions(tags))))
+
+    def test_set_genre_skips_books_that_have_it(self):
+        self.assertEqual(bulk.set_genre(Book.objects.filter(genre='fantasy'), 'fantasy'), 0)
+        self.assertEqual(self.logged('book'), set())
+
+    def test_set_status_keeps_counters_and_refreshes_recommendations(self):
+        changed = UserStatus.objects.exclude(reading_status='finished')
+        moved = set(changed.values_list('id', flat=True))
+        weights = recommendations.STATUS_WEIGHTS
+        refreshed = {
+            book_id for book_id, old_status in changed.values_list('book_id', 'reading_status')
+            if weights.get(old_status) != weights['finished']
+        }
+        Task.objects.all().delete()
+
+        with mock.patch.object(bulk, 'CHUNK_SIZE', 3):
+            self.assertEqual(bulk.set_status(UserStatus.objects.all(), 'finished'), len(moved))
+
+        self.assertFalse(UserStatus.objects.exclude(reading_status='finished').exists())
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+        self.assertEqual(self.logged('userstatus'), moved)
+        scheduled = Task.objects.filter(name='recommendations.refresh').values_list('args', flat=True)
+        self.assertEqual({args[0] for args in scheduled}, refreshed)
+
+    def test_admin_actions_use_bulk_updates(self):
+        admin_user = User.objects.create_superuser('admin', password='secret-password')
+        self.client.force_login(admin_user)
+        books = Book.objects.filter(genre='history')
+        response = self.client.post(reverse('admin:catalog_book_changelist'), {
+            'action': 'set_genre_fantasy',
+            '_selected_action': list(books.values_list('id', flat=True)),
+        }, follow=True)
+        self.assertContains(response, 'Жанр изменён у книг: 3')
+
+        response = self.client.post(reverse('admin:catalog_userstatus_changelist'), {
+            'action': 'set_status_abandoned',
+            'select_across': '1',
+            'index': '0',
+            '_selected_action': list(UserStatus.objects.values_list('id', flat=True)[:1]),
+        }, follow=True)
+        self.assertContains(response, 'Статус изменён: ')
+        self.assertFalse(UserStatus.objects.exclude(reading_status='abandoned').exists())
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+
+
+@TEST_SETTINGS
+class ResumeTasksTests(TestCase):
+    """Задачи, оставшиеся в очереди до перезапуска, будят исполнителей при подготовке процесса"""
+
+    def resume(self):
+        with override_settings(TASKS_IN_PROCESS=True), mock.patch.object(tasks, 'wake') as wake:
+            return tasks.resume(), wake
+
+    def test_due_task_wakes_workers_now(self):
+        Task.objects.create(name='recommendations.refresh', args=[1], run_at=timezone.now())
+        count, wake = self.resume()
+        self.assertEqual(count, 1)
+        wake.assert_called_once_with(0)
+
+    def test_delayed_task_sets_a_timer(self):
+        Task.objects.create(name='recommendations.refresh', args=[1], run_at=timezone.now() + timedelta(seconds=60))
+        _, wake = self.resume()
+        self.assertAlmostEqual(wake.call_args.args[0], 60, delta=5)
+
+    def test_empty_queue(self):
+        count, wake = self.resume()
+        self.assertEqual(count, 0)
+        wake.assert_not_called()
+
+
+@TEST_SETTINGS
+class CountersMatchRecountTests(TestCase):
+    """Сигналы поддерживают счётчики и ячейки фильтров такими же, как полный пересчёт"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'reader{number}') for number in range(2)]
+        self.books = [
+            Book.objects.create(
+                title=f'Книга {number}', author='Автор', description='', genre=genre, publication_year=year,
+            )
+            for number, (genre, year) in enumerate([('fiction', 1965), ('fantasy', 1994), ('history', None)])
+        ]
+
+    def test_status_changes(self):
+        first, second = self.users
+        UserStatus.objects.create(user=first, book=self.books[0], reading_status='reading')
+        UserStatus.objects.create(user=first, book=self.books[1], reading_status='planned')
+        UserStatus.objects.create(user=second, book=self.books[0], reading_status='finished')
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+
+        # Смена статуса со страницы книги и через API
+        self.client.force_login(first)
+        response = self.client.post(
+            f'{reverse("book_detail")}?id={self.books[0].id}', {'reading_status': 'finished'},
+        )
+        self.assertEqual(response.status_code, 302)
+        updates = [{'book': self.books[1].id, 'status': None}, {'book': self.books[2].id, 'status': 'abandoned'}]
+        response = self.client.post(reverse('api_statuses'), {'statuses': updates}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        snapshot = counters_snapshot()
+        self.assertEqual(snapshot['global']['status:finished'], 2)
+        self.assertEqual(snapshot, recounted_snapshot())
+
+    def test_book_changes(self):
+        for user in self.users:
+            for book in self.books:
+                UserStatus.objects.create(user=user, book=book, reading_status='reading')
+        book = self.books[0]
+        book.genre, book.publication_year = 'science', 2001
+        book.save()
+        self.books[1].delete()
+        self.users[1].delete()
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+
+
+
+@TEST_SETTINGS
+class ChangesFeedTests(TestCase):
+    """Выдача изменений /api/v1/changes/"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret-password')
+        self.books = [
+            Book.objects.create(title=f'Книга {number}', author='Автор', description='') for number in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def changes(self, since, **params):
+        response = self.client.get(reverse('api_changes'), {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_each_row_once_in_version_order(self):
+        since = self.changes(0)['next']
+        first, second, third = self.books
+        for book, title in [(first, 'A'), (second, 'B'), (first, 'C'), (third, 'D'), (first, 'E')]:
+            book.title = title
+            book.save()
+        status = UserStatus.objects.create(user=self.user, book=second, reading_status='planned')
+        status.reading_status = 'reading'
+        status.save()
+
+        feed = self.changes(since)
+        ids = [book['id'] for book in feed['books']]
+        self.assertEqual(ids, [second.id, third.id, first.id])
+        self.assertEqual(feed['books'][-1]['title'], 'E')
+        versions = dict(Book.objects.values_list('id', 'version'))
+        self.assertEqual([versions[pk] for pk in ids], sorted(versions[pk] for pk in ids))
+        self.assertEqual([item['id'] for item in feed['statuses']], [status.id])
+        self.assertEqual(feed['statuses'][0]['status'], 'reading')
+        self.assertGreater(feed['next'], since)
+        self.assertEqual(self.changes(feed['next'])['books'], [])
+
+    def test_pages_advance_the_cursor(self):
+        since = self.changes(0)['next']
+        for book in self.books:
+            book.title += ' (2-е издание)'
+            book.save()
+        seen = []
+        while True:
+            feed = self.changes(since, limit=2)
+            self.assertGreater(feed['next'], since)
+            since = feed['next']
+            seen += [book['id'] for book in feed['books']]
+            if not feed['more']:
+                break
+        self.assertEqual(seen, [book.id for book in self.books])
+
+
+@TEST_SETTINGS
+class RecommendationsRefreshTests(TestCase):
+    """Пересчёт одной книги после смены статуса даёт тех же соседей, что и полный пересчёт"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'reader{number}') for number in range(6)]
+        self.books = [
+            Book.objects.create(title=f'Книга {number}', author='Автор', description='') for number in range(8)
+        ]
+        statuses = ['finished', 'reading', 'planned', 'abandoned']
+        for number, user in enumerate(self.users):
+            for shift in range(4):
+                book = self.books[(number + shift * 2) % len(self.books)]
+                UserStatus.objects.create(user=user, book=book, reading_status=statuses[(number + shift) % 4])
+        recommendations.rebuild()
+        Task.objects.all().delete()
+        self.initial = self.neighbors()
+
+    def neighbors(self):
+        return sorted(
+            (book_id, neighbor_id, round(score, 4))
+            for book_id, neighbor_id, score in BookNeighbor.objects.values_list('book_id', 'neighbor_id', 'score')
+        )
+
+    def assertMatchesRebuild(self):
+        tasks.run_pending()
+        refreshed = self.neighbors()
+        self.assertNotEqual(refreshed, self.initial)
+        recommendations.rebuild()
+        self.assertEqual(refreshed, self.neighbors())
+
+    def test_status_change(self):
+        status = UserStatus.objects.filter(reading_status='abandoned').first()
+        status.reading_status = 'finished'
+        status.save()
+        self.assertTrue(Task.objects.filter(name='recommendations.refresh').exists())
+        self.assertMatchesRebuild()
+
+    def test_new_and_deleted_statuses(self):
+        UserStatus.objects.create(user=self.users[0], book=self.books[7], reading_status='finished')
+        UserStatus.objects.filter(user=self.users[1], reading_status='finished').delete()
+        self.assertMatchesRebuild()
+
+
+@TEST_SETTINGS
+class BookCacheTests(TestCase):
+    """Строки книг в памяти процесса: вытеснение, срок жизни и версии тегов"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.books = Book.objects.bulk_create(
+            Book(title=f'Книга {number}', author='Автор', description='') for number in range(3)
+        )
+        self.ids = [book.id for book in self.books]
+        patcher = mock.patch.object(loaders, 'book_cache', BookCache(2))
+        self.book_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_least_recently_used_row_is_evicted(self):
+        first, second, third = self.ids
+        get_books([first, second])
+        get_books([first])
+        get_books([third])
+        with self.assertNumQueries(0):
+            self.assertEqual(set(get_books([first, third])), {first, third})
+        with self.assertNumQueries(1):
+            get_books([second])
+        stats = self.book_cache.stats()
+        self.assertEqual((stats['evicted'], stats['size']), (2, 2))
+
+    @override_settings(BOOK_CACHE_TIMEOUT=60)
+    def test_row_expires_after_timeout(self):
+        with mock.patch.object(loaders.time, 'monotonic', return_value=1000.0):
+            get_books(self.ids[:1])
+        with mock.patch.object(loaders.time, 'monotonic', return_value=1059.0), self.assertNumQueries(0):
+            get_books(self.ids[:1])
+        with mock.patch.object(loaders.time, 'monotonic', return_value=1061.0), self.assertNumQueries(1):
+            get_books(self.ids[:1])
+        self.assertEqual(self.book_cache.stats()['stale'], 1)
+
+    def test_tag_bump_reloads_row(self):
+        pk = self.ids[0]
+        get_books([pk])
+        # Без сигналов тег не меняется - строка остаётся прежней
+        Book.objects.filter(pk=pk).update(title='Новое название')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_books([pk])[pk].title, 'Книга 0')
+
+        invalidate(book_tag(pk))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_books([pk])[pk].title, 'Новое название')
+
+        book = get_books([pk])[pk]
+        book.title = 'После сохранения'
+        book.save()
+        self.assertEqual(get_books([pk])[pk].title, 'После сохранения')
+
+    def test_each_call_gets_its_own_objects(self):
+        pk = self.ids[0]
+        get_books([pk])[pk].title = 'Изменено в запросе'
+        self.assertEqual(get_books([pk])[pk].title, 'Книга 0')
+
+
+@TEST_SETTINGS
+class LoaderTests(TestCase):
+    """Карта объектов одного запроса"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('reader', password='secret-password')
+        self.books = Book.objects.bulk_create(
+            Book(title=f'Книга {number}', author='Автор', description='') for number in range(4)
+        )
+        patcher = mock.patch.object(loaders, 'book_cache', BookCache(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_wanted_books_load_with_the_first_one(self):
+        loader = Loader(self.user)
+        first, *others = [book.id for book in self.books]
+        loader.want_books([*others, 'abc'])
+        with self.assertNumQueries(1):
+            self.assertEqual(loader.book(str(first)).id, first)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(loader.books(others)), others)
+            self.assertIs(loader.book(others[0]), loader.book(str(others[0])))
+        # Ненайденная книга тоже запоминается
+        self.assertIsNone(loader.book(0))
+        with self.assertNumQueries(0):
+            self.assertIsNone(loader.book(0))
+
+    def test_status_uses_the_loaded_book(self):
+        book = self.books[0]
+        UserStatus.objects.create(user=self.user, book=book, reading_status='reading')
+        loader = Loader(self.user)
+        # Книга и статус, дальше - из карты запроса
+        with self.assertNumQueries(2):
+            status = loader.status(book.id)
+        self.assertIsNone(loader.status(self.books[1].id))
+        with self.assertNumQueries(0):
+            self.assertIs(status.book, loader.book(book.id))
+            self.assertEqual(loader.statuses([book.id, self.books[1].id]), {book.id: status})
+
+    def test_book_page_loads_recommendations_with_the_book(self):
+        book, *similar = self.books
+        BookNeighbor.objects.bulk_create(
+            BookNeighbor(book=book, neighbor=other, score=score) for other, score in zip(similar, (0.2, 0.9, 0.5))
+        )
+        # Соседи по индексу и одним запросом все книги страницы
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('book_detail'), {'id': book.id})
+        titles = [similar.title for similar in response.context['recommendations']]
+        self.assertEqual(titles, ['Книга 2', 'Книга 3', 'Книга 1'])
+
+
+@TEST_SETTINGS
+class ImportExportTests(TestCase):
+    """Выгрузка и загрузка каталога файлами CSV и JSON Lines"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        Book.objects.create(
+            title='Мастер и Маргарита', author='Булгаков', publication_year=1967,
+            genre='fiction', description='Роман, "с кавычками"\nи переносом строки',
+        )
+        Book.objects.create(title='Без года', author='Автор', description='')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def catalog(self):
+        return sorted(Book.objects.values_list(*bulk.FIELDS))
+
+    def test_round_trip(self):
+        books = self.catalog()
+        for name in ('books.csv', 'books.jsonl'):
+            with self.subTest(file=name):
+                path = os.path.join(self.directory, name)
+                call_command('export_books', path, stdout=io.StringIO())
+                Book.objects.all().delete()
+
+                call_command('import_books', path, stdout=io.StringIO())
+                self.assertEqual(self.catalog(), books)
+                # Повторная загрузка того же файла ничего не добавляет
+                output = io.StringIO()
+                call_command('import_books', path, stdout=output)
+                self.assertIn('Добавлено книг: 0, дубликатов: 2, с ошибками: 0', output.getvalue())
+        self.assertEqual(counters_snapshot(), recounted_snapshot())
+
+    def test_export_to_stdout(self):
+        # Данные идут прямо в sys.stdout, отчёт - в stderr
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as output:
+            call_command('export_books', '-', format='jsonl', stderr=io.StringIO())
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Мастер и Маргарита', 'Без года'])
+        self.assertIsNone(rows[1]['publication_year'])
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        lines = [
+            json.dumps({'title': 'Новая книга', 'author': 'Автор', 'publication_year': 2001}),
+            '{не json',
+            json.dumps({'title': 'Из будущего', 'publication_year': 3000}),
+            json.dumps(['не', 'объект']),
+        ]
+        errors = []
+        result = bulk.import_books(
+            bulk.read_rows(lines, 'jsonl'), on_error=lambda line, error: errors.append(line),
+        )
+        self.assertEqual(result, {'created': 1, 'duplicates': 0, 'invalid': 3})
+        self.assertEqual(errors, [2, 3, 4])
+        self.assertTrue(Book.objects.filter(title='Новая книга', publication_year=2001).exists())
+
+    def test_rows_are_read_while_importing(self):
+        consumed = []
+
+        def lines():
+            for number in range(10):
+                consumed.append(number)
+                yield json.dumps({'title': f'Книга {number}', 'author': 'Автор'})
+
+        # Каждая пачка сохраняется, как только набрана: файл не читается целиком заранее
+        seen = []
+        bulk.import_books(
+            bulk.read_rows(lines(), 'jsonl'), batch_size=4, on_batch=lambda result: seen.append(len(consumed)),
+        )
+        self.assertEqual(seen, [4, 8, 10])
+        self.assertEqual(Book.objects.count(), 12)
+
+
+@TEST_SETTINGS
+class RequestMetricsTests(TestCase):
+    """Замеры запросов по представлениям и их выдача на /metrics/"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.book = Book.objects.create(title='Книга', author='Автор', description='')
+        self.staff = User.objects.create_user('admin', password='secret-password', is_staff=True)
+
+    def metrics(self):
+        """Строки /metrics/ без комментариев: {имя с метками: значение}"""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.client.logout()
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_are_counted_per_view_and_status(self):
+        url = reverse('book_detail')
+        # Соседи книги и строки книг; повтор - из кэша страниц
+        with self.assertNumQueries(2):
+            self.client.get(url, {'id': self.book.id})
+        self.client.get(url, {'id': self.book.id})
+        self.client.get(url, {'id': 'abc'})
+
+        samples = self.metrics()
+        self.assertEqual(samples['napolku_requests_total{view="book_detail",status="200"}'], 2)
+        self.assertEqual(samples['napolku_requests_total{view="book_detail",status="302"}'], 1)
+        self.assertEqual(samples['napolku_request_seconds_count{view="book_detail"}'], 3)
+        self.assertEqual(samples['napolku_request_seconds_bucket{view="book_detail",le="+Inf"}'], 3)
+        self.assertEqual(samples['napolku_db_queries_sum{view="book_detail"}'], 2)
+        self.assertGreater(samples['napolku_template_seconds_sum{view="book_detail"}'], 0)
+        self.assertGreater(samples['napolku_response_bytes_sum{view="book_detail"}'], 0)
+
+    def test_metrics_are_for_staff_only(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(User.objects.create_user('reader', password='secret-password'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs('catalog.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('book_detail'), {'id': self.book.id})
+        self.assertIn('(book_detail)', logs.output[0])
+        self.assertIn('catalog_book', logs.output[0])
+        with self.assertLogs('catalog.slow_requests', 'WARNING'):
+            samples = self.metrics()
+        self.assertEqual(samples['napolku_slow_requests_total{view="book_detail"}'], 1)
+
+    def test_duplicate_queries_ignore_parameters(self):
+        queries = [('SELECT a WHERE id = %s', 0.1), ('SELECT a WHERE id = %s', 0.2), ('SELECT b', 0.0)]
+        self.assertEqual(duplicate_queries(queries), (1, {'SELECT a WHERE id = %s': 2}))
+
+
+@TEST_SETTINGS
+class StaticAssetsTests(TestCase):
+    """Статика после collectstatic: имена с хешем и заранее сжатые копии"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        static = override_settings(
+            STATIC_ROOT=directory.name,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'catalog.assets.CompressedManifestStorage'}},
+        )
+        static.enable()
+        cls.addClassCleanup(static.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.root = directory.name
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_collected_files_are_hashed_and_compressed(self):
+        name = staticfiles_storage.stored_name('css/base.css')
+        self.assertRegex(name, r'^css/base\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.root, name)
+        with open(path, 'rb') as original, open(path + '.gz', 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), original.read())
+        # Шрифты уже сжаты - копий нет
+        font = staticfiles_storage.stored_name('vendor/bootstrap-icons/fonts/bootstrap-icons.woff2')
+        self.assertFalse(os.path.exists(os.path.join(self.root, font + '.gz')))
+
+    def test_pages_link_hashed_names(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, staticfiles_storage.url('css/base.css'))
+
+    def test_hashed_file_is_served_compressed_and_immutable(self):
+        url = staticfiles_storage.url('css/base.css')
+        with open(os.path.join(self.root, staticfiles_storage.stored_name('css/base.css')), 'rb') as file:
+            content = file.read()
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), content)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_and_missing_files(self):
+        response = self.client.get('/static/css/base.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, must-revalidate')
+        response.close()
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../settings/settings.py').status_code, 404)
+
+
+# Страницы, у которых есть асинхронный вариант: имя URL -> имя представления
+PAGES = {
+    'home': 'home',
+    'catalog': 'book_list',
+    'catalog_no_slash': 'book_list',
+    'book_detail': 'book_detail',
+    'profil': 'my_books',
+}
+
+
+@contextlib.contextmanager
+def pages_from(module):
+    """Подставляет в catalog.urls страницы из views или async_views"""
+    with contextlib.ExitStack() as stack:
+        for pattern in urls.urlpatterns:
+            if pattern.name in PAGES:
+                stack.enter_context(mock.patch.object(pattern, 'callback', getattr(module, PAGES[pattern.name])))
+        yield
+
+
+@TEST_SETTINGS
+class AsyncPagesTests(TestCase):
+    """Асинхронные страницы отдают то же, что синхронные"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret-password')
+        books = Book.objects.bulk_create(
+            Book(title=f'Книга {number}', author='Автор', description='', genre='fiction', publication_year=2001)
+            for number in range(5)
+        )
+        self.book = books[0]
+        UserStatus.objects.bulk_create([
+            UserStatus(user=self.user, book=books[0], reading_status='reading'),
+            UserStatus(user=self.user, book=books[1], reading_status='finished'),
+        ])
+        BookNeighbor.objects.bulk_create(
+            BookNeighbor(book=self.book, neighbor=other, score=0.5) for other in books[1:]
+        )
+
+    def fetch(self, module, url, params, user):
+        """
+        Ответ страницы новым клиентом и без кэша: сообщения прошлых запросов
+        не попадают на страницу, а токен CSRF в формах каждый раз новый.
+        """
+        for cache in caches.all():
+            cache.clear()
+        client = Client()
+        if user:
+            client.force_login(user)
+        with pages_from(module):
+            response = client.get(url, params)
+        content = re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', response.content.decode())
+        return response.status_code, response.get('Location'), content
+
+    def test_pages_match(self):
+        requests = [
+            (reverse('home'), {}),
+            (reverse('catalog'), {}),
+            (reverse('catalog'), {'genre': 'fiction', 'decade': 2000}),
+            (reverse('catalog_no_slash'), {}),
+            (reverse('book_detail'), {'id': self.book.id}),
+            (reverse('book_detail'), {'id': 'abc'}),
+            (reverse('profil'), {}),
+        ]
+        for user in (None, self.user):
+            for url, params in requests:
+                with self.subTest(url=url, params=params, user=user):
+                    self.assertEqual(
+                        self.fetch(async_views, url, params, user), self.fetch(views, url, params, user),
+                    )
+        # Сравниваются заполненные страницы: книга со статусом и рекомендациями
+        status, _, content = self.fetch(async_views, reverse('book_detail'), {'id': self.book.id}, self.user)
+        self.assertEqual(status, 200)
+        self.assertIn('Книга 4', content)
+
+    def test_async_views_are_used(self):
+        with pages_from(async_views):
+            response = self.client.get(reverse('home'))
+        self.assertTrue(asyncio.iscoroutinefunction(response.resolver_match.func))
+
+
+@TEST_SETTINGS
+class ReadyTests(TestCase):
+    """Подготовка процесса и /ready/"""
+
+    def setUp(self):
+        state = mock.patch.dict(warmup._state, ready=False, running=False, steps={}, templates=0, error=None)
+        state.start()
+        self.addCleanup(state.stop)
+        # Соединения теста закрывать нельзя: в них транзакция TestCase
+        close_all = mock.patch.object(warmup.connections, 'close_all')
+        close_all.start()
+        self.addCleanup(close_all.stop)
+
+    def test_first_check_starts_warm_up(self):
+        with mock.patch.object(warmup.threading, 'Thread') as thread:
+            response = self.client.get(reverse('ready'))
+            # Пока подготовка идёт, повторная проверка её не запускает
+            self.client.get(reverse('ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('no-store', response['Cache-Control'])
+        thread.assert_called_once_with(target=warmup.warm_up, name='warmup', daemon=True)
+        thread.return_value.start.assert_called_once_with()
+
+    def test_ready_after_warm_up(self):
+        state = warmup.warm_up()
+        self.assertTrue(state['ready'])
+        self.assertEqual(list(state['steps']), ['urls', 'templates', 'database', 'tasks'])
+        self.assertGreater(state['templates'], 0)
+
+        response = self.client.get(reverse('ready'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['steps'], state['steps'])
+
+    def test_failed_step_keeps_process_not_ready(self):
+        with mock.patch.object(warmup, 'check_databases', side_effect=OperationalError('unable to open database')):
+            with self.assertLogs('catalog.warmup', 'ERROR'):
+                state = warmup.warm_up()
+        self.assertFalse(state['ready'])
+        self.assertEqual(list(state['steps']), ['urls', 'templates'])
+
+        with mock.patch.object(warmup, 'start'):
+            response = self.client.get(reverse('ready'))
+        self.assertEqual(response.status_code, 503)
+        # Без подробностей ошибки: /ready/ доступна без входа
+        self.assertEqual(response.json()['error'], 'OperationalError')
+        self.assertNotIn('unable to open', response.content.decode())
+
+
+class AuditImportsTests(TestCase):
+    """Команда audit_imports"""
+
+    def manage(self, *args):
+        return subprocess.run(
+            [sys.executable, 'manage.py', 'audit_imports', *args],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+
+    def test_exit_codes(self):
+        result = self.manage('--module', 'json', '--threshold', '0', '--limit', '3')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('Импорт json:', result.stdout)
+        self.assertIn('импортирован из', result.stdout)
+
+        result = self.manage('--module', 'catalog.no_such_module')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('Импорт catalog.no_such_module не удался', result.stderr)
+        self.assertIn('ModuleNotFoundError', result.stderr)
+
+    def test_import_error_raises_command_error(self):
+        with self.assertRaises(CommandError):
+            call_command('audit_imports', module='catalog.no_such_module', stdout=io.StringIO())
+
+    def test_parse_finds_parents(self):
+        output = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       290 |        290 |       _json',
+            'import time:       703 |        992 |     json.scanner',
+            'import time:       657 |       1649 |   json.decoder',
+            'import time:       373 |       2022 | json',
+        ])
+        modules = {item['name']: item for item in audit_imports.parse(output)}
+        self.assertEqual(modules['_json']['parent'], 'json.scanner')
+        self.assertEqual(modules['json.decoder']['parent'], 'json')
+        self.assertIsNone(modules['json']['parent'])
+        self.assertEqual((modules['json']['self'], modules['json']['cumulative']), (0.373, 2.022))
@@ -1,15 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from catalog import views
+from catalog import api, async_views, views
+
+# Страницы только для чтения под ASGI-сервером работают асинхронно
+pages = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('catalog/', views.book_list, name='catalog'),
-    path('catalog', views.book_list, name='catalog_no_slash'),
+    path('', pages.home, name='home'),
+    path('catalog/', pages.book_list, name='catalog'),
+    path('catalog', pages.book_list, name='catalog_no_slash'),
+    path('catalog/shelves/', views.book_shelves, name='catalog_shelves'),
+    path('catalog/search/', views.book_search, name='book_search'),
     path('catalog/new/', views.book_create, name='book_create'),
-    path('catalog/book/', views.book_detail, name='book_detail'),
+    path('catalog/book/', pages.book_detail, name='book_detail'),
     path('catalog/edit/', views.book_edit, name='book_edit'),
-    path('profil/', views.my_books, name='profil'),
+    path('profil/', pages.my_books, name='profil'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('ready/', views.ready, name='ready'),
+    # JSON API для мобильного клиента
+    path('api/v1/books/', api.book_list, name='api_books'),
+    path('api/v1/books/<int:book_id>/', api.book_detail, name='api_book'),
+    path('api/v1/me/shelves/', api.my_shelves, name='api_shelves'),
+    path('api/v1/me/statuses/', api.update_statuses, name='api_statuses'),
+    path('api/v1/changes/', api.changes, name='api_changes'),
 ]
\ No newline at end of file
@@ -1,37 +1,66 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.db.models import F
 from django.contrib import messages
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.http import urlencode
+from django.views.decorators.cache import never_cache
+from . import warmup
+from .auth import login_blocked, login_failed, login_succeeded
+from .cache import (
+    CATALOG, COUNTERS, RECOMMENDATIONS, book_tag, cache_page_by_tags, get_stats,
+    recommendations_tag, shelf_tag, status_tag,
+)
+from .db import read_only_view, serialized_write
+from .facets import UNKNOWN_DECADE, facet_counts
+from .loaders import book_cache, book_id, get_loader
+from .metrics import registry
 from .models import Book, UserStatus
+from .pagination import InvalidCursor, get_page, split_into_shelves
+from .recommendations import recommended_ids
+from .renditions import cover_url, schedule_cleanup, schedule_cover_delete, schedule_renditions
+from .search import search_books
+from .stats import get_counters
 
 
-def home(request):
-    """Главная страница со списком пользователей"""
-    # Аннотируем пользователей с подсчетом книг по статусам
-    users = User.objects.annotate(
-        book_count=Count('book_statuses'),
-        reading_count=Count('book_statuses', filter=Q(book_statuses__reading_status='reading')),
-        finished_count=Count('book_statuses', filter=Q(book_statuses__reading_status='finished'))
-    )
+# Сколько пользователей показываем на главной странице
+HOME_USERS_LIMIT = 100
 
-    # Простая статистика
-    total_books = Book.objects.count()
-    total_users = users.count()
+# Сколько "не начатых" книг показываем в профиле
+NOT_STARTED_LIMIT = 5
 
-    # Общая статистика по статусам
-    reading_now = UserStatus.objects.filter(reading_status='reading').count()
-    finished_books = UserStatus.objects.filter(reading_status='finished').count()
+# Сколько похожих книг показываем на странице книги
+RECOMMENDATIONS_LIMIT = 6
 
-    context = {
+
+def home_users():
+    """Пользователи для главной страницы"""
+    # Счётчики пользователей берём из заранее посчитанной таблицы
+    return User.objects.annotate(
+        book_count=F('reading_stats__total'),
+        reading_count=F('reading_stats__reading'),
+        finished_count=F('reading_stats__finished'),
+    ).order_by('id')[:HOME_USERS_LIMIT]
+
+
+def home_context(users, counters):
+    return {
         'users': users,
-        'total_books': total_books,
-        'total_users': total_users,
-        'reading_now': reading_now,
-        'finished_books': finished_books,
+        'total_books': counters['books'],
+        'total_users': counters['users'],
+        'reading_now': counters['statuses']['reading'],
+        'finished_books': counters['statuses']['finished'],
     }
-    return render(request, 'main_page.html', context)
+
+
+@read_only_view
+@cache_page_by_tags(lambda request: [COUNTERS], per_user=True)
+def home(request):
+    """Главная страница со списком пользователей"""
+    # Общая статистика - один запрос к таблице счётчиков
+    return render(request, 'main_page.html', home_context(home_users(), get_counters()))
 
 
 def register_view(request):
@@ -48,13 +77,12 @@ def register_view(request):
             messages.error(request, 'Пользователь с таким именем уже существует')
             return render(request, 'register.html')
 
-        # Создаем пользователя
-        user = User.objects.create_user(
-            username=username,
-            password=password
-        )
+        # Создаем пользователя. Пароль хешируется до записи, чтобы не держать очередь записи
+        user = User(username=User.normalize_username(username))
+        user.set_password(password)
+        serialized_write(user.save)()
 
-        login(request, user)
+        serialized_write(login)(request, user)
         messages.success(request, f'Добро пожаловать, {username}!')
         return redirect('home')
 
@@ -67,13 +95,20 @@ def login_view(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
+        # Перебор паролей отсекаем до хеширования
+        if login_blocked(request, username):
+            messages.error(request, 'Слишком много попыток входа. Попробуйте позже')
+            return render(request, 'login.html', status=429)
+
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
-            login(request, user)
+            login_succeeded(request, username)
+            serialized_write(login)(request, user)
             messages.success(request, f'Добро пожаловать, {username}!')
             return redirect('home')
         else:
+            login_failed(request, username)
             messages.error(request, 'Неверное имя пользователя или пароль')
 
     return render(request, 'login.html')
@@ -86,24 +121,232 @@ def logout_view(request):
     return redirect('home')
 
 
+def _catalog_tags(request):
+    """Теги каталога: книги и, у вошедших, их статусы (фильтр и количества "мои книги")"""
+    tags = [CATALOG]
+    if request.user.is_authenticated:
+        tags.append(shelf_tag(request.user.pk))
+    return tags
+
+
+@read_only_view
+@cache_page_by_tags(_catalog_tags, per_user=True)
 def book_list(request):
-    """Список всех книг (все пользователи видят все книги)"""
+    """Список всех книг (все пользователи видят все книги) с фильтрами"""
+    filters = browse_filters(request)
+    # Первая страница полок, остальные подгружаются через book_shelves
+    books, next_cursor = get_page(filtered_books(request.user, filters))
+    counts = facet_counts(request.user, **filters)
+    return render(request, 'catalog.html', catalog_context(books, next_cursor, filters, counts))
+
+
+def browse_filters(request):
+    """
+    Фильтры каталога из GET: ?genre=&decade=&status=.
+    Неизвестные значения просто не учитываем (как в поиске).
+    """
+    filters = {}
+    genre = request.GET.get('genre', '')
+    if genre in Book.GENRE_LABELS:
+        filters['genre'] = genre
+    decade = request.GET.get('decade', '')
+    if decade.isdigit() and int(decade) % 10 == 0:
+        filters['decade'] = int(decade)
+    status = request.GET.get('status', '')
+    if request.user.is_authenticated and status in UserStatus.READING_STATUS_LABELS:
+        filters['status'] = status
+    return filters
+
+
+def filtered_books(user, filters):
+    """Книги под фильтрами; у каждой комбинации свой индекс в порядке названий"""
     books = Book.objects.all()
-    return render(request, 'catalog.html', {'books': books})
+    if 'genre' in filters:
+        books = books.filter(genre=filters['genre'])
+    if 'decade' in filters:
+        books = books.filter(decade=filters['decade'])
+    if 'status' in filters:
+        books = books.filter(user_statuses__user=user, user_statuses__reading_status=filters['status'])
+    return books
+
+
+def decade_label(decade):
+    if decade == UNKNOWN_DECADE:
+        return 'Год не указан'
+    return f'{decade}-е'
+
+
+def catalog_facets(filters, counts):
+    """
+    Группы вариантов фильтров со ссылками и количествами книг.
+    Варианты без книг не показываем, кроме выбранного.
+    """
+    def link(name, value):
+        params = {**filters, name: value}
+        if value is None:
+            del params[name]
+        return '?' + urlencode(params) if params else '?'
+
+    groups = [
+        ('genre', 'Жанр', Book.GENRE_CHOICES),
+        ('decade', 'Десятилетие', [
+            (decade, decade_label(decade))
+            for decade in sorted(counts['decade'], key=lambda decade: (decade == UNKNOWN_DECADE, -decade))
+        ]),
+    ]
+    if 'status' in counts:
+        groups.append(('status', 'Мои книги', UserStatus.READING_STATUS))
+
+    facets = []
+    for name, title, choices in groups:
+        options = [
+            {
+                'label': label,
+                'count': counts[name].get(value, 0),
+                'url': link(name, value),
+                'active': filters.get(name) == value,
+            }
+            for value, label in choices
+            if counts[name].get(value) or filters.get(name) == value
+        ]
+        facets.append({
+            'title': title,
+            'options': options,
+            'reset_url': link(name, None),
+            'active': name in filters,
+        })
+    return facets
+
+
+def catalog_context(books, next_cursor, filters=None, counts=None):
+    context = {
+        'shelves': split_into_shelves(books),
+        'next_cursor': next_cursor,
+        'genres': Book.GENRE_CHOICES,
+    }
+    if counts is not None:
+        context.update({
+            'filters': filters,
+            'facets': catalog_facets(filters, counts),
+            'found': counts['total'],
+            # Подгрузка следующих полок идёт с теми же фильтрами
+            'shelves_query': urlencode(filters),
+        })
+    return context
+
+
+@read_only_view
+def book_shelves(request):
+    """Следующая порция полок каталога в JSON (для подгрузки при прокрутке)"""
+    ordering = request.GET.get('order', 'title')
+
+    try:
+        books, next_cursor = get_page(
+            filtered_books(request.user, browse_filters(request)),
+            cursor=request.GET.get('cursor'),
+            ordering=ordering,
+        )
+    except InvalidCursor as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    shelves = [
+        [
+            {
+                'id': book.id,
+                'title': book.title,
+                'author': book.author,
+                'publication_year': book.publication_year,
+                'cover_url': cover_url(book, 'shelf') or None,
+            }
+            for book in shelf['books']
+        ]
+        for shelf in split_into_shelves(books)
+    ]
+    return JsonResponse({'shelves': shelves, 'next': next_cursor})
+
+
+@user_passes_test(lambda user: user.is_staff)
+def cache_stats(request):
+    """Статистика кэша страниц по представлениям и кэша книг в памяти процесса (для сотрудников)"""
+    return JsonResponse({'views': get_stats(), 'books': book_cache.stats()})
+
+
+@user_passes_test(lambda user: user.is_staff)
+def metrics(request):
+    """Метрики запросов в формате Prometheus (для сотрудников)"""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@never_cache
+def ready(request):
+    """Готовность процесса: 200, когда шаблоны и URL подготовлены, а базы доступны, иначе 503"""
+    # Если подготовку не запустили при старте, её запускает первая проверка
+    warmup.start()
+    state = warmup.status()
+    return JsonResponse(state, status=200 if state['ready'] else 503)
+
+
+@read_only_view
+def book_search(request):
+    """Поиск книг по названию, автору и описанию"""
+    query = request.GET.get('q', '').strip()
+    genre = request.GET.get('genre', '')
+    year = request.GET.get('year', '')
+
+    # Неизвестные жанры и некорректный год (в том числе вне допустимых) просто не учитываем
+    if genre not in Book.GENRE_LABELS:
+        genre = ''
+    if not (len(year) == 4 and year.isascii() and year.isdigit() and Book.MIN_YEAR <= int(year) <= Book.MAX_YEAR):
+        year = ''
+
+    books = search_books(query, genre=genre or None, year=int(year) if year else None)
+
+    context = {
+        'shelves': split_into_shelves(books),
+        'query': query,
+        'genre': genre,
+        'year': year,
+        'genres': Book.GENRE_CHOICES,
+    }
+    return render(request, 'catalog.html', context)
+
+
+def _book_detail_tags(request):
+    """Теги страницы книги: сама книга, её рекомендации и статус текущего пользователя"""
+    # Теги от числа: ?id=007 - та же книга 7, и её правка должна сбросить и эту страницу
+    pk = book_id(request.GET.get('id'))
+    if pk is None:
+        # Такой адрес перенаправляет в каталог, ответ не кэшируется
+        return []
+    tags = [book_tag(pk), recommendations_tag(pk), RECOMMENDATIONS]
+    if request.user.is_authenticated:
+        tags.append(status_tag(request.user.pk, pk))
+    return tags
+
 
+def _book_detail_path(request):
+    """Адрес страницы книги для ключа кэша: только числовой id"""
+    return f'{request.path}?id={book_id(request.GET.get("id"))}'
 
+
+@read_only_view
+@cache_page_by_tags(_book_detail_tags, per_user=True, csrf=True, messages=True, path=_book_detail_path)
 def book_detail(request):
     """Детальная информация о книге"""
     # Получаем ID книги из GET-параметра (так работает ваш шаблон)
-    book_id = request.GET.get('id')
+    pk = book_id(request.GET.get('id'))
 
-    if not book_id:
+    if pk is None:
         messages.error(request, 'Книга не найдена')
         return redirect('catalog')
 
-    try:
-        book = Book.objects.get(id=book_id)
-    except Book.DoesNotExist:
+    # Книга и рекомендации из памяти процесса, если они не менялись (catalog.loaders):
+    # рекомендации заявлены заранее и загружаются вместе с книгой
+    loader = get_loader(request)
+    recommended = list(recommended_ids(pk, RECOMMENDATIONS_LIMIT))
+    loader.want_books(recommended)
+    book = loader.book(pk)
+    if book is None:
         messages.error(request, 'Книга не найдена')
         return redirect('catalog')
 
@@ -112,34 +355,63 @@ def book_detail(request):
             # Обновление статуса
             reading_status = request.POST.get('reading_status')
             if reading_status:
-                status, created = UserStatus.objects.update_or_create(
-                    user=request.user,
-                    book=book,
-                    defaults={'reading_status': reading_status}
-                )
+                if reading_status not in UserStatus.READING_STATUS_LABELS:
+                    return HttpResponseBadRequest('Неизвестный статус чтения')
+                set_reading_status(request.user, book, reading_status)
                 messages.success(request, 'Статус обновлен!')
-                return redirect(f'/catalog/book/?id={book_id}')
+                return redirect(f'/catalog/book/?id={pk}')
 
             # Удаление книги
             if 'delete_book' in request.POST:
-                book.delete()
+                serialized_write(book.delete)()
                 messages.success(request, 'Книга удалена!')
                 return redirect('catalog')
 
-    user_status = None
-    if request.user.is_authenticated:
-        try:
-            user_status = UserStatus.objects.get(user=request.user, book=book)
-        except UserStatus.DoesNotExist:
-            pass
-
     context = {
         'book': book,
-        'user_status': user_status,
+        'user_status': loader.status(book.id),
+        'recommendations': list(loader.books(recommended).values()),
     }
     return render(request, 'book.html', context)
 
 
+@serialized_write
+def set_reading_status(user, book, reading_status):
+    """Ставит пользователю статус книги (создаёт или обновляет)"""
+    UserStatus.objects.update_or_create(
+        user=user,
+        book=book,
+        defaults={'reading_status': reading_status}
+    )
+
+
+@serialized_write
+def create_book(user, book):
+    """
+    Сохраняет новую книгу и статус автора одной транзакцией.
+    Нарезка обложки ставится в очередь в той же транзакции.
+    """
+    book.save()
+    if book.cover_image:
+        schedule_renditions(book.id)
+    UserStatus.objects.create(user=user, book=book, reading_status='not_started')
+
+
+@serialized_write
+def save_book(book, old_cover='', old_cover_hash=''):
+    """
+    Сохраняет книгу и ставит в очередь работу со сменившейся обложкой:
+    удаление старого файла и копий, нарезку новой.
+    """
+    book.save()
+    if (old_cover or '') != (book.cover_image.name or ''):
+        # Без прежней обложки удалять нечего, но новую всё равно нужно нарезать
+        schedule_cover_delete(old_cover)
+        schedule_cleanup(old_cover_hash)
+        if book.cover_image:
+            schedule_renditions(book.id)
+
+
 @login_required
 def book_create(request):
     """Создание новой книги"""
@@ -152,7 +424,7 @@ def book_create(request):
         description = request.POST.get('description')
 
         if title:  # Минимальная валидация
-            book = Book.objects.create(
+            book = Book(
                 title=title,
                 author=author or 'Неизвестный автор',
                 publication_year=publication_year,
@@ -160,17 +432,13 @@ def book_create(request):
                 description=description
             )
 
-            # Загрузка изображения если есть
+            # Загрузка изображения если есть: файл пишется до транзакции,
+            # чтобы не держать блокировку записи базы, пока он копируется
             if 'cover_image' in request.FILES:
-                book.cover_image = request.FILES['cover_image']
-                book.save()
-
-            # Создаем статус для пользователя
-            UserStatus.objects.create(
-                user=request.user,
-                book=book,
-                reading_status='not_started'
-            )
+                upload = request.FILES['cover_image']
+                book.cover_image.save(upload.name, upload, save=False)
+
+            create_book(request.user, book)
 
             messages.success(request, 'Книга добавлена!')
             return redirect(f'/catalog/book/?id={book.id}')
@@ -202,15 +470,23 @@ def book_edit(request):
         book.genre = request.POST.get('genre', book.genre)
         book.description = request.POST.get('description', book.description)
 
-        # Обновляем изображение если загружено
+        # Старые файлы обложки удаляются в фоне после коммита
+        old_cover = book.cover_image.name
+        old_cover_hash = book.cover_hash
+
+        # Обновляем изображение если загружено (файл пишется до транзакции)
         if 'cover_image' in request.FILES:
-            book.cover_image = request.FILES['cover_image']
+            upload = request.FILES['cover_image']
+            book.cover_image.save(upload.name, upload, save=False)
 
         # Если отмечено "удалить обложку"
-        if 'remove_cover' in request.POST and book.cover_image:
-            book.cover_image.delete()
+        elif 'remove_cover' in request.POST and book.cover_image:
+            book.cover_image = None
+
+        if book.cover_image.name != old_cover:
+            book.cover_hash = ''
 
-        book.save()
+        save_book(book, old_cover, old_cover_hash)
         messages.success(request, 'Книга обновлена!')
         return redirect(f'/catalog/book/?id={book_id}')
 
@@ -218,22 +494,36 @@ def book_edit(request):
     return render(request, 'forms.html', context)
 
 
+@read_only_view
 @login_required
 def my_books(request):
     """Страница с книгами пользователя"""
-    user_statuses = UserStatus.objects.filter(user=request.user)
-
-    # Группируем по статусам
-    status_groups = {
-        'not_started': user_statuses.filter(reading_status='not_started'),
-        'reading': user_statuses.filter(reading_status='reading'),
-        'finished': user_statuses.filter(reading_status='finished'),
-        'planned': user_statuses.filter(reading_status='planned'),
-        'abandoned': user_statuses.filter(reading_status='abandoned'),
-    }
+    return render(request, 'profil.html', my_books_context(user_book_statuses(request.user)))
 
-    context = {
-        'user_statuses': user_statuses,
+
+def user_book_statuses(user):
+    """Статусы пользователя вместе с книгами (без описаний) - один запрос"""
+    return UserStatus.objects.filter(user=user).select_related('book').only(
+        'id', 'reading_status', 'user_id', 'updated_at', 'version',
+        'book__id', 'book__title', 'book__author', 'book__cover_image', 'book__cover_hash', 'book__updated_at',
+        'book__version',
+    ).order_by('id')
+
+
+def my_books_context(user_statuses):
+    # Группируем по статусам в Python
+    status_groups = {value: [] for value, _ in UserStatus.READING_STATUS}
+    for status in user_statuses:
+        status_groups.setdefault(status.reading_status, []).append(status)
+    status_counts = {value: len(group) for value, group in status_groups.items()}
+
+    # "Не начатые" показываем не все, остальные только считаем
+    not_started_hidden = max(status_counts['not_started'] - NOT_STARTED_LIMIT, 0)
+    status_groups['not_started'] = status_groups['not_started'][:NOT_STARTED_LIMIT]
+
+    return {
         'status_groups': status_groups,
+        'status_counts': status_counts,
+        'total_books': sum(status_counts.values()),
+        'not_started_hidden': not_started_hidden,
     }
-    return render(request, 'profil.html', context)
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Подготовка процесса к запросам сразу после запуска.
+
+Без неё первые запросы нового процесса (после выкладки или добавления
+процессов) медленные: импорт представлений при первой загрузке URL-схемы
+и компиляция больших шаблонов (catalog.html, forms.html, profil.html).
+warm_up() делает это заранее: загружает URL-схему и компилирует все
+шаблоны из TEMPLATES['DIRS'] в кэширующий загрузчик, а затем проверяет,
+что каждая база доступна. Соединения Django принадлежат потоку, поэтому
+соединения потока подготовки закрываются: запросы открывают свои.
+Последний шаг будит исполнителей фоновых задач (catalog.tasks.resume):
+задачи, оставшиеся от прошлого запуска, не ждут следующего enqueue.
+
+settings/wsgi.py и settings/asgi.py запускают её в фоне при
+settings.WARMUP_ON_START, /ready/ отвечает 503, пока она не закончится
+(балансировщику стоит направлять запросы только на готовые процессы).
+"""
+import logging
+import threading
+from pathlib import Path
+from time import perf_counter
+
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+
+from . import tasks
+
+
+logger = logging.getLogger(__name__)
+
+_state = {'ready': False, 'running': False, 'steps': {}, 'templates': 0, 'error': None}
+_lock = threading.Lock()
+
+
+def load_urls():
+    """
+    Загружает URL-схему (и с ней модули всех представлений).
+    """
+    get_resolver().reverse_dict
+
+
+def compile_templates():
+    """
+    Компилирует шаблоны проекта в кэш загрузчика. Возвращает их число.
+    """
+    count = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = Path(directory)
+            for path in sorted(directory.rglob('*.html')):
+                engine.get_template(path.relative_to(directory).as_posix())
+                count += 1
+    return count
+
+
+def check_databases():
+    """
+    Проверяет запросом, что каждая база открывается с настройками профиля.
+    """
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def warm_up():
+    """
+    Выполняет все шаги подготовки. Возвращает состояние (как status()).
+    """
+    steps = {}
+    try:
+        for name, step in [
+            ('urls', load_urls),
+            ('templates', compile_templates),
+            ('database', check_databases),
+            ('tasks', tasks.resume),
+        ]:
+            started = perf_counter()
+            result = step()
+            steps[name] = round((perf_counter() - started) * 1000, 1)
+            if name == 'templates':
+                _state['templates'] = result
+    except Exception as error:
+        logger.exception('Подготовка процесса не выполнена')
+        # Подробности - в журнале: /ready/ доступна без входа
+        _state.update(error=type(error).__name__)
+    else:
+        _state.update(ready=True, error=None)
+    finally:
+        # Соединения этого потока запросам не достанутся - не держим их открытыми
+        connections.close_all()
+        _state.update(running=False, steps=steps)
+    return status()
+
+
+def start():
+    """
+    Запускает подготовку в фоновом потоке, если она ещё не выполнена и не идёт.
+    """
+    with _lock:
+        if _state['ready'] or _state['running']:
+            return
+        _state['running'] = True
+    threading.Thread(target=warm_up, name='warmup', daemon=True).start()
+
+
+def status():
+    """
+    Готов ли процесс, время шагов в мс и число скомпилированных шаблонов.
+    """
+    return dict(_state, steps=dict(_state['steps']))
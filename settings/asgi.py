@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
 
 application = get_asgi_application()
+
+# Prime URL patterns and templates and check the databases before the first
+# requests (catalog.warmup); /ready/ reports when this is done
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_START:
+    from catalog import warmup
+
+    warmup.start()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,32 +55,115 @@ ROOT_URLCONF = 'settings.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'catalog.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates stay in memory for the life of the process
+            # (runserver drops them when a template changes); catalog.warmup
+            # compiles the project's templates when a worker starts
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'settings.wsgi.application'
 
+ASGI_APPLICATION = 'settings.asgi.application'
+
+# The server the site is deployed behind: 'asgi' (uvicorn settings.asgi:application)
+# or 'wsgi' (gunicorn settings.wsgi, runserver). Set it to match the deployment:
+# it picks the views and the database connection lifetime below.
+SERVER_INTERFACE = 'asgi'
+
+# Serve read-heavy pages (home, catalog, book, profile) with async views.
+# They only pay off under an ASGI server; under WSGI they only add overhead.
+ASYNC_VIEWS = SERVER_INTERFACE == 'asgi'
+
+# Load URL patterns, compile templates and check that the databases open in the
+# background as soon as a WSGI/ASGI worker starts (catalog.warmup). /ready/
+# answers 503 until that is done; with False the first /ready/ call starts it
+WARMUP_ON_START = True
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# 'production' tunes SQLite for concurrent requests, 'basic' is Django's default setup
+DATABASE_PROFILE = 'production'
+
+SQLITE_PRAGMAS = {
+    # Readers don't block the writer and the writer doesn't block readers
+    'journal_mode': 'WAL',
+    # Safe with WAL: a power loss may drop the last commits but never corrupts the file
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative value is in KiB: 64 MiB of page cache per connection
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+DATABASE_PROFILES = {
+    'basic': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'production': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections for 10 minutes only under WSGI, where a worker thread
+        # serves request after request. Under ASGI each request works with the
+        # database in a thread of its own, so persistent connections would only
+        # pile up there: with the default 'asgi' reuse is off
+        'CONN_MAX_AGE': 600 if SERVER_INTERFACE == 'wsgi' else 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # busy_timeout, seconds
+            'timeout': 20,
+            # Take the write lock at BEGIN: a deferred transaction that reads
+            # first and then writes fails at once instead of waiting
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    },
+}
+
+DATABASES = {
+    'default': DATABASE_PROFILES[DATABASE_PROFILE],
 }
 
+# Send reads of read-only pages to a separate query_only connection ('read' alias)
+DATABASE_READ_SPLIT = False
+
+if DATABASE_READ_SPLIT:
+    DATABASES['read'] = {
+        **DATABASES['default'],
+        'OPTIONS': {
+            **DATABASES['default'].get('OPTIONS', {}),
+            'init_command': ';'.join(
+                [DATABASES['default'].get('OPTIONS', {}).get('init_command', ''), 'PRAGMA query_only=ON']
+            ),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['catalog.db.ReadRouter']
+
+# Writes wrapped in catalog.db.serialized_write are retried this many times
+# when the database stays locked, doubling the pause (seconds) each time
+DATABASE_WRITE_RETRIES = 5
+
+DATABASE_WRITE_BACKOFF = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -116,3 +200,141 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+STATICFILES_DIRS = [BASE_DIR / 'static']
+
+# collectstatic puts content-hashed, precompressed files here
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'catalog.assets.CompressedManifestStorage',
+    },
+}
+
+
+# Background tasks (catalog.tasks): cover renditions, file cleanup, recommendations
+# Run queued tasks in threads of the web process right after commit; with False
+# they wait for `python manage.py run_tasks`
+TASKS_IN_PROCESS = True
+
+# Number of threads running tasks in the web process
+TASKS_WORKERS = 2
+
+# A failed task is retried this many times in total, doubling the pause (seconds)
+TASKS_MAX_ATTEMPTS = 5
+
+TASKS_RETRY_BACKOFF = 2
+
+# Tasks claimed by a worker in one transaction, and seconds a claimed batch
+# may run before another worker takes it over
+TASKS_BATCH = 20
+
+TASKS_TIMEOUT = 300
+
+
+# Page cache
+# 'locmem' keeps pages in each process' memory, 'file' shares them between processes
+
+VIEW_CACHE_BACKEND = 'locmem'
+
+VIEW_CACHE_TIMEOUT = 300
+
+# Rendered book cards are keyed by book version, so they can live longer than pages
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Book rows kept in each process' memory (catalog.loaders), least recently used
+# are evicted first. A row is reused while the book's cache tag is unchanged,
+# and for at most BOOK_CACHE_TIMEOUT seconds (0 - don't keep rows)
+BOOK_CACHE_SIZE = 2000
+
+BOOK_CACHE_TIMEOUT = 300
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'napolku',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[VIEW_CACHE_BACKEND],
+    # Sessions, signed-in users and login attempts, apart from pages so that
+    # culling the page cache doesn't push them out
+    'sessions': {
+        **CACHE_BACKENDS[VIEW_CACHE_BACKEND],
+        'LOCATION': {'locmem': 'napolku-sessions', 'file': BASE_DIR / 'cache' / 'sessions'}[VIEW_CACHE_BACKEND],
+    },
+}
+
+
+# Sessions and sign-in (catalog.auth)
+# 'db' is Django's default: every signed-in request reads django_session.
+# 'cached_db' reads sessions from the 'sessions' cache and falls back to the table.
+# 'signed_cookies' keeps the session in a signed cookie and never touches the
+# database, but a copied cookie stays valid until it expires, even after logout.
+# With several processes use VIEW_CACHE_BACKEND = 'file', so that a logout or a
+# password change is seen by all of them
+
+SESSION_BACKEND = 'cached_db'
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Loads the session's user from the 'sessions' cache instead of auth_user.
+# Sessions remember the backend path, so changing it signs everyone out once
+AUTHENTICATION_BACKENDS = ['catalog.auth.CachedModelBackend']
+
+# Seconds a signed-in user stays cached (0 - read auth_user on every request)
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Failed sign-ins allowed per username, and usernames with failed sign-ins
+# allowed per client address, within the window (seconds); further attempts
+# are refused before the password is hashed
+LOGIN_ATTEMPTS_PER_USER = 5
+
+LOGIN_ATTEMPTS_PER_IP = 20
+
+LOGIN_ATTEMPTS_WINDOW = 300
+
+
+# Request metrics
+# Requests slower than this (seconds) are logged with all their SQL queries
+
+SLOW_REQUEST_THRESHOLD = 0.5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'slow_requests.log',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'catalog.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -14,16 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from catalog.assets import serve_static
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('catalog.urls')),
+    # Статика после collectstatic: хеш в имени, долгий кэш, готовые gzip/brotli
+    re_path(r'^%s/(?P<path>.*)$' % re.escape(settings.STATIC_URL.strip('/')), serve_static),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,99 @@
+(function () {
+    var sentinel = document.getElementById('shelves-sentinel');
+    if (!sentinel || !('IntersectionObserver' in window)) {
+        return;
+    }
+
+    var container = document.getElementById('shelves');
+    var loading = false;
+
+    function truncate(text, length) {
+        text = text || '';
+        return text.length > length ? text.slice(0, length - 1) + '…' : text;
+    }
+
+    function element(tag, className, text) {
+        var node = document.createElement(tag);
+        if (className) {
+            node.className = className;
+        }
+        if (text !== undefined) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    function renderBook(book) {
+        var item = element('div', 'book-cover-container');
+
+        var info = element('div', 'book-info');
+        info.appendChild(element('div', 'book-title', truncate(book.title, 20)));
+        info.appendChild(element('div', 'book-author', truncate(book.author, 15) || 'Неизвестен'));
+        if (book.publication_year) {
+            info.appendChild(element('div', 'book-year', book.publication_year + ' год'));
+        }
+        item.appendChild(info);
+
+        var onShelf = element('div', 'book-on-shelf');
+        var link = element('a', 'text-decoration-none');
+        link.href = '/catalog/book/?id=' + book.id;
+
+        var cover = element('div', 'book-cover');
+        cover.appendChild(element('div', 'book-spine'));
+        if (book.cover_url) {
+            var img = element('img', 'cover-image');
+            img.src = book.cover_url;
+            img.loading = 'lazy';
+            cover.appendChild(img);
+        } else {
+            cover.appendChild(element('div', 'cover-title', truncate(book.title, 25)));
+        }
+
+        link.appendChild(cover);
+        onShelf.appendChild(link);
+        onShelf.appendChild(element('div', 'book-shadow-on-shelf'));
+        item.appendChild(onShelf);
+        return item;
+    }
+
+    function renderShelf(books) {
+        var shelf = element('div', 'shelf-container');
+        var row = element('div', 'shelf-row');
+        books.forEach(function (book) {
+            row.appendChild(renderBook(book));
+        });
+        shelf.appendChild(row);
+
+        var board = element('div', 'shelf');
+        board.appendChild(element('div', 'shelf-top'));
+        shelf.appendChild(board);
+        return shelf;
+    }
+
+    var observer = new IntersectionObserver(function (entries) {
+        if (!entries[0].isIntersecting || loading) {
+            return;
+        }
+        loading = true;
+
+        // В адресе уже могут быть фильтры каталога
+        var url = sentinel.dataset.url + (sentinel.dataset.url.indexOf('?') === -1 ? '?' : '&') +
+            'cursor=' + encodeURIComponent(sentinel.dataset.cursor);
+        fetch(url, {headers: {'Accept': 'application/json'}})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                (data.shelves || []).forEach(function (books) {
+                    container.appendChild(renderShelf(books));
+                });
+                if (data.next) {
+                    sentinel.dataset.cursor = data.next;
+                } else {
+                    observer.disconnect();
+                    sentinel.remove();
+                }
+            })
+            .finally(function () { loading = false; });
+    }, {rootMargin: '400px'});
+
+    observer.observe(sentinel);
+})();
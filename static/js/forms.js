@@ -0,0 +1,42 @@
+// Превью загружаемой обложки
+document.getElementById('cover_image').addEventListener('change', function(e) {
+    const file = e.target.files[0];
+    if (file) {
+        const reader = new FileReader();
+        reader.onload = function(e) {
+            const preview = document.getElementById('new-cover-preview');
+            const img = document.getElementById('preview-image');
+            img.src = e.target.result;
+            preview.classList.remove('d-none');
+        }
+        reader.readAsDataURL(file);
+    }
+});
+
+// Автоматическое заполнение года
+const yearInput = document.getElementById('publication_year');
+if (!yearInput.value) {
+    yearInput.value = new Date().getFullYear();
+}
+
+// Подсчет символов в описании
+const description = document.getElementById('description');
+const charCount = document.createElement('div');
+charCount.className = 'form-text text-end text-muted mt-1';
+description.parentElement.appendChild(charCount);
+
+function updateCharCount() {
+    const length = description.value.length;
+    charCount.textContent = `${length} / 5000 символов`;
+}
+
+description.addEventListener('input', updateCharCount);
+updateCharCount();
+
+// Убираем выделение при фокусе
+document.querySelectorAll('input, select, textarea, button').forEach(element => {
+    element.addEventListener('focus', function() {
+        this.style.outline = 'none';
+        this.style.boxShadow = 'none';
+    });
+});
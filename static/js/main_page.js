@@ -0,0 +1,11 @@
+// Подсветка активного пункта меню
+document.querySelectorAll('.sidebar-menu a').forEach(link => {
+    if (link.href === window.location.href) {
+        link.classList.add('active');
+    }
+
+    link.addEventListener('click', function() {
+        document.querySelectorAll('.sidebar-menu a').forEach(a => a.classList.remove('active'));
+        this.classList.add('active');
+    });
+});
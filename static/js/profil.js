@@ -0,0 +1,20 @@
+// Подсветка активного пункта меню
+document.querySelectorAll('.sidebar-menu a').forEach(link => {
+    if (link.href === window.location.href) {
+        link.classList.add('active');
+    }
+
+    link.addEventListener('click', function() {
+        document.querySelectorAll('.sidebar-menu a').forEach(a => a.classList.remove('active'));
+        this.classList.add('active');
+    });
+});
+
+// Автоматическое скрытие сообщений через 5 секунд
+setTimeout(function() {
+    var alerts = document.querySelectorAll('.alert');
+    alerts.forEach(function(alert) {
+        var bsAlert = new bootstrap.Alert(alert);
+        bsAlert.close();
+    });
+}, 5000);